@@ -11,20 +11,111 @@ CREATE EXTENSION IF NOT EXISTS "uuid-ossp";
 -- TABLAS TÉCNICAS (EVENT SOURCING)
 -- ========================================
 
--- Tabla para almacenar eventos del Event Store
+-- Tabla para almacenar eventos del Event Store, particionada por mes en occurred_on.
+-- Los meses fríos se archivan en segmentos y se eliminan de la tabla caliente
+-- (campanias.infrastructure.archive); la PK incluye la clave de partición.
+CREATE SEQUENCE IF NOT EXISTS event_store_id_seq;
+
+-- Migración: instalaciones previas guardaban el payload como TEXT con json.dumps
+DO $$
+BEGIN
+    IF EXISTS (
+        SELECT 1 FROM information_schema.columns
+        WHERE table_name = 'event_store' AND column_name = 'payload' AND data_type = 'text'
+    ) THEN
+        ALTER TABLE event_store ALTER COLUMN payload TYPE JSONB USING payload::jsonb;
+    END IF;
+END $$;
+
+-- Migración: la tabla simple previa pasa a ser la partición event_store_legacy
+DO $$
+BEGIN
+    IF EXISTS (SELECT 1 FROM pg_class WHERE relname = 'event_store' AND relkind = 'r') THEN
+        ALTER TABLE event_store RENAME TO event_store_legacy;
+        DROP TRIGGER IF EXISTS trg_event_store_notify ON event_store_legacy;
+        DROP INDEX IF EXISTS idx_event_store_aggregate_id, idx_event_store_type, idx_event_store_occurred_on,
+            idx_event_store_aggregate_id_id, idx_event_store_payload, idx_event_store_payload_id_cliente,
+            idx_event_store_payload_id_campania, idx_event_store_payload_id_pago;
+        ALTER TABLE event_store_legacy DROP CONSTRAINT IF EXISTS event_store_pkey;
+        UPDATE event_store_legacy SET occurred_on = TIMESTAMP '1970-01-01' WHERE occurred_on IS NULL;
+        ALTER TABLE event_store_legacy ALTER COLUMN occurred_on SET NOT NULL;
+        ALTER SEQUENCE event_store_id_seq OWNED BY NONE;
+    END IF;
+END $$;
+
 CREATE TABLE IF NOT EXISTS event_store (
-    id SERIAL PRIMARY KEY,
+    id INTEGER NOT NULL DEFAULT nextval('event_store_id_seq'),
     aggregate_id VARCHAR(255) NOT NULL,
     aggregate_type VARCHAR(255),
     type VARCHAR(255) NOT NULL,
-    payload TEXT NOT NULL,
-    occurred_on TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-);
+    payload JSONB NOT NULL,
+    occurred_on TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    PRIMARY KEY (id, occurred_on)
+) PARTITION BY RANGE (occurred_on);
+ALTER SEQUENCE event_store_id_seq OWNED BY event_store.id;
+
+-- La tabla previa cubre todo hasta el fin del mes en que se migró
+DO $$
+BEGIN
+    IF to_regclass('event_store_legacy') IS NOT NULL
+       AND NOT EXISTS (SELECT 1 FROM pg_inherits WHERE inhrelid = 'event_store_legacy'::regclass) THEN
+        EXECUTE format(
+            'ALTER TABLE event_store ATTACH PARTITION event_store_legacy FOR VALUES FROM (MINVALUE) TO (%L)',
+            date_trunc('month', now()) + INTERVAL '1 month'
+        );
+    END IF;
+END $$;
+
+-- Red de seguridad si aún no existe la partición del mes (ensure_partitions la crea por adelantado)
+CREATE TABLE IF NOT EXISTS event_store_default PARTITION OF event_store DEFAULT;
+
+-- Las filas del mes que ya cayeron en event_store_default se mueven a la partición nueva
+-- antes de adjuntarla: con filas de su rango en DEFAULT, ATTACH falla con check_violation
+CREATE OR REPLACE FUNCTION event_store_crear_particion(mes DATE)
+RETURNS VOID AS $$
+DECLARE
+    inicio DATE := date_trunc('month', mes);
+    fin DATE := date_trunc('month', mes) + INTERVAL '1 month';
+    nombre TEXT := 'event_store_' || to_char(inicio, 'YYYY_MM');
+BEGIN
+    IF to_regclass(nombre) IS NULL THEN
+        EXECUTE format('CREATE TABLE %I (LIKE event_store INCLUDING DEFAULTS INCLUDING CONSTRAINTS)', nombre);
+        IF to_regclass('event_store_default') IS NOT NULL THEN
+            EXECUTE format(
+                'WITH movidas AS (DELETE FROM event_store_default WHERE occurred_on >= %L AND occurred_on < %L '
+                'RETURNING *) INSERT INTO %I SELECT * FROM movidas', inicio, fin, nombre);
+        END IF;
+        EXECUTE format('ALTER TABLE event_store ATTACH PARTITION %I FOR VALUES FROM (%L) TO (%L)',
+                       nombre, inicio, fin);
+    END IF;
+EXCEPTION WHEN invalid_object_definition THEN
+    -- El rango ya lo cubre event_store_legacy
+    NULL;
+END;
+$$ language 'plpgsql';
+
+SELECT event_store_crear_particion((date_trunc('month', now()) + n * INTERVAL '1 month')::date)
+FROM generate_series(0, 2) AS n;
 
 -- Índices para event_store
 CREATE INDEX IF NOT EXISTS idx_event_store_aggregate_id ON event_store(aggregate_id);
 CREATE INDEX IF NOT EXISTS idx_event_store_type ON event_store(type);
 CREATE INDEX IF NOT EXISTS idx_event_store_occurred_on ON event_store(occurred_on);
+-- Cola de eventos posterior a un snapshot: WHERE aggregate_id = ? AND id > ?
+CREATE INDEX IF NOT EXISTS idx_event_store_aggregate_id_id ON event_store(aggregate_id, id);
+-- Consultas por contenido del payload (campanias.infrastructure.event_store.find_events)
+CREATE INDEX IF NOT EXISTS idx_event_store_payload ON event_store USING GIN (payload jsonb_path_ops);
+CREATE INDEX IF NOT EXISTS idx_event_store_payload_id_cliente ON event_store ((payload->>'idCliente'));
+CREATE INDEX IF NOT EXISTS idx_event_store_payload_id_campania ON event_store ((payload->>'idCampania'));
+CREATE INDEX IF NOT EXISTS idx_event_store_payload_id_pago ON event_store ((payload->>'idPago'));
+
+-- Último snapshot por agregado; version = id del último evento aplicado
+CREATE TABLE IF NOT EXISTS campania_snapshots (
+    aggregate_id VARCHAR(255) PRIMARY KEY,
+    version INTEGER NOT NULL,
+    state TEXT NOT NULL,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
 
 -- ========================================
 -- PATRÓN OUTBOX PARA EVENTOS DE INTEGRACIÓN
@@ -35,33 +126,155 @@ CREATE TABLE IF NOT EXISTS outbox (
     id SERIAL PRIMARY KEY,
     event_type VARCHAR(255) NOT NULL,
     payload JSONB NOT NULL,
+    topic VARCHAR(255),
+    aggregate_id VARCHAR(255),
+    shard INTEGER NOT NULL DEFAULT 0,
     status VARCHAR(20) DEFAULT 'PENDING',
+    retries INTEGER NOT NULL DEFAULT 0,
+    last_error TEXT,
     created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-    published_at TIMESTAMP
+    updated_at TIMESTAMP,
+    published_at TIMESTAMP,
+    next_attempt_at TIMESTAMP
 );
 
+-- Columnas del relay para bases creadas antes de los reintentos por fila
+ALTER TABLE outbox ADD COLUMN IF NOT EXISTS retries INTEGER NOT NULL DEFAULT 0;
+ALTER TABLE outbox ADD COLUMN IF NOT EXISTS last_error TEXT;
+ALTER TABLE outbox ADD COLUMN IF NOT EXISTS updated_at TIMESTAMP;
+ALTER TABLE outbox ADD COLUMN IF NOT EXISTS topic VARCHAR(255);
+ALTER TABLE outbox ADD COLUMN IF NOT EXISTS aggregate_id VARCHAR(255);
+ALTER TABLE outbox ADD COLUMN IF NOT EXISTS shard INTEGER NOT NULL DEFAULT 0;
+ALTER TABLE outbox ADD COLUMN IF NOT EXISTS next_attempt_at TIMESTAMP;
+
 -- Índices para outbox
 CREATE INDEX IF NOT EXISTS idx_outbox_status ON outbox(status);
+-- El relay reclama filas PENDING en orden de id
+CREATE INDEX IF NOT EXISTS idx_outbox_pending_id ON outbox(id) WHERE status = 'PENDING';
+CREATE INDEX IF NOT EXISTS idx_outbox_shard_pending ON outbox(shard, id) WHERE status = 'PENDING';
+-- Filas previas en espera del mismo agregado (NOT EXISTS del reclamo)
+CREATE INDEX IF NOT EXISTS idx_outbox_aggregate_pending ON outbox(aggregate_id, id) WHERE status = 'PENDING';
+
+-- Arriendos de shards del relay: cada shard (crc32(aggregate_id) % 64) lo publica un solo worker
+CREATE TABLE IF NOT EXISTS outbox_leases (
+    shard INTEGER PRIMARY KEY,
+    owner VARCHAR(255),
+    expires_at TIMESTAMP
+);
+
+-- Latidos de los workers del relay, usados para calcular la cuota de shards de cada uno
+CREATE TABLE IF NOT EXISTS outbox_workers (
+    owner VARCHAR(255) PRIMARY KEY,
+    expires_at TIMESTAMP NOT NULL
+);
 CREATE INDEX IF NOT EXISTS idx_outbox_created_at ON outbox(created_at);
 CREATE INDEX IF NOT EXISTS idx_outbox_event_type ON outbox(event_type);
 
+-- Despierta al relay del outbox (LISTEN outbox_nuevo) en cuanto se insertan filas.
+-- Es por sentencia: un INSERT de muchas filas genera una sola notificación.
+CREATE OR REPLACE FUNCTION notify_outbox_nuevo()
+RETURNS TRIGGER AS $$
+BEGIN
+    PERFORM pg_notify('outbox_nuevo', '');
+    RETURN NULL;
+END;
+$$ language 'plpgsql';
+
+DROP TRIGGER IF EXISTS trg_outbox_notify ON outbox;
+CREATE TRIGGER trg_outbox_notify
+    AFTER INSERT ON outbox
+    FOR EACH STATEMENT EXECUTE FUNCTION notify_outbox_nuevo();
+
+-- Despierta a las suscripciones catch-up (campanias.infrastructure.catchup)
+CREATE OR REPLACE FUNCTION notify_event_store_nuevo()
+RETURNS TRIGGER AS $$
+BEGIN
+    PERFORM pg_notify('event_store_nuevo', '');
+    RETURN NULL;
+END;
+$$ language 'plpgsql';
+
+DROP TRIGGER IF EXISTS trg_event_store_notify ON event_store;
+CREATE TRIGGER trg_event_store_notify
+    AFTER INSERT ON event_store
+    FOR EACH STATEMENT EXECUTE FUNCTION notify_event_store_nuevo();
+
 -- ========================================
 -- DEDUPLICACIÓN DE EVENTOS
 -- ========================================
 
--- Tabla para evitar procesamiento duplicado de eventos
+-- Tabla para marcar eventos procesados (usada por los consumidores para idempotencia).
+-- Particionada por día (bucket) para podar con DROP de particiones en lugar de DELETE
+-- (alpespartners.infra.retencion). La unicidad incluye el bucket; los consumidores
+-- reclaman con NOT EXISTS, que cubre los días anteriores dentro de la retención.
+-- Sin índices extra: la unicidad ya empieza por aggregate_id y cada índice encarece el INSERT.
+DO $$
+BEGIN
+    IF EXISTS (SELECT 1 FROM pg_class WHERE relname = 'processed_events' AND relkind = 'r') THEN
+        ALTER TABLE processed_events RENAME TO processed_events_legacy;
+        -- Las filas previas quedan en el bucket del día de la migración (default constante, sin reescritura)
+        ALTER TABLE processed_events_legacy ADD COLUMN IF NOT EXISTS bucket DATE NOT NULL DEFAULT CURRENT_DATE;
+        ALTER TABLE processed_events_legacy
+            ALTER COLUMN id TYPE BIGINT,
+            ALTER COLUMN processed_at TYPE TIMESTAMP WITH TIME ZONE;
+        ALTER TABLE processed_events_legacy DROP CONSTRAINT IF EXISTS uq_processed_event;
+        ALTER TABLE processed_events_legacy DROP CONSTRAINT IF EXISTS processed_events_aggregate_id_event_type_event_id_key;
+        ALTER TABLE processed_events_legacy DROP CONSTRAINT IF EXISTS processed_events_pkey;
+        DROP INDEX IF EXISTS idx_processed_events_aggregate, idx_processed_events_type;
+        ALTER SEQUENCE IF EXISTS processed_events_id_seq AS BIGINT OWNED BY NONE;
+    END IF;
+END $$;
+
+CREATE SEQUENCE IF NOT EXISTS processed_events_id_seq AS BIGINT;
 CREATE TABLE IF NOT EXISTS processed_events (
-    id SERIAL PRIMARY KEY,
-    aggregate_id VARCHAR(255) NOT NULL,
-    event_type VARCHAR(255) NOT NULL,
-    event_id VARCHAR(255) NOT NULL,
-    processed_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-    UNIQUE(aggregate_id, event_type, event_id)
-);
+  id BIGINT NOT NULL DEFAULT nextval('processed_events_id_seq'),
+  aggregate_id varchar(255) NOT NULL,
+  event_type varchar(255) NOT NULL,
+  event_id varchar(255) NOT NULL,
+  processed_at TIMESTAMP WITH TIME ZONE DEFAULT now(),
+  bucket DATE NOT NULL DEFAULT CURRENT_DATE,
+  PRIMARY KEY (id, bucket),
+  CONSTRAINT uq_processed_event UNIQUE (aggregate_id, event_type, event_id, bucket)
+) PARTITION BY RANGE (bucket);
+ALTER SEQUENCE processed_events_id_seq OWNED BY processed_events.id;
+
+DO $$
+BEGIN
+    IF to_regclass('processed_events_legacy') IS NOT NULL
+       AND NOT EXISTS (SELECT 1 FROM pg_inherits WHERE inhrelid = 'processed_events_legacy'::regclass) THEN
+        EXECUTE format(
+            'ALTER TABLE processed_events ATTACH PARTITION processed_events_legacy FOR VALUES FROM (MINVALUE) TO (%L)',
+            CURRENT_DATE + 1
+        );
+    END IF;
+END $$;
+
+CREATE TABLE IF NOT EXISTS processed_events_default PARTITION OF processed_events DEFAULT;
+
+-- Las filas del día que ya cayeron en processed_events_default se mueven a la partición
+-- nueva antes de adjuntarla: con filas de su rango en DEFAULT, ATTACH falla con check_violation
+CREATE OR REPLACE FUNCTION processed_events_crear_particion(dia DATE)
+RETURNS VOID AS $$
+DECLARE
+    nombre TEXT := 'processed_events_' || to_char(dia, 'YYYYMMDD');
+BEGIN
+    IF to_regclass(nombre) IS NULL THEN
+        EXECUTE format('CREATE TABLE %I (LIKE processed_events INCLUDING DEFAULTS INCLUDING CONSTRAINTS)', nombre);
+        IF to_regclass('processed_events_default') IS NOT NULL THEN
+            EXECUTE format(
+                'WITH movidas AS (DELETE FROM processed_events_default WHERE bucket = %L RETURNING *) '
+                'INSERT INTO %I SELECT * FROM movidas', dia, nombre);
+        END IF;
+        EXECUTE format('ALTER TABLE processed_events ATTACH PARTITION %I FOR VALUES FROM (%L) TO (%L)',
+                       nombre, dia, dia + 1);
+    END IF;
+EXCEPTION WHEN invalid_object_definition THEN
+    -- El día ya lo cubre processed_events_legacy
+    NULL;
+END;
+$$ language 'plpgsql';
 
--- Índices para processed_events
-CREATE INDEX IF NOT EXISTS idx_processed_events_aggregate ON processed_events(aggregate_id);
-CREATE INDEX IF NOT EXISTS idx_processed_events_type ON processed_events(event_type);
+SELECT processed_events_crear_particion(CURRENT_DATE + n) FROM generate_series(0, 3) AS n;
 
 -- ========================================
 -- CONFIGURACIÓN GLOBAL DEL SISTEMA
@@ -430,6 +430,83 @@ BEGIN
 END;
 $$ LANGUAGE plpgsql;
 
+-- ========================================
+-- DEDUPLICACIÓN DE EVENTOS
+-- ========================================
+
+-- Tabla para marcar eventos procesados (usada por los consumidores para idempotencia).
+-- Particionada por día (bucket) para podar con DROP de particiones en lugar de DELETE
+-- (alpespartners.infra.retencion). La unicidad incluye el bucket; los consumidores
+-- reclaman con NOT EXISTS, que cubre los días anteriores dentro de la retención.
+-- Sin índices extra: la unicidad ya empieza por aggregate_id y cada índice encarece el INSERT.
+DO $$
+BEGIN
+    IF EXISTS (SELECT 1 FROM pg_class WHERE relname = 'processed_events' AND relkind = 'r') THEN
+        ALTER TABLE processed_events RENAME TO processed_events_legacy;
+        -- Las filas previas quedan en el bucket del día de la migración (default constante, sin reescritura)
+        ALTER TABLE processed_events_legacy ADD COLUMN IF NOT EXISTS bucket DATE NOT NULL DEFAULT CURRENT_DATE;
+        ALTER TABLE processed_events_legacy
+            ALTER COLUMN id TYPE BIGINT,
+            ALTER COLUMN processed_at TYPE TIMESTAMP WITH TIME ZONE;
+        ALTER TABLE processed_events_legacy DROP CONSTRAINT IF EXISTS uq_processed_event;
+        ALTER TABLE processed_events_legacy DROP CONSTRAINT IF EXISTS processed_events_aggregate_id_event_type_event_id_key;
+        ALTER TABLE processed_events_legacy DROP CONSTRAINT IF EXISTS processed_events_pkey;
+        DROP INDEX IF EXISTS idx_processed_events_aggregate, idx_processed_events_type;
+        ALTER SEQUENCE IF EXISTS processed_events_id_seq AS BIGINT OWNED BY NONE;
+    END IF;
+END $$;
+
+CREATE SEQUENCE IF NOT EXISTS processed_events_id_seq AS BIGINT;
+CREATE TABLE IF NOT EXISTS processed_events (
+  id BIGINT NOT NULL DEFAULT nextval('processed_events_id_seq'),
+  aggregate_id varchar(255) NOT NULL,
+  event_type varchar(255) NOT NULL,
+  event_id varchar(255) NOT NULL,
+  processed_at TIMESTAMP WITH TIME ZONE DEFAULT now(),
+  bucket DATE NOT NULL DEFAULT CURRENT_DATE,
+  PRIMARY KEY (id, bucket),
+  CONSTRAINT uq_processed_event UNIQUE (aggregate_id, event_type, event_id, bucket)
+) PARTITION BY RANGE (bucket);
+ALTER SEQUENCE processed_events_id_seq OWNED BY processed_events.id;
+
+DO $$
+BEGIN
+    IF to_regclass('processed_events_legacy') IS NOT NULL
+       AND NOT EXISTS (SELECT 1 FROM pg_inherits WHERE inhrelid = 'processed_events_legacy'::regclass) THEN
+        EXECUTE format(
+            'ALTER TABLE processed_events ATTACH PARTITION processed_events_legacy FOR VALUES FROM (MINVALUE) TO (%L)',
+            CURRENT_DATE + 1
+        );
+    END IF;
+END $$;
+
+CREATE TABLE IF NOT EXISTS processed_events_default PARTITION OF processed_events DEFAULT;
+
+-- Las filas del día que ya cayeron en processed_events_default se mueven a la partición
+-- nueva antes de adjuntarla: con filas de su rango en DEFAULT, ATTACH falla con check_violation
+CREATE OR REPLACE FUNCTION processed_events_crear_particion(dia DATE)
+RETURNS VOID AS $$
+DECLARE
+    nombre TEXT := 'processed_events_' || to_char(dia, 'YYYYMMDD');
+BEGIN
+    IF to_regclass(nombre) IS NULL THEN
+        EXECUTE format('CREATE TABLE %I (LIKE processed_events INCLUDING DEFAULTS INCLUDING CONSTRAINTS)', nombre);
+        IF to_regclass('processed_events_default') IS NOT NULL THEN
+            EXECUTE format(
+                'WITH movidas AS (DELETE FROM processed_events_default WHERE bucket = %L RETURNING *) '
+                'INSERT INTO %I SELECT * FROM movidas', dia, nombre);
+        END IF;
+        EXECUTE format('ALTER TABLE processed_events ATTACH PARTITION %I FOR VALUES FROM (%L) TO (%L)',
+                       nombre, dia, dia + 1);
+    END IF;
+EXCEPTION WHEN invalid_object_definition THEN
+    -- El día ya lo cubre processed_events_legacy
+    NULL;
+END;
+$$ language 'plpgsql';
+
+SELECT processed_events_crear_particion(CURRENT_DATE + n) FROM generate_series(0, 3) AS n;
+
 -- ========================================
 -- VISTA / TABLA PROYECTADA campanias_view
 -- (Required by microservice consumers and tests)
@@ -438,8 +515,11 @@ CREATE TABLE IF NOT EXISTS campanias_view (
     id varchar(255) PRIMARY KEY,
     id_cliente varchar(255),
     estado varchar(64),
+    version BIGINT NOT NULL DEFAULT 0,
     updated_at TIMESTAMP WITH TIME ZONE DEFAULT now()
 );
+-- version: event_store id del último evento aplicado; los upserts solo avanzan (WHERE version < EXCLUDED.version)
+ALTER TABLE campanias_view ADD COLUMN IF NOT EXISTS version BIGINT NOT NULL DEFAULT 0;
 
 -- ========================================
 -- TRIGGERS
@@ -161,5 +161,8 @@ CREATE TABLE IF NOT EXISTS campanias_view (
   id varchar(255) PRIMARY KEY,
   id_cliente varchar(255),
   estado varchar(64),
+  version BIGINT NOT NULL DEFAULT 0,
   updated_at TIMESTAMP WITH TIME ZONE DEFAULT now()
-);
\ No newline at end of file
+);
+-- version: event_store id del último evento aplicado; los upserts solo avanzan (WHERE version < EXCLUDED.version)
+ALTER TABLE campanias_view ADD COLUMN IF NOT EXISTS version BIGINT NOT NULL DEFAULT 0;
\ No newline at end of file
@@ -391,5 +391,8 @@ CREATE TABLE IF NOT EXISTS campanias_view (
     id_cliente VARCHAR(255),
     estado VARCHAR(64),
     payload JSONB,
+    version BIGINT NOT NULL DEFAULT 0,
     updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
 );
+-- version: event_store id del último evento aplicado; los upserts solo avanzan (WHERE version < EXCLUDED.version)
+ALTER TABLE campanias_view ADD COLUMN IF NOT EXISTS version BIGINT NOT NULL DEFAULT 0;
@@ -108,6 +108,26 @@ def create_app(configuracion: dict = {}):
         # Start consumers only when explicitly requested via env var START_CONSUMERS=1
         if not app.config.get('TESTING') and os.environ.get('START_CONSUMERS', '0') == '1':
             comenzar_consumidor()
+        # Relay del outbox compartido (p. ej. CampaniaCreada escrito por crear_campania_cmd)
+        if not app.config.get('TESTING') and os.environ.get('START_OUTBOX_RELAY', '1') == '1':
+            try:
+                from alpespartners.infra.message_bus.publicador import PublicadorPulsar
+                from alpespartners.infra.message_bus.relay import iniciar_relay
+                iniciar_relay(PublicadorPulsar())
+            except Exception:
+                logging.exception('No se pudo iniciar el relay del outbox')
+        # Poda programada de processed_events (ventana de redelivery del broker)
+        if not app.config.get('TESTING') and os.environ.get('START_PROCESSED_EVENTS_PRUNER', '0') == '1':
+            from alpespartners.infra.retencion import iniciar_poda
+            iniciar_poda()
+        # Proyección de campanias_view directa desde event_store (no depende de Pulsar)
+        if not app.config.get('TESTING') and os.environ.get('START_CATCHUP_PROJECTIONS', '0') == '1':
+            from campanias.infrastructure.catchup import campanias_view_subscription
+            campanias_view_subscription().start()
+        # Índice en memoria de estado/cliente de campanias (conteos y listados por cliente)
+        if not app.config.get('TESTING') and os.environ.get('START_CAMPAIGN_STATE_INDEX', '0') == '1':
+            from campanias.infrastructure.state_index import start_campaign_state_index
+            start_campaign_state_index()
 
     # Importa Blueprints
     from . import cliente
@@ -1,8 +1,8 @@
 
 from flask import Blueprint, request, jsonify
-from campanias.application.servicio import crear_campania_cmd, obtener_campania_qry
-from campanias.infrastructure.repos import CampaniaViewRepo
-from alpespartners.config.db import db
+from campanias.application.servicio import (
+    contar_campanias_qry, crear_campania_cmd, listar_campanias_cliente_qry, obtener_campania_qry,
+)
 
 bp = Blueprint('campanias', __name__, url_prefix='/campanias')
 
@@ -19,9 +19,20 @@ def crear_campania():
 
 @bp.route('/<id_campania>', methods=['GET'])
 def obtener_campania(id_campania):
-    repo = CampaniaViewRepo(db.session)
-    result = repo.get(id_campania)
+    result = obtener_campania_qry(id_campania)
     if not result:
         return jsonify({'error': 'Campania no encontrada'}), 404
     return jsonify(result), 200
 
+@bp.route('/conteo', methods=['GET'])
+def contar_campanias():
+    return jsonify(contar_campanias_qry()), 200
+
+@bp.route('/clientes/<id_cliente>', methods=['GET'])
+def listar_campanias_cliente(id_cliente):
+    try:
+        campanias = listar_campanias_cliente_qry(id_cliente, request.args.get('estado'),
+                                                 request.args.get('limite', type=int))
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    return jsonify({'idCliente': id_cliente, 'campanias': campanias}), 200
@@ -62,7 +62,7 @@ def publish():
 def db_summary():
     """Return small summary of useful tables for testing.
 
-    Query params: aggregate_id (optional)
+    Query params: aggregate_id, type, idCliente / idCampania / idPago (all optional)
     """
     aggregate_id = request.args.get('aggregate_id')
 
@@ -84,7 +84,14 @@ def db_summary():
         filters = "WHERE aggregate_id = :agg"
         params = {'agg': aggregate_id}
 
-    event_store = q('SELECT id, aggregate_id, type, payload, occurred_on FROM event_store ' + filters + ' ORDER BY id DESC LIMIT 50', params)
+    # ?type=...&idCliente=... se resuelve con los índices del payload en vez de recorrer la tabla
+    from campanias.infrastructure.event_store import INDEXED_PAYLOAD_KEYS, find_events
+    where = {k: request.args[k] for k in INDEXED_PAYLOAD_KEYS if request.args.get(k)}
+    if where or request.args.get('type'):
+        event_store = [dict(e._asdict()) for e in find_events(
+            type=request.args.get('type'), where=where, aggregate_id=aggregate_id, limit=50)]
+    else:
+        event_store = q('SELECT id, aggregate_id, type, payload, occurred_on FROM event_store ' + filters + ' ORDER BY id DESC LIMIT 50', params)
     campanias_view = q('SELECT * FROM campanias_view ' + ('WHERE id = :agg' if aggregate_id else '') + ' ORDER BY id', params)
     processed = q('SELECT * FROM processed_events ' + filters + ' ORDER BY id DESC LIMIT 50', params)
     outbox = q('SELECT * FROM outbox ' + ('WHERE payload->>\'aggregate_id\' = :agg' if aggregate_id else '') + ' ORDER BY id DESC LIMIT 50', params)
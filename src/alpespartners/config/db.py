@@ -1,12 +1,19 @@
 
 from flask_sqlalchemy import SQLAlchemy
 from flask import Flask
+from sqlalchemy import create_engine
+from sqlalchemy.engine import make_url
 import os, importlib
-import socket, time, logging
+import socket, time, logging, threading
 from urllib.parse import urlparse
 
 db = SQLAlchemy()
 
+# Registro de engines por URL: los accesos SQL "raw" (event store, consumidores,
+# outbox) comparten pool en lugar de crear un engine por operación.
+_engines = {}
+_engines_lock = threading.Lock()
+
 class ProcessedEvent(db.Model):
     __tablename__ = "processed_events"
     id = db.Column(db.Integer, primary_key=True, autoincrement=True)
@@ -14,23 +21,117 @@ class ProcessedEvent(db.Model):
     event_type = db.Column(db.String, nullable=False)
     event_id = db.Column(db.String, nullable=False)
     processed_at = db.Column(db.DateTime, server_default=db.func.now())
-    __table_args__ = (db.UniqueConstraint('aggregate_id', 'event_type', 'event_id', name='_uq_processed_event'),)
+    # Día de partición en Postgres (poda por DROP de particiones, ver alpespartners.infra.retencion)
+    bucket = db.Column(db.Date, nullable=False, server_default=db.text('CURRENT_DATE'))
+    __table_args__ = (db.UniqueConstraint('aggregate_id', 'event_type', 'event_id', 'bucket', name='_uq_processed_event'),)
 
 class OutboxEvent(db.Model):
     __tablename__ = "outbox"
     id = db.Column(db.Integer, primary_key=True, autoincrement=True)
     event_type = db.Column(db.String, nullable=False)
     payload = db.Column(db.JSON, nullable=False)
+    # tópico Pulsar de destino; NULL usa el tópico por defecto del relay
+    topic = db.Column(db.String)
+    aggregate_id = db.Column(db.String)
+    # shard lógico de aggregate_id (ver seedwork.infraestructura.arrendamientos.shard_de)
+    shard = db.Column(db.Integer, nullable=False, default=0, server_default='0')
     status = db.Column(db.String, default='PENDING')
+    retries = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    last_error = db.Column(db.Text)
     created_at = db.Column(db.DateTime, server_default=db.func.now())
+    updated_at = db.Column(db.DateTime)
     published_at = db.Column(db.DateTime)
+    # tras un fallo, la fila (y las siguientes de su agregado) no se publica antes de este instante
+    next_attempt_at = db.Column(db.DateTime)
+    __table_args__ = (db.Index('idx_outbox_shard_pending', 'shard', 'id'),)
+
+class OutboxLease(db.Model):
+    __tablename__ = "outbox_leases"
+    shard = db.Column(db.Integer, primary_key=True, autoincrement=False)
+    owner = db.Column(db.String)
+    expires_at = db.Column(db.DateTime)
+
+class OutboxRelayWorker(db.Model):
+    __tablename__ = "outbox_workers"
+    owner = db.Column(db.String, primary_key=True)
+    expires_at = db.Column(db.DateTime, nullable=False)
 
 MODEL_MODULES = [   
     "cliente.infraestructura.dto",  # idem
     "pagos.infraestructura.dto",     # si aún no existe, se ignora
     "campanias.infrastructure.repos", # Para event_store
+    "alpespartners.modulos.campanias.infraestructura.saga_store",  # saga_instances
 ]
 
+def database_url():
+    """URL de la base configurada por entorno (DB_URL o DATABASE_URL), o None."""
+    return os.getenv('DB_URL') or os.getenv('DATABASE_URL')
+
+
+def engine_options(db_url: str) -> dict:
+    """Opciones de pool para `create_engine`, configurables por entorno.
+
+    DB_POOL_SIZE, DB_MAX_OVERFLOW y DB_POOL_TIMEOUT sólo aplican a pools con cola
+    (Postgres); SQLite usa el pool por defecto del dialecto.
+    """
+    opciones = {
+        'pool_pre_ping': True,
+        'pool_recycle': int(os.getenv('DB_POOL_RECYCLE', '1800')),
+    }
+    if not db_url.startswith('sqlite'):
+        opciones['pool_size'] = int(os.getenv('DB_POOL_SIZE', '5'))
+        opciones['max_overflow'] = int(os.getenv('DB_MAX_OVERFLOW', '10'))
+        opciones['pool_timeout'] = int(os.getenv('DB_POOL_TIMEOUT', '30'))
+    return opciones
+
+
+def get_engine(db_url: str = None):
+    """Engine compartido del proceso para `db_url` (por defecto el del entorno).
+
+    El engine se crea una sola vez por URL y se reutiliza desde cualquier hilo.
+    """
+    db_url = db_url or database_url()
+    if not db_url:
+        raise RuntimeError('DB_URL not set; cannot create DB engine')
+    db_url = db_url.replace('+psycopg2', '')
+    engine = _engines.get(db_url)
+    if engine is not None:
+        return engine
+    with _engines_lock:
+        engine = _engines.get(db_url)
+        if engine is None:
+            engine = create_engine(db_url, **engine_options(db_url))
+            _engines[db_url] = engine
+    return engine
+
+
+def pool_stats() -> dict:
+    """Estado de los pools registrados, indexado por URL (sin contraseña)."""
+    stats = {}
+    for url, engine in list(_engines.items()):
+        pool = engine.pool
+        info = {'pool': type(pool).__name__}
+        for campo, metodo in (('size', 'size'), ('checked_in', 'checkedin'),
+                              ('checked_out', 'checkedout'), ('overflow', 'overflow')):
+            fn = getattr(pool, metodo, None)
+            if callable(fn):
+                info[campo] = fn()
+        stats[make_url(url).render_as_string(hide_password=True)] = info
+    return stats
+
+
+def dispose_engines(close: bool = True):
+    """Cierra y olvida todos los engines registrados (shutdown y pruebas).
+
+    En un proceso hijo (fork) usar `close=False`: descarta las conexiones
+    heredadas sin cerrar los sockets que sigue usando el proceso padre.
+    """
+    with _engines_lock:
+        for engine in _engines.values():
+            engine.dispose(close=close)
+        _engines.clear()
+
+
 def init_db(app: Flask):
     # Use SQLite in-memory for tests to avoid external Postgres dependency
     if app.config.get('TESTING'):
@@ -42,7 +143,7 @@ def init_db(app: Flask):
         )
     # Opcional: evita warnings y corta conexiones zombie
     app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
-    app.config['SQLALCHEMY_ENGINE_OPTIONS'] = {'pool_pre_ping': True}
+    app.config['SQLALCHEMY_ENGINE_OPTIONS'] = engine_options(app.config['SQLALCHEMY_DATABASE_URI'])
     db.init_app(app)
     with app.app_context():
         # Wait for DB hostname (from SQLALCHEMY_DATABASE_URI) to be resolvable
@@ -0,0 +1,6 @@
+"""Bus de mensajes basado en un outbox transaccional compartido por todos los módulos."""
+
+from alpespartners.infra.message_bus.db_outbox import DbOutboxBus, outbox_table
+from alpespartners.infra.message_bus.worker import OutboxWorker
+
+__all__ = ['DbOutboxBus', 'OutboxWorker', 'outbox_table']
@@ -0,0 +1,55 @@
+"""Escritura en el outbox compartido (tabla `outbox`).
+
+`outbox_table` es una copia Core del modelo `OutboxEvent`, en su propio
+`metadata`, para usar el bus sin una app Flask y crear la tabla en pruebas.
+"""
+import os
+from typing import Any, Dict, Optional
+
+from alpespartners.config.db import OutboxEvent, database_url, get_engine
+from alpespartners.seedwork.infraestructura.arrendamientos import shard_de
+from sqlalchemy import MetaData
+
+# Shards lógicos por aggregate_id; deben coincidir con los que arriendan los workers
+OUTBOX_SHARDS = int(os.getenv('OUTBOX_SHARDS', '64'))
+
+metadata = MetaData()
+outbox_table = OutboxEvent.__table__.to_metadata(metadata)
+
+
+def _get_engine(db_url: Optional[str] = None):
+    return get_engine(db_url or database_url())
+
+
+class DbOutboxBus:
+    def __init__(self, engine=None):
+        self._engine = engine
+
+    @property
+    def engine(self):
+        if self._engine is None:
+            self._engine = _get_engine()
+        return self._engine
+
+    def publish(self, topic: str, payload: Dict[str, Any], aggregate_id: Optional[str] = None, conn=None,
+                event_type: Optional[str] = None) -> int:
+        """Inserta el mensaje como PENDING y retorna su id.
+
+        Con `conn` la fila se escribe en la transacción del llamador y solo se
+        publica si esa transacción confirma. `event_type` es el `type` del sobre
+        publicado; por defecto es el propio tópico.
+        """
+        fila = {
+            "event_type": event_type or topic,
+            "topic": topic,
+            "payload": payload,
+            "aggregate_id": aggregate_id,
+            "shard": shard_de(aggregate_id, OUTBOX_SHARDS),
+            "status": 'PENDING',
+            "retries": 0,
+        }
+        q = outbox_table.insert().values(**fila).returning(outbox_table.c.id)
+        if conn is not None:
+            return conn.execute(q).scalar_one()
+        with self.engine.begin() as c:
+            return c.execute(q).scalar_one()
@@ -0,0 +1,58 @@
+"""Handler de `OutboxWorker` que publica cada fila en su tópico Pulsar.
+
+El mensaje es el sobre `{"type": event_type, "data": payload}` usado por los
+consumidores del proyecto, con `aggregate_id` como partition_key. Cada tópico
+tiene su productor con batching por clave y envío asíncrono acotado.
+"""
+import json
+import os
+import threading
+
+import pulsar
+
+from alpespartners.seedwork.infraestructura.envio_asincrono import EnvioAsincrono
+from alpespartners.seedwork.infraestructura.productores import pool_productores
+
+# Destino de filas sin tópico (las escritas antes de que el outbox guardara el tópico eran de pagos)
+OUTBOX_DEFAULT_TOPIC = os.getenv('OUTBOX_DEFAULT_TOPIC', 'persistent://public/default/eventos-pagos-json')
+BATCHING_MAX_PUBLISH_DELAY_MS = int(os.getenv('PULSAR_BATCHING_MAX_PUBLISH_DELAY_MS', '10'))
+MAX_IN_FLIGHT = int(os.getenv('PULSAR_MAX_IN_FLIGHT', '1000'))
+
+
+class PublicadorPulsar:
+    def __init__(self, topico_por_defecto: str = OUTBOX_DEFAULT_TOPIC, pool=None):
+        self.topico_por_defecto = topico_por_defecto
+        self._pool = pool
+        self._envios = {}
+        self._lock = threading.Lock()
+
+    def _envio(self, topico: str) -> EnvioAsincrono:
+        envio = self._envios.get(topico)
+        if envio is not None:
+            return envio
+        with self._lock:
+            envio = self._envios.get(topico)
+            if envio is None:
+                pool = self._pool or pool_productores()
+                productor = pool.cliente().create_producer(
+                    topico,
+                    batching_enabled=True,
+                    batching_type=pulsar.BatchingType.KeyBased,
+                    batching_max_publish_delay_ms=BATCHING_MAX_PUBLISH_DELAY_MS,
+                    max_pending_messages=MAX_IN_FLIGHT,
+                    block_if_queue_full=True,
+                )
+                envio = EnvioAsincrono(productor, max_en_vuelo=MAX_IN_FLIGHT)
+                self._envios[topico] = envio
+        return envio
+
+    def __call__(self, fila, conn=None):
+        sobre = {"type": fila.event_type, "data": fila.payload}
+        opciones = {'partition_key': str(fila.aggregate_id)} if fila.aggregate_id else {}
+        return self._envio(fila.topic or self.topico_por_defecto).enviar(
+            json.dumps(sobre).encode('utf-8'), **opciones
+        )
+
+    def flush(self, timeout=None):
+        for envio in list(self._envios.values()):
+            envio.flush(timeout)
@@ -0,0 +1,67 @@
+"""Relay del outbox compartido con workers fragmentados por arrendamiento.
+
+Cada worker publica solo los shards que tiene arrendados (tabla outbox_leases),
+de modo que los eventos de un mismo agregado salen de un único worker en orden
+de id, y las réplicas se rebalancean cuando una muere o se agrega otra.
+
+Entre lotes cada worker duerme en LISTEN sobre `outbox_nuevo` (ver trigger en
+alpespartners_core_schema.sql) y despierta en cuanto se inserta una fila; en
+SQLite, o si LISTEN falla, cae a sondeo cada `interval_ms`.
+"""
+import logging
+import os
+import socket
+import threading
+import time
+from typing import Callable
+
+from alpespartners.config.db import database_url, get_engine
+from alpespartners.infra.message_bus.db_outbox import OUTBOX_SHARDS
+from alpespartners.infra.message_bus.worker import OUTBOX_BATCH_SIZE, OUTBOX_CANAL, OutboxWorker
+from alpespartners.seedwork.infraestructura.arrendamientos import ArrendamientoShards
+from alpespartners.seedwork.infraestructura.despertador import crear_despertador
+
+# Con LISTEN activo el sondeo solo es una red de seguridad (p. ej. NOTIFY perdido en una reconexión)
+OUTBOX_LISTEN_TIMEOUT_MS = int(os.getenv('OUTBOX_LISTEN_TIMEOUT_MS', '30000'))
+OUTBOX_RELAY_WORKERS = int(os.getenv('OUTBOX_RELAY_WORKERS', '1'))
+# Debe superar OUTBOX_SEND_TIMEOUT_S para que un lote en curso no pierda su shard
+OUTBOX_LEASE_TTL_S = float(os.getenv('OUTBOX_LEASE_TTL_S', '60'))
+
+
+def iniciar_relay(handle_event: Callable, interval_ms: int = 1000, batch_size: int = OUTBOX_BATCH_SIZE,
+                  workers: int = OUTBOX_RELAY_WORKERS, listen_timeout_ms: int = OUTBOX_LISTEN_TIMEOUT_MS):
+    """Lanza `workers` hilos daemon de relay, cada uno con sus shards arrendados.
+
+    Mientras haya lotes completos un worker no espera entre ciclos. Con LISTEN
+    activo espera hasta `listen_timeout_ms`; sin él sondea cada `interval_ms`.
+    Retorna los despertadores para que el propio proceso pueda llamar `notificar()`.
+    """
+    db_url = database_url()
+    if not db_url:
+        raise RuntimeError('DB_URL not set; cannot start outbox relay')
+    engine = get_engine(db_url)
+    base = f"{socket.gethostname()}-{os.getpid()}"
+    outbox = OutboxWorker(handle_event, engine=engine, batch_size=batch_size)
+    despertadores = []
+
+    def ciclo(arriendo, despertador):
+        shards, renovado = [], 0.0
+        while True:
+            try:
+                # Renovar en cada lote sería costoso; basta con hacerlo bien dentro del TTL
+                if time.monotonic() - renovado > OUTBOX_LEASE_TTL_S / 3:
+                    shards = arriendo.renovar()
+                    renovado = time.monotonic()
+                enviados, fallidos = outbox.procesar_lote(shards)
+                if enviados >= batch_size:
+                    continue
+            except Exception:
+                logging.exception('[OUTBOX] Error en el relay; reintentando')
+            despertador.esperar(interval_ms / 1000.0)
+
+    for i in range(max(1, workers)):
+        arriendo = ArrendamientoShards(engine, f"{base}-{i}", total=OUTBOX_SHARDS, ttl_s=OUTBOX_LEASE_TTL_S)
+        despertador = crear_despertador(engine, OUTBOX_CANAL, timeout_listen_s=listen_timeout_ms / 1000.0)
+        despertadores.append(despertador)
+        threading.Thread(target=ciclo, args=(arriendo, despertador), name=f'outbox-relay-{i}', daemon=True).start()
+    return despertadores
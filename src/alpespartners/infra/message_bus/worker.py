@@ -0,0 +1,191 @@
+"""Worker genérico del outbox compartido.
+
+Cada lote se reclama en una transacción (`FOR UPDATE SKIP LOCKED` en Postgres)
+y cada fila se entrega a `handle_event(fila, conn)`. Si el handler retorna un
+Future (p. ej. un envío asíncrono a Pulsar) se esperan todos juntos. Las filas
+exitosas se marcan SENT con un solo UPDATE y las fallidas se registran una a
+una con su contador de reintentos; al agotarlos quedan FAILED.
+
+El orden por `aggregate_id` se respeta aun con fallos: el lote se publica por
+olas (la k-ésima fila pendiente de cada agregado) y un agregado con una fila
+fallida no publica nada más en ese lote. La fila fallida espera
+(`next_attempt_at`, espera exponencial) y, mientras espera, las filas
+posteriores de su agregado tampoco salen: la consulta de reclamo ya las
+excluye, así que no ocupan lugar en el lote.
+"""
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict, deque
+from concurrent.futures import Future, wait
+from datetime import datetime, timedelta
+from typing import Callable, List, Optional, Tuple
+
+from sqlalchemy import bindparam, case, or_, select, update
+
+from alpespartners.infra.message_bus.db_outbox import _get_engine, outbox_table
+from alpespartners.seedwork.infraestructura.despertador import crear_despertador
+
+OUTBOX_BATCH_SIZE = int(os.getenv('OUTBOX_BATCH_SIZE', '500'))
+OUTBOX_MAX_RETRIES = int(os.getenv('OUTBOX_MAX_RETRIES', '10'))
+OUTBOX_SEND_TIMEOUT_S = float(os.getenv('OUTBOX_SEND_TIMEOUT_S', '30'))
+OUTBOX_BACKOFF_BASE_S = float(os.getenv('OUTBOX_BACKOFF_BASE_S', '1'))
+OUTBOX_BACKOFF_MAX_S = float(os.getenv('OUTBOX_BACKOFF_MAX_S', '300'))
+OUTBOX_CANAL = 'outbox_nuevo'
+
+_t = outbox_table
+
+SQL_MARK_SENT = (
+    update(_t)
+    .where(_t.c.id.in_(bindparam('ids', expanding=True)))
+    .values(status='SENT', published_at=bindparam('ahora'), updated_at=bindparam('ahora'))
+)
+
+SQL_MARK_FAILED = (
+    update(_t)
+    .where(_t.c.id == bindparam('id_fila'))
+    .values(
+        retries=_t.c.retries + 1,
+        last_error=bindparam('error'),
+        updated_at=bindparam('ahora'),
+        next_attempt_at=bindparam('siguiente'),
+        status=case((_t.c.retries + 1 >= bindparam('max_retries'), 'FAILED'), else_='PENDING')
+    )
+)
+
+
+class OutboxWorker:
+    def __init__(self, handle_event: Callable, engine=None, batch_size: int = OUTBOX_BATCH_SIZE,
+                 max_retries: int = OUTBOX_MAX_RETRIES):
+        self.handle_event = handle_event
+        self._engine = engine
+        self.batch_size = batch_size
+        self.max_retries = max_retries
+        self._activo = threading.Event()
+
+    @property
+    def engine(self):
+        if self._engine is None:
+            self._engine = _get_engine()
+        return self._engine
+
+    def _reclamar(self, shards: Optional[List[int]]):
+        """Filas PENDING listas para salir, en orden de id.
+
+        El filtro de espera va antes del LIMIT: un agregado bloqueado con más de
+        `batch_size` filas no llena el lote ni deja sin turno al resto del shard.
+        """
+        previa = _t.alias('previa')
+        bloqueada = (
+            select(previa.c.id)
+            .where(previa.c.aggregate_id == _t.c.aggregate_id, previa.c.status == 'PENDING',
+                   previa.c.id < _t.c.id, previa.c.next_attempt_at > bindparam('ahora'))
+            .exists()
+        )
+        q = (
+            select(_t)
+            .where(_t.c.status == 'PENDING',
+                   or_(_t.c.next_attempt_at.is_(None), _t.c.next_attempt_at <= bindparam('ahora')),
+                   ~bloqueada)
+            .order_by(_t.c.id)
+            .limit(self.batch_size)
+        )
+        if shards is not None:
+            q = q.where(_t.c.shard.in_(shards))
+        if self.engine.dialect.name == 'postgresql':
+            q = q.with_for_update(skip_locked=True)
+        return q
+
+    @staticmethod
+    def _por_agregado(filas, ahora) -> "OrderedDict[object, deque]":
+        """Filas publicables agrupadas por agregado, en orden de id.
+
+        Un agregado cuya primera fila pendiente sigue en espera se omite completo.
+        """
+        colas: "OrderedDict[object, deque]" = OrderedDict()
+        en_espera = set()
+        for fila in filas:
+            clave = fila.aggregate_id if fila.aggregate_id is not None else ('fila', fila.id)
+            if clave in en_espera:
+                continue
+            if clave not in colas and fila.next_attempt_at is not None and fila.next_attempt_at > ahora:
+                en_espera.add(clave)
+                continue
+            colas.setdefault(clave, deque()).append(fila)
+        return colas
+
+    def _espera(self, reintentos: int) -> timedelta:
+        return timedelta(seconds=min(OUTBOX_BACKOFF_BASE_S * 2 ** reintentos, OUTBOX_BACKOFF_MAX_S))
+
+    def procesar_lote(self, shards: Optional[List[int]] = None) -> Tuple[int, int]:
+        """Procesa un lote (solo de `shards` si se indican); retorna (enviados, fallidos)."""
+        if shards is not None and not shards:
+            return 0, 0
+        with self.engine.begin() as conn:
+            ahora = datetime.utcnow()
+            filas = conn.execute(self._reclamar(shards), {"ahora": ahora}).fetchall()
+            if not filas:
+                return 0, 0
+            colas = self._por_agregado(filas, ahora)
+            limite = time.monotonic() + OUTBOX_SEND_TIMEOUT_S
+            enviados, fallidos = [], []
+            while colas:
+                resultados = []
+                for clave, cola in list(colas.items()):
+                    fila = cola.popleft()
+                    try:
+                        resultados.append((clave, fila, self.handle_event(fila, conn)))
+                    except Exception as exc:
+                        fallidos.append((fila, str(exc)))
+                        del colas[clave]
+                futuros = [r for _, _, r in resultados if isinstance(r, Future)]
+                if futuros:
+                    wait(futuros, timeout=max(0.0, limite - time.monotonic()))
+                for clave, fila, resultado in resultados:
+                    error = None
+                    if isinstance(resultado, Future):
+                        if not resultado.done():
+                            error = 'timeout esperando confirmación del broker'
+                        elif resultado.exception() is not None:
+                            error = str(resultado.exception())
+                    if error is None:
+                        enviados.append(fila.id)
+                    else:
+                        # El resto del agregado espera a que esta fila salga
+                        fallidos.append((fila, error))
+                        colas.pop(clave, None)
+                colas = OrderedDict((clave, cola) for clave, cola in colas.items() if cola)
+            ahora = datetime.utcnow()
+            if enviados:
+                conn.execute(SQL_MARK_SENT, {"ids": enviados, "ahora": ahora})
+            if fallidos:
+                logging.warning(f"[OUTBOX] {len(fallidos)} filas fallaron; se reintentarán con espera")
+                conn.execute(SQL_MARK_FAILED, [
+                    {"id_fila": fila.id, "error": error, "ahora": ahora, "max_retries": self.max_retries,
+                     "siguiente": ahora + self._espera(fila.retries)}
+                    for fila, error in fallidos
+                ])
+        return len(enviados), len(fallidos)
+
+    def run_once(self) -> int:
+        """Procesa un lote y retorna cuántas filas quedaron SENT."""
+        return self.procesar_lote()[0]
+
+    def run_forever(self, interval_ms: int = 1000):
+        """Drena el outbox; entre lotes incompletos espera un NOTIFY (Postgres) o el intervalo."""
+        despertador = crear_despertador(self.engine, OUTBOX_CANAL)
+        self._activo.set()
+        try:
+            while self._activo.is_set():
+                try:
+                    if self.run_once() >= self.batch_size:
+                        continue
+                except Exception:
+                    logging.exception('[OUTBOX] Error en el worker; reintentando')
+                despertador.esperar(interval_ms / 1000.0)
+        finally:
+            despertador.cerrar()
+
+    def stop(self):
+        self._activo.clear()
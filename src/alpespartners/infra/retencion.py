@@ -0,0 +1,161 @@
+"""Retención de `processed_events` ligada a la ventana de redelivery del broker.
+
+Un evento solo puede volver a llegar mientras el broker lo retenga
+(PULSAR_REDELIVERY_WINDOW_S: TTL/retención del tópico). Pasada esa ventana,
+más un margen, sus marcas de idempotencia ya no sirven.
+
+En Postgres la tabla está particionada por día (`bucket`). La poda separa
+(DETACH) y elimina (DROP) las particiones vencidas, así no deja tuplas muertas
+ni trabajo de VACUUM sobre el índice único. La partición DEFAULT (días que
+llegaron antes de crear su partición) no tiene límite superior: sus filas
+vencidas se borran por bucket. Si la tabla no está particionada
+(creada con create_all, SQLite, desarrollo) se cae a DELETE por lotes de
+PROCESSED_EVENTS_PRUNE_BATCH filas, para no retener locks en una sola transacción
+larga.
+
+Pensado para correr programado: como hilo (`iniciar_poda`, START_PROCESSED_EVENTS_PRUNER=1)
+o como job externo (cron/CronJob):
+    PYTHONPATH=src python -m alpespartners.infra.retencion
+"""
+import argparse
+import logging
+import os
+import re
+import threading
+from datetime import date, datetime, timedelta
+from typing import List, Optional
+
+from sqlalchemy import text
+
+from alpespartners.config.db import database_url, get_engine
+
+VENTANA_REDELIVERY_S = int(os.getenv('PULSAR_REDELIVERY_WINDOW_S', str(7 * 24 * 3600)))
+MARGEN_S = int(os.getenv('PROCESSED_EVENTS_RETENTION_MARGIN_S', str(24 * 3600)))
+DIAS_ADELANTE = int(os.getenv('PROCESSED_EVENTS_PARTITIONS_AHEAD', '3'))
+INTERVALO_PODA_S = int(os.getenv('PROCESSED_EVENTS_PRUNE_INTERVAL_S', '3600'))
+LOTE_PODA = int(os.getenv('PROCESSED_EVENTS_PRUNE_BATCH', '10000'))
+
+_LIMITE_SUPERIOR = re.compile(r"TO \('(\d{4}-\d{2}-\d{2})")
+
+
+def limite_retencion(ahora: Optional[datetime] = None) -> date:
+    """Primer día que se conserva: todo bucket anterior está fuera de la ventana de redelivery."""
+    ahora = ahora or datetime.utcnow()
+    return (ahora - timedelta(seconds=VENTANA_REDELIVERY_S + MARGEN_S)).date()
+
+
+def particionada(c) -> bool:
+    """Si processed_events es una tabla particionada de Postgres (y no la simple de create_all)."""
+    return c.dialect.name == 'postgresql' and bool(c.execute(text(
+        "SELECT EXISTS (SELECT 1 FROM pg_partitioned_table WHERE partrelid = to_regclass('processed_events'))"
+    )).scalar())
+
+
+def asegurar_particiones(engine, dias_adelante: int = DIAS_ADELANTE, hoy: Optional[date] = None) -> List[str]:
+    hoy = hoy or datetime.utcnow().date()
+    dias = [hoy + timedelta(days=n) for n in range(dias_adelante + 1)]
+    with engine.begin() as c:
+        if not particionada(c):
+            return []
+        for dia in dias:
+            c.execute(text("SELECT processed_events_crear_particion(:dia)"), {"dia": dia})
+    return [f"processed_events_{dia:%Y%m%d}" for dia in dias]
+
+
+def tamano_indices(engine) -> Optional[int]:
+    """Bytes de los índices de processed_events (todas las particiones); None si el motor no lo expone."""
+    if engine.dialect.name != 'postgresql':
+        return None
+    with engine.connect() as c:
+        if not particionada(c):
+            return c.execute(text("SELECT pg_indexes_size('processed_events'::regclass)")).scalar()
+        return c.execute(text(
+            "SELECT COALESCE(SUM(pg_indexes_size(inhrelid)), 0) FROM pg_inherits "
+            "WHERE inhparent = 'processed_events'::regclass"
+        )).scalar()
+
+
+def _particiones_vencidas(c, limite: date) -> List[str]:
+    filas = c.execute(text(
+        "SELECT ch.relname, pg_get_expr(ch.relpartbound, ch.oid) FROM pg_inherits i "
+        "JOIN pg_class ch ON ch.oid = i.inhrelid WHERE i.inhparent = 'processed_events'::regclass"
+    )).fetchall()
+    vencidas = []
+    for nombre, limites in filas:
+        m = _LIMITE_SUPERIOR.search(limites or '')
+        if m and date.fromisoformat(m.group(1)) <= limite:
+            vencidas.append(nombre)
+    return sorted(vencidas)
+
+
+def _borrar_por_lotes(engine, tabla: str, limite: date, lote: Optional[int] = None) -> int:
+    """DELETE de los buckets anteriores a `limite` en transacciones de hasta `lote` filas."""
+    lote = lote or LOTE_PODA
+    q = text(f"DELETE FROM {tabla} WHERE id IN (SELECT id FROM {tabla} WHERE bucket < :limite LIMIT :lote)")
+    total = 0
+    while True:
+        with engine.begin() as c:
+            borradas = c.execute(q, {"limite": limite, "lote": lote}).rowcount
+        total += borradas
+        if borradas < lote:
+            return total
+
+
+def podar_processed_events(engine=None, ahora: Optional[datetime] = None) -> dict:
+    """Elimina las marcas fuera de la ventana de redelivery; retorna un reporte de la poda."""
+    engine = engine or get_engine(database_url())
+    limite = limite_retencion(ahora)
+    reporte = {"limite": limite.isoformat(), "particiones": [], "filas_podadas": 0,
+               "indices_bytes_antes": tamano_indices(engine)}
+    with engine.connect() as c:
+        por_particiones = particionada(c)
+    if por_particiones:
+        asegurar_particiones(engine, hoy=(ahora or datetime.utcnow()).date())
+        with engine.connect() as c:
+            vencidas = _particiones_vencidas(c, limite)
+        for nombre in vencidas:
+            with engine.begin() as c:
+                reporte["filas_podadas"] += c.execute(text(f'SELECT COUNT(*) FROM "{nombre}"')).scalar()
+                c.execute(text(f'ALTER TABLE processed_events DETACH PARTITION "{nombre}"'))
+                c.execute(text(f'DROP TABLE "{nombre}"'))
+            reporte["particiones"].append(nombre)
+        with engine.connect() as c:
+            con_default = c.execute(text("SELECT to_regclass('processed_events_default') IS NOT NULL")).scalar()
+        if con_default:
+            reporte["filas_podadas"] += _borrar_por_lotes(engine, "processed_events_default", limite)
+    else:
+        reporte["filas_podadas"] = _borrar_por_lotes(engine, "processed_events", limite)
+    reporte["indices_bytes_despues"] = tamano_indices(engine)
+    logging.info(f"[RETENCION] processed_events: {reporte}")
+    return reporte
+
+
+def iniciar_poda(intervalo_s: float = INTERVALO_PODA_S, engine=None) -> threading.Event:
+    """Poda periódica en un hilo daemon; `set()` sobre el evento retornado la detiene."""
+    detener = threading.Event()
+
+    def ciclo():
+        while not detener.is_set():
+            try:
+                podar_processed_events(engine)
+            except Exception:
+                logging.exception('[RETENCION] Falló la poda de processed_events')
+            detener.wait(intervalo_s)
+
+    threading.Thread(target=ciclo, name='poda-processed-events', daemon=True).start()
+    return detener
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--db-url', default=None, help='URL SQLAlchemy (por defecto DB_URL/DATABASE_URL)')
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO)
+    db_url = args.db_url or database_url()
+    if not db_url:
+        parser.error('se requiere DB_URL o --db-url')
+    print(podar_processed_events(get_engine(db_url)))
+
+
+if __name__ == '__main__':
+    main()
@@ -1,8 +1,13 @@
+import os
 import pulsar
 import json
 import logging
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
 from pulsar import ConsumerType
-from threading import Thread
+from alpespartners.modulos.campanias.infraestructura.enrutador_saga import EnrutadorRespuestasSaga
+from alpespartners.modulos.campanias.infraestructura import saga_store
+from alpespartners.seedwork.infraestructura.rueda_temporizadores import RuedaTemporizadores
 
 # Configuración de canales Pulsar
 PULSAR_BROKER_URL = 'pulsar://broker:6650'
@@ -11,6 +16,12 @@ TOPIC_COMANDOS_PAGOS = 'persistent://public/default/comandos-pagos'
 TOPIC_EVENTOS_PAGOS = 'persistent://public/default/eventos-pagos-json'
 TOPIC_COMANDOS_CLIENTES = 'persistent://public/default/comandos-clientes'
 
+# Plazo máximo para recibir PagoExitoso/PagoFallido antes de compensar
+SAGA_TIMEOUT_S = float(os.getenv('SAGA_TIMEOUT_S', '300'))
+# Hilos que ejecutan las compensaciones por timeout (BD y Pulsar), fuera del hilo de la rueda
+SAGA_COMPENSATION_WORKERS = int(os.getenv('SAGA_COMPENSATION_WORKERS', '4'))
+PASO_ESPERANDO_PAGO = 'ESPERANDO_PAGO'
+
 class SagaOrquestador:
     def __init__(self):
         self.client = pulsar.Client(PULSAR_BROKER_URL)
@@ -18,19 +29,30 @@ class SagaOrquestador:
         self.producer_pagos = self.client.create_producer(TOPIC_COMANDOS_PAGOS)
         self.producer_clientes = self.client.create_producer(TOPIC_COMANDOS_CLIENTES)
         self.consumer_pagos = self.client.subscribe(TOPIC_EVENTOS_PAGOS, subscription_name='saga-campanias', consumer_type=ConsumerType.Shared)
+        # Un único lector de respuestas para todas las sagas en curso
+        self.enrutador = EnrutadorRespuestasSaga(self.consumer_pagos)
+        self.enrutador.iniciar()
+        # Un solo hilo atiende los plazos de todas las sagas pendientes
+        self.rueda = RuedaTemporizadores()
+        self.rueda.iniciar()
+        self.compensaciones = ThreadPoolExecutor(max_workers=SAGA_COMPENSATION_WORKERS,
+                                                 thread_name_prefix='saga-compensaciones')
+        self.recuperar_sagas()
 
     def iniciar_saga(self, campania_data):
         # Paso 1: Crear campaña usando la lógica real
-        from alpespartners.modulos.campanias.aplicacion.dto import CrearCampaniaDTO
-        from alpespartners.modulos.campanias.aplicacion.servicio import CampaniasService
-        service = CampaniasService()
-        cmd = CrearCampaniaDTO(
-            idCampania=campania_data['idCampania'],
-            idCliente=campania_data['idCliente'],
-            itinerario=campania_data['itinerario']
-        )
-        service.handle_crear_campania(cmd)
+        from campanias.application.servicio import crear_campania_cmd
+        crear_campania_cmd(campania_data)
         logging.info(f"[SAGA] Campania creada y evento publicado: {campania_data}")
+        # Se persiste la saga antes de enviar el comando para poder recuperarla tras un reinicio
+        saga_store.guardar_saga(
+            campania_data['idCampania'],
+            PASO_ESPERANDO_PAGO,
+            datetime.utcnow() + timedelta(seconds=SAGA_TIMEOUT_S),
+            campania_data
+        )
+        # Paso 3 se registra antes de enviar el comando para no perder respuestas rápidas
+        futuro = self._esperar_pago(campania_data, SAGA_TIMEOUT_S)
         # Paso 2: Enviar comando para procesar pago usando Pulsar
         comando_pago = {
             'type': 'ProcesarPago',
@@ -43,30 +65,56 @@ class SagaOrquestador:
         }
         self.producer_pagos.send(json.dumps(comando_pago).encode('utf-8'))
         logging.info(f"[SAGA] Comando ProcesarPago enviado: {comando_pago}")
-        # Paso 3: Esperar resultado del pago
-        Thread(target=self.escuchar_eventos_pago, args=(campania_data,)).start()
+        return futuro
+
+    def _esperar_pago(self, campania_data, timeout_s):
+        id_campania = campania_data['idCampania']
+        futuro = self.enrutador.registrar(
+            id_campania,
+            lambda tipo, data: self.procesar_respuesta_pago(campania_data, tipo, data)
+        )
+        self.rueda.programar(timeout_s, lambda: self.expirar_saga(campania_data), clave=id_campania)
+        return futuro
+
+    def recuperar_sagas(self):
+        """Re-registra las sagas en curso y reprograma sus plazos con el tiempo restante."""
+        ahora = datetime.utcnow()
+        sagas = saga_store.sagas_pendientes()
+        for saga in sagas:
+            restante = (saga['deadline'] - ahora).total_seconds() if saga['deadline'] else SAGA_TIMEOUT_S
+            self._esperar_pago(saga['data'], max(0.0, restante))
+        if sagas:
+            logging.info(f"[SAGA] {len(sagas)} sagas pendientes recuperadas")
 
-    def escuchar_eventos_pago(self, campania_data):
-        while True:
-            msg = self.consumer_pagos.receive()
-            raw = msg.data()
-            try:
-                evento = json.loads(raw)
-            except Exception as e:
-                logging.error(f"[CAMPANIAS][SAGA_ORQ] Error parseando evento. Raw: {raw}. Error: {e}")
-                consumer.acknowledge(msg)
-                continue
-            tipo = evento.get('type')
-            data = evento.get('data', {})
-            if data.get('idCampania') != campania_data['idCampania']:
-                self.consumer_pagos.acknowledge(msg)
-                continue
-            if tipo == 'PagoExitoso':
+    def procesar_respuesta_pago(self, campania_data, tipo, data):
+        id_campania = campania_data['idCampania']
+        self.rueda.cancelar(id_campania)
+        if tipo == 'PagoExitoso':
+            if saga_store.finalizar_saga(id_campania, 'PAGO_CONFIRMADO', saga_store.ESTADO_COMPLETADA):
                 self.procesar_pago_exitoso(campania_data, data)
-            elif tipo == 'PagoFallido':
+        elif tipo == 'PagoFallido':
+            if saga_store.finalizar_saga(id_campania, 'PAGO_FALLIDO', saga_store.ESTADO_COMPENSADA):
                 self.procesar_pago_fallido(campania_data, data)
-            self.consumer_pagos.acknowledge(msg)
-            break
+
+    def expirar_saga(self, campania_data):
+        """Callback de la rueda: solo retira la saga; la compensación corre en el pool.
+
+        El hilo de la rueda atiende los plazos de todas las sagas, así que no
+        debe bloquearse en la base de datos ni en Pulsar.
+        """
+        # Si la respuesta ya fue entregada, gana la respuesta y el timeout se descarta
+        if self.enrutador.cancelar(campania_data['idCampania']):
+            self.compensaciones.submit(self._compensar_timeout, campania_data)
+
+    def _compensar_timeout(self, campania_data):
+        id_campania = campania_data['idCampania']
+        try:
+            if saga_store.finalizar_saga(id_campania, 'TIMEOUT', saga_store.ESTADO_COMPENSADA):
+                logging.warning(f"[SAGA] Timeout esperando respuesta de pagos para {id_campania}; compensando")
+                self.procesar_pago_fallido(campania_data, {'reason': 'Timeout esperando respuesta de pagos'})
+        except Exception:
+            # Si falla antes de finalizarla, la saga sigue pendiente y se recupera al reiniciar
+            logging.exception(f"[SAGA] Error compensando timeout de {id_campania}")
 
     def procesar_pago_exitoso(self, campania_data, pago_data):
         # Actualizar estado de campaña usando la lógica real
@@ -106,6 +154,9 @@ class SagaOrquestador:
         logging.info(f"[SAGA] Comando ActualizarCliente enviado: {comando_cliente}")
 
     def close(self):
+        self.rueda.detener()
+        self.compensaciones.shutdown(wait=True)
+        self.enrutador.detener()
         self.client.close()
 
 # Ejemplo de uso
@@ -0,0 +1,128 @@
+"""Enrutador único de respuestas de pagos para las sagas de campanias.
+
+Un solo hilo lee `eventos-pagos-json` y entrega cada respuesta a la saga
+pendiente indexada por `idCampania`, en lugar de un hilo por saga compitiendo
+por el mismo consumer. Los callbacks se ejecutan en un pool de tamaño fijo.
+"""
+import json
+import logging
+import threading
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor
+
+import pulsar
+
+TIPOS_RESPUESTA = ('PagoExitoso', 'PagoFallido')
+ESPERA_MAX_S = 30.0
+
+
+class EnrutadorRespuestasSaga:
+    def __init__(self, consumer, clave='idCampania', workers=4, max_huerfanas=10000):
+        self.consumer = consumer
+        self.clave = clave
+        self.max_huerfanas = max_huerfanas
+        self._pendientes = {}
+        # Respuestas que llegan antes de registrar la saga (o tras un reinicio)
+        self._huerfanas = OrderedDict()
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='saga-respuestas')
+        self._activo = False
+        self._detenido = threading.Event()
+        self._hilo = None
+
+    def iniciar(self):
+        self._activo = True
+        self._detenido.clear()
+        self._hilo = threading.Thread(target=self._escuchar, name='saga-enrutador', daemon=True)
+        self._hilo.start()
+
+    def registrar(self, id_saga, callback=None) -> Future:
+        """Registra una saga pendiente; el Future se completa con (tipo, data)."""
+        futuro = Future()
+        if callback is not None:
+            futuro.add_done_callback(lambda f: self._executor.submit(self._invocar, callback, f))
+        with self._lock:
+            huerfana = self._huerfanas.pop(id_saga, None)
+            if huerfana is None:
+                self._pendientes[id_saga] = futuro
+        if huerfana is not None:
+            futuro.set_result(huerfana)
+        return futuro
+
+    def cancelar(self, id_saga) -> bool:
+        """Retira la saga pendiente; retorna False si su respuesta ya fue entregada."""
+        with self._lock:
+            futuro = self._pendientes.pop(id_saga, None)
+        if futuro is None:
+            return False
+        futuro.cancel()
+        return True
+
+    def pendientes(self) -> int:
+        with self._lock:
+            return len(self._pendientes)
+
+    def entregar(self, tipo, data) -> bool:
+        """Completa la saga asociada a `data[clave]`; retorna False si no había saga pendiente."""
+        id_saga = data.get(self.clave)
+        with self._lock:
+            futuro = self._pendientes.pop(id_saga, None)
+            if futuro is None:
+                self._huerfanas[id_saga] = (tipo, data)
+                while len(self._huerfanas) > self.max_huerfanas:
+                    self._huerfanas.popitem(last=False)
+        if futuro is None:
+            return False
+        futuro.set_result((tipo, data))
+        return True
+
+    def _invocar(self, callback, futuro):
+        if futuro.cancelled():
+            return
+        tipo, data = futuro.result()
+        try:
+            callback(tipo, data)
+        except Exception:
+            logging.exception(f"[SAGA] Error procesando respuesta {tipo} para {data.get(self.clave)}")
+
+    def _escuchar(self):
+        fallas = 0
+        while self._activo:
+            try:
+                msg = self.consumer.receive(timeout_millis=1000)
+            except pulsar.Timeout:
+                # timeout de receive: permite revisar si el enrutador sigue activo
+                fallas = 0
+                continue
+            except pulsar.AlreadyClosed:
+                logging.error("[SAGA] El consumer de respuestas está cerrado; el enrutador se detiene")
+                self._activo = False
+                return
+            except Exception:
+                # consumer roto (p. ej. broker caído): espera creciente en vez de girar en vacío
+                espera = min(2 ** fallas, ESPERA_MAX_S)
+                fallas += 1
+                logging.exception(f"[SAGA] Error recibiendo respuestas de pagos; reintento en {espera}s")
+                self._detenido.wait(espera)
+                continue
+            fallas = 0
+            raw = msg.data()
+            try:
+                evento = json.loads(raw)
+            except Exception as e:
+                logging.error(f"[CAMPANIAS][SAGA_ORQ] Error parseando evento. Raw: {raw}. Error: {e}")
+                self.consumer.acknowledge(msg)
+                continue
+            tipo = evento.get('type')
+            data = evento.get('data') or {}
+            if tipo in TIPOS_RESPUESTA and data.get(self.clave) is not None:
+                if not self.entregar(tipo, data):
+                    logging.info(f"[SAGA] Respuesta {tipo} sin saga pendiente para {data.get(self.clave)}")
+            self.consumer.acknowledge(msg)
+
+    def detener(self):
+        self._activo = False
+        self._detenido.set()
+        if self._hilo is not None:
+            self._hilo.join(timeout=5)
+        self._executor.shutdown(wait=True)
@@ -0,0 +1,67 @@
+"""Estado persistente de las sagas de campanias (tabla saga_instances).
+
+Cada saga guarda su paso actual, su plazo (deadline) y el id de correlación
+(idCampania), de modo que un reinicio del orquestador puede recuperar las
+sagas pendientes y reprogramar sus timeouts.
+"""
+import json
+from datetime import datetime
+from typing import Any, Dict, List
+from sqlalchemy import text
+from alpespartners.config.db import db, get_engine
+
+ESTADO_EN_CURSO = 'EN_CURSO'
+ESTADO_COMPLETADA = 'COMPLETADA'
+ESTADO_COMPENSADA = 'COMPENSADA'
+
+
+class SagaInstanceModel(db.Model):
+    __tablename__ = 'saga_instances'
+    id = db.Column(db.String(255), primary_key=True)  # id de correlación (idCampania)
+    paso = db.Column(db.String(64), nullable=False)
+    estado = db.Column(db.String(32), nullable=False, default=ESTADO_EN_CURSO, index=True)
+    deadline = db.Column(db.DateTime, index=True)
+    data = db.Column(db.Text)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+
+def guardar_saga(id_saga: str, paso: str, deadline: datetime, data: Dict[str, Any]):
+    q = text(
+        "INSERT INTO saga_instances (id, paso, estado, deadline, data, created_at, updated_at) "
+        "VALUES (:id, :paso, :estado, :deadline, :data, :ahora, :ahora) "
+        "ON CONFLICT (id) DO UPDATE SET paso = EXCLUDED.paso, estado = EXCLUDED.estado, "
+        "deadline = EXCLUDED.deadline, data = EXCLUDED.data, updated_at = EXCLUDED.updated_at"
+    )
+    with get_engine().begin() as c:
+        c.execute(q, {"id": id_saga, "paso": paso, "estado": ESTADO_EN_CURSO, "deadline": deadline,
+                      "data": json.dumps(data), "ahora": datetime.utcnow()})
+
+
+def finalizar_saga(id_saga: str, paso: str, estado: str) -> bool:
+    """Cierra la saga si sigue en curso; retorna False si otro camino ya la cerró."""
+    q = text(
+        "UPDATE saga_instances SET paso = :paso, estado = :estado, deadline = NULL, updated_at = :ahora "
+        "WHERE id = :id AND estado = :en_curso"
+    )
+    with get_engine().begin() as c:
+        r = c.execute(q, {"id": id_saga, "paso": paso, "estado": estado,
+                          "en_curso": ESTADO_EN_CURSO, "ahora": datetime.utcnow()})
+        return r.rowcount > 0
+
+
+def sagas_pendientes() -> List[Dict[str, Any]]:
+    q = text("SELECT id, paso, deadline, data FROM saga_instances WHERE estado = :en_curso ORDER BY deadline")
+    with get_engine().connect() as c:
+        filas = c.execute(q, {"en_curso": ESTADO_EN_CURSO}).fetchall()
+    return [
+        {"id": r[0], "paso": r[1], "deadline": _como_datetime(r[2]), "data": json.loads(r[3]) if r[3] else {}}
+        for r in filas
+    ]
+
+
+def _como_datetime(valor):
+    # SQLite devuelve los DATETIME de consultas textuales como str
+    if isinstance(valor, str):
+        return datetime.fromisoformat(valor)
+    return valor
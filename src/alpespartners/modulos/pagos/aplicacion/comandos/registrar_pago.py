@@ -43,16 +43,13 @@ class ProcesarPago(Comando):
 class ProcesarPagoHandler(ComandoHandler):
     def handle(self, comando):
         # Solo publicar el comando en Pulsar
-        import pulsar, json, logging, os
+        import json, logging
+        from alpespartners.seedwork.infraestructura.productores import pool_productores
         logging.basicConfig(level=logging.INFO, force=True)
-        PULSAR_BROKER_URL = os.environ['PULSAR_BROKER_URL']
         TOPIC_COMANDOS_PAGOS = 'persistent://public/default/comandos-pagos'
-        client = pulsar.Client(PULSAR_BROKER_URL)
-        producer = client.create_producer(TOPIC_COMANDOS_PAGOS)
         mensaje = {'type': 'ProcesarPago', 'data': comando.__dict__}
-        producer.send(json.dumps(mensaje).encode('utf-8'))
+        pool_productores().enviar(TOPIC_COMANDOS_PAGOS, json.dumps(mensaje).encode('utf-8'))
         print(f"[PULSAR][PUBLICACION][COMANDO] Comando publicado en Pulsar: {mensaje}")
-        client.close()
         return 'ok'
 
 @comando.register(ProcesarPago)
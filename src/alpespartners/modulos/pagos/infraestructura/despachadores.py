@@ -1,24 +1,20 @@
-import pulsar
-from pulsar.schema import *
 import datetime
 import logging
 
 from alpespartners.modulos.pagos.infraestructura.schema.v1.eventos import EventoPagoExitoso, PagoExitosoPayload, EventoPagoFallido, PagoFallidoPayload
 from alpespartners.modulos.pagos.infraestructura.schema.v1.comandos import ComandoProcesarPago, ComandoProcesarPagoPayload
-from alpespartners.seedwork.infraestructura import utils
+from alpespartners.seedwork.infraestructura.productores import pool_productores
 epoch = datetime.datetime.utcfromtimestamp(0)
 
 def unix_time_millis(dt):
     return (dt - epoch).total_seconds() * 1000.0
 
 class Despachador:
-    def _publicar_mensaje(self, mensaje, topico, schema):
+    def _publicar_mensaje(self, mensaje, topico, clase):
         try:
-            cliente = pulsar.Client(f'pulsar://{utils.broker_host()}:6650')
-            publicador = cliente.create_producer(topico, schema=schema)
-            publicador.send(mensaje)
+            # Cliente y productor compartidos por (tópico, schema): un solo send por mensaje
+            pool_productores().enviar(topico, mensaje, clase)
             logging.info(f"======== Mensaje publicado en el tópico {topico} ========")
-            cliente.close()
         except Exception as e:
             logging.error(f"[Pagos] ERROR: Publicando en Pulsar: {e}")
 
@@ -35,7 +31,7 @@ class Despachador:
                 correlation_id=str(evento_dominio.correlation_id)
             )
             evento_integracion = EventoPagoExitoso(data=payload)
-            self._publicar_mensaje(evento_integracion, topico, AvroSchema(EventoPagoExitoso))
+            self._publicar_mensaje(evento_integracion, topico, EventoPagoExitoso)
         
         elif isinstance(evento_dominio, EventoPagoFallido):
             payload = PagoFallidoPayload(
@@ -49,7 +45,7 @@ class Despachador:
                 correlation_id=str(evento_dominio.correlation_id)
             )
             evento_integracion = EventoPagoFallido(data=payload)
-            self._publicar_mensaje(evento_integracion, topico, AvroSchema(EventoPagoFallido))
+            self._publicar_mensaje(evento_integracion, topico, EventoPagoFallido)
         
         else:
             logging.warning(f"[Pagos] Evento de dominio de tipo {type(evento_dominio).__name__} no tiene un mapeo de integración.")
@@ -63,6 +59,6 @@ class Despachador:
                  correlation_id=str(comando_app.correlation_id)
              )
              comando_integracion = ComandoProcesarPago(data=payload)
-             self._publicar_mensaje(comando_integracion, topico, AvroSchema(ComandoProcesarPago))
+             self._publicar_mensaje(comando_integracion, topico, ComandoProcesarPago)
         else:
             logging.warning(f"[Pagos] Comando de tipo {type(comando_app).__name__} no tiene un mapeo de integración.")
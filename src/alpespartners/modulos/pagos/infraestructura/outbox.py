@@ -1,18 +1,16 @@
 import threading
-import threading
 import time
-import os
-from sqlalchemy import create_engine, text
+from sqlalchemy import text
+from alpespartners.config.db import database_url, get_engine
 from alpespartners.modulos.pagos.infraestructura.publisher import publish_event
 import logging
 
 
 def outbox_poller(interval_ms=1000):
-    db_url = os.getenv('DB_URL') or os.getenv('DATABASE_URL')
+    db_url = database_url()
     if not db_url:
         raise RuntimeError('DB_URL not set; cannot start outbox poller')
-    db_url_sql = db_url.replace('+psycopg2', '')
-    engine = create_engine(db_url_sql, pool_pre_ping=True)
+    engine = get_engine(db_url)
 
     def poll():
         while True:
@@ -0,0 +1,94 @@
+"""Reparto de shards entre workers mediante arrendamientos (leases) en la base.
+
+Las claves de agregado se mapean a `total` shards lógicos (crc32 % total). Cada
+worker registra un latido en `<prefijo>_workers` y arrienda shards en
+`<prefijo>_leases` hasta su cuota justa (ceil(total / workers vivos)). Si un
+worker muere sus arriendos expiran y los demás los toman; si llega uno nuevo,
+los que exceden su cuota liberan shards en su siguiente renovación.
+
+Las tomas son UPDATE condicionales (dueño nulo o arriendo vencido), de modo que
+dos workers nunca ganan el mismo shard sin necesidad de bloqueos explícitos.
+"""
+import math
+import zlib
+from datetime import datetime, timedelta
+from typing import List
+
+from sqlalchemy import bindparam, text
+
+
+def shard_de(clave, total: int) -> int:
+    # crc32 es estable entre procesos (a diferencia de hash() de str)
+    return zlib.crc32(str(clave or '').encode('utf-8')) % total
+
+
+class ArrendamientoShards:
+    def __init__(self, engine, dueno: str, prefijo: str = 'outbox', total: int = 64, ttl_s: float = 30):
+        self.engine = engine
+        self.dueno = dueno
+        self.total = total
+        self.ttl = timedelta(seconds=ttl_s)
+        self.t_leases = f'{prefijo}_leases'
+        self.t_workers = f'{prefijo}_workers'
+        self._sembrado = False
+
+    def _sembrar(self, c):
+        existentes = c.execute(text(f"SELECT COUNT(*) FROM {self.t_leases}")).scalar()
+        if existentes < self.total:
+            c.execute(
+                text(f"INSERT INTO {self.t_leases} (shard) VALUES (:shard) ON CONFLICT (shard) DO NOTHING"),
+                [{"shard": s} for s in range(self.total)]
+            )
+        self._sembrado = True
+
+    def renovar(self) -> List[int]:
+        """Renueva el latido y los arriendos propios, rebalancea y retorna los shards del worker."""
+        ahora = datetime.utcnow()
+        expira = ahora + self.ttl
+        vigente = {"ahora": ahora, "yo": self.dueno}
+        with self.engine.begin() as c:
+            if not self._sembrado:
+                self._sembrar(c)
+            c.execute(
+                text(f"INSERT INTO {self.t_workers} (owner, expires_at) VALUES (:yo, :expira) "
+                     "ON CONFLICT (owner) DO UPDATE SET expires_at = EXCLUDED.expires_at"),
+                {"yo": self.dueno, "expira": expira}
+            )
+            c.execute(text(f"UPDATE {self.t_leases} SET expires_at = :expira WHERE owner = :yo"),
+                      {"yo": self.dueno, "expira": expira})
+            vivos = c.execute(text(f"SELECT COUNT(*) FROM {self.t_workers} WHERE expires_at > :ahora"),
+                              vigente).scalar()
+            cuota = math.ceil(self.total / max(1, vivos))
+            propios = [r[0] for r in c.execute(
+                text(f"SELECT shard FROM {self.t_leases} WHERE owner = :yo ORDER BY shard"), vigente)]
+
+            if len(propios) > cuota:
+                sobrantes = propios[cuota:]
+                c.execute(
+                    text(f"UPDATE {self.t_leases} SET owner = NULL, expires_at = NULL "
+                         "WHERE owner = :yo AND shard IN :shards").bindparams(bindparam('shards', expanding=True)),
+                    {"yo": self.dueno, "shards": sobrantes}
+                )
+                propios = propios[:cuota]
+            elif len(propios) < cuota:
+                libres = [r[0] for r in c.execute(
+                    text(f"SELECT shard FROM {self.t_leases} WHERE owner IS NULL OR expires_at <= :ahora "
+                         "ORDER BY shard LIMIT :n"),
+                    {"ahora": ahora, "n": cuota - len(propios)}
+                )]
+                for shard in libres:
+                    tomado = c.execute(
+                        text(f"UPDATE {self.t_leases} SET owner = :yo, expires_at = :expira "
+                             "WHERE shard = :shard AND (owner IS NULL OR expires_at <= :ahora)"),
+                        {"yo": self.dueno, "expira": expira, "shard": shard, "ahora": ahora}
+                    ).rowcount
+                    if tomado:
+                        propios.append(shard)
+        return sorted(propios)
+
+    def liberar(self):
+        """Suelta todos los shards y el latido (apagado ordenado)."""
+        with self.engine.begin() as c:
+            c.execute(text(f"UPDATE {self.t_leases} SET owner = NULL, expires_at = NULL WHERE owner = :yo"),
+                      {"yo": self.dueno})
+            c.execute(text(f"DELETE FROM {self.t_workers} WHERE owner = :yo"), {"yo": self.dueno})
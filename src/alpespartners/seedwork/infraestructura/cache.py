@@ -0,0 +1,94 @@
+"""Caché LRU en memoria, acotada por tamaño y con TTL, para lecturas read-through.
+
+`obtener(clave, cargar)` responde desde memoria mientras la entrada no venza y,
+si no, llama a `cargar()` y guarda el resultado (un None no se guarda: lo que
+aún no existe no queda negado hasta el vencimiento). Quien escribe la fuente
+llama a `invalidar(...)` después de confirmar la escritura.
+
+Una carga que se solapa con una invalidación no se guarda: pudo leer el estado
+previo a la escritura. El TTL acota lo que esta réplica no ve (escrituras de
+otros procesos).
+
+Las cachés con `nombre` publican sus contadores en `estadisticas_caches()`.
+"""
+import threading
+import time
+import weakref
+from collections import OrderedDict
+from typing import Callable, Dict, Hashable, Optional
+
+_registro: "weakref.WeakValueDictionary[str, CacheLRU]" = weakref.WeakValueDictionary()
+
+
+class CacheLRU:
+    def __init__(self, capacidad: int = 10_000, ttl_s: float = 5.0, nombre: Optional[str] = None):
+        self.capacidad = capacidad
+        self.ttl_s = ttl_s
+        self._entradas: "OrderedDict[Hashable, tuple]" = OrderedDict()
+        self._generacion = 0
+        self._lock = threading.Lock()
+        self.aciertos = 0
+        self.fallos = 0
+        self.invalidaciones = 0
+        self.expulsiones = 0
+        if nombre:
+            _registro[nombre] = self
+
+    def obtener(self, clave: Hashable, cargar: Callable[[], object]):
+        ahora = time.monotonic()
+        with self._lock:
+            entrada = self._entradas.get(clave)
+            if entrada is not None and entrada[0] > ahora:
+                self._entradas.move_to_end(clave)
+                self.aciertos += 1
+                return entrada[1]
+            self.fallos += 1
+            generacion = self._generacion
+        valor = cargar()
+        if valor is not None:
+            with self._lock:
+                if generacion == self._generacion:
+                    self._guardar(clave, valor, ahora)
+        return valor
+
+    def poner(self, clave: Hashable, valor):
+        with self._lock:
+            self._guardar(clave, valor, time.monotonic())
+
+    def _guardar(self, clave, valor, ahora):
+        self._entradas[clave] = (ahora + self.ttl_s, valor)
+        self._entradas.move_to_end(clave)
+        while len(self._entradas) > self.capacidad:
+            self._entradas.popitem(last=False)
+            self.expulsiones += 1
+
+    def invalidar(self, *claves: Hashable):
+        with self._lock:
+            self._generacion += 1
+            for clave in claves:
+                if self._entradas.pop(clave, None) is not None:
+                    self.invalidaciones += 1
+
+    def limpiar(self):
+        with self._lock:
+            self._generacion += 1
+            self._entradas.clear()
+
+    def estadisticas(self) -> dict:
+        with self._lock:
+            consultas = self.aciertos + self.fallos
+            return {
+                "tamano": len(self._entradas),
+                "capacidad": self.capacidad,
+                "ttl_s": self.ttl_s,
+                "aciertos": self.aciertos,
+                "fallos": self.fallos,
+                "tasa_aciertos": round(self.aciertos / consultas, 4) if consultas else None,
+                "invalidaciones": self.invalidaciones,
+                "expulsiones": self.expulsiones,
+            }
+
+
+def estadisticas_caches() -> Dict[str, dict]:
+    """Contadores de las cachés con nombre del proceso."""
+    return {nombre: cache.estadisticas() for nombre, cache in list(_registro.items())}
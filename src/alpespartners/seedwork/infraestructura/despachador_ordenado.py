@@ -0,0 +1,143 @@
+"""Despachador de mensajes Pulsar a un pool de workers con orden por agregado.
+
+Cada mensaje se asigna a un worker según el hash de su clave (por defecto
+`idCampania`), de modo que los mensajes de un mismo agregado se procesan en
+orden por un solo hilo mientras agregados distintos avanzan en paralelo.
+Cada worker confirma (ack) o rechaza (nack) individualmente sus mensajes.
+
+Un mensaje que falla se reintenta en línea con espera exponencial: el broker
+lo reentregaría después de los siguientes de su clave y rompería el orden.
+Con `max_reintentos` agotados se rechaza, junto con los mensajes de la misma
+clave que ya estaban encolados detrás de él, para que vuelvan en orden.
+"""
+import json
+import logging
+import queue
+import threading
+import zlib
+from typing import Callable, Dict, Optional
+
+_FIN = object()
+
+
+def clave_por_campo(campo: str = 'idCampania') -> Callable:
+    """Extrae la clave de ordenamiento de `data[campo]` en un sobre JSON {type, data}.
+
+    Si el mensaje trae partition_key (Key_Shared) se usa directamente.
+    """
+    def _clave(msg) -> Optional[str]:
+        try:
+            if msg.partition_key():
+                return msg.partition_key()
+        except Exception:
+            pass
+        try:
+            payload = json.loads(msg.data())
+            return (payload.get('data') or {}).get(campo)
+        except Exception:
+            return None
+    return _clave
+
+
+class DespachadorPorClave:
+    def __init__(self, procesar: Callable, workers: int = 4, clave: Callable = None, capacidad: int = 1000,
+                 max_reintentos: Optional[int] = None, espera_s: float = 0.1, espera_max_s: float = 5.0):
+        """`procesar(msg)` debe lanzar excepción para que el mensaje sea reintentado.
+
+        Sin `max_reintentos` se reintenta hasta lograrlo (o hasta `detener()`).
+        """
+        self.procesar = procesar
+        self.clave = clave or clave_por_campo()
+        self.colas = [queue.Queue(maxsize=capacidad) for _ in range(max(1, workers))]
+        self.max_reintentos = max_reintentos
+        self.espera_s = espera_s
+        self.espera_max_s = espera_max_s
+        self.procesados = 0
+        self.fallidos = 0
+        self.reintentos = 0
+        self._despachados = 0
+        self._lock = threading.Lock()
+        self._detenido = threading.Event()
+        self._hilos = [
+            threading.Thread(target=self._trabajar, args=(cola,), name=f'despachador-{i}', daemon=True)
+            for i, cola in enumerate(self.colas)
+        ]
+        for hilo in self._hilos:
+            hilo.start()
+
+    def indice(self, clave) -> int:
+        # crc32 es estable entre procesos (a diferencia de hash() de str)
+        return zlib.crc32(str(clave or '').encode('utf-8')) % len(self.colas)
+
+    def despachar(self, consumer, msg):
+        """Encola el mensaje en el worker de su clave; bloquea si la cola está llena."""
+        clave = self.clave(msg)
+        with self._lock:
+            self._despachados += 1
+            secuencia = self._despachados
+        self.colas[self.indice(clave)].put((consumer, msg, clave, secuencia))
+
+    def en_vuelo(self) -> int:
+        return sum(cola.qsize() for cola in self.colas)
+
+    def _procesar_con_reintentos(self, msg) -> bool:
+        intento = 0
+        while True:
+            try:
+                self.procesar(msg)
+                return True
+            except Exception:
+                logging.exception(f'[DESPACHADOR] Error procesando mensaje (intento {intento + 1})')
+            if self.max_reintentos is not None and intento >= self.max_reintentos:
+                return False
+            with self._lock:
+                self.reintentos += 1
+            if self._detenido.wait(min(self.espera_s * 2 ** intento, self.espera_max_s)):
+                return False
+            intento += 1
+
+    def _rechazar(self, consumer, msg):
+        with self._lock:
+            self.fallidos += 1
+        try:
+            consumer.negative_acknowledge(msg)
+        except Exception:
+            pass
+
+    def _trabajar(self, cola):
+        # clave -> última secuencia despachada cuando un mensaje de esa clave se rechazó
+        rechazadas: Dict[object, int] = {}
+        while True:
+            item = cola.get()
+            if item is _FIN:
+                cola.task_done()
+                return
+            consumer, msg, clave, secuencia = item
+            try:
+                if secuencia <= rechazadas.get(clave, 0):
+                    # Encolado detrás de un rechazado: debe volver después de él
+                    self._rechazar(consumer, msg)
+                elif self._procesar_con_reintentos(msg):
+                    consumer.acknowledge(msg)
+                    with self._lock:
+                        self.procesados += 1
+                else:
+                    logging.error(f'[DESPACHADOR] Reintentos agotados para la clave {clave}; negative ack')
+                    with self._lock:
+                        rechazadas[clave] = self._despachados
+                    self._rechazar(consumer, msg)
+            finally:
+                cola.task_done()
+
+    def esperar(self):
+        """Bloquea hasta que todos los mensajes encolados hayan sido procesados."""
+        for cola in self.colas:
+            cola.join()
+
+    def detener(self):
+        """Procesa lo pendiente (sin más reintentos) y termina los workers."""
+        self._detenido.set()
+        for cola in self.colas:
+            cola.put(_FIN)
+        for hilo in self._hilos:
+            hilo.join()
@@ -0,0 +1,87 @@
+"""Despertadores para workers que esperan trabajo nuevo en una tabla.
+
+En Postgres se usa LISTEN sobre un canal que un trigger notifica (NOTIFY) en
+cada INSERT, así el worker duerme sin consultar la base y despierta en
+milisegundos. En otros motores (SQLite, pruebas) se cae a sondeo por intervalo,
+que también puede despertarse en el mismo proceso con `notificar()`.
+
+`esperar(timeout_s)` recibe el intervalo de sondeo. Con LISTEN activo se puede
+esperar más (`timeout_listen_s`, solo red de seguridad ante un NOTIFY perdido);
+si LISTEN falla se vuelve a sondear cada `timeout_s`.
+"""
+import logging
+import select
+import threading
+from typing import Optional
+
+
+class DespertadorSondeo:
+    def __init__(self):
+        self._evento = threading.Event()
+
+    def notificar(self):
+        self._evento.set()
+
+    def esperar(self, timeout_s: float) -> bool:
+        """Bloquea hasta una notificación o hasta `timeout_s`; retorna True si hubo notificación."""
+        despertado = self._evento.wait(timeout_s)
+        self._evento.clear()
+        return despertado
+
+    def cerrar(self):
+        self._evento.set()
+
+
+class DespertadorPostgres(DespertadorSondeo):
+    def __init__(self, engine, canal: str, timeout_listen_s: Optional[float] = None):
+        super().__init__()
+        self.engine = engine
+        self.canal = canal
+        self.timeout_listen_s = timeout_listen_s
+        self._conexion = None
+
+    def _escuchar(self):
+        if self._conexion is None:
+            # Conexión dedicada fuera del pool: LISTEN vive mientras la conexión siga abierta
+            proxy = self.engine.raw_connection()
+            proxy.detach()
+            conexion = proxy.driver_connection
+            conexion.autocommit = True
+            with conexion.cursor() as cur:
+                cur.execute(f'LISTEN "{self.canal}"')
+            self._conexion = conexion
+        return self._conexion
+
+    def esperar(self, timeout_s: float) -> bool:
+        try:
+            conexion = self._escuchar()
+            espera = self.timeout_listen_s if self.timeout_listen_s is not None else timeout_s
+            listos, _, _ = select.select([conexion], [], [], espera)
+            if not listos:
+                return False
+            conexion.poll()
+            despertado = bool(conexion.notifies)
+            conexion.notifies.clear()
+            return despertado
+        except Exception as e:
+            logging.warning(f"[DESPERTADOR] LISTEN {self.canal} falló ({e}); sondeando")
+            self._descartar()
+            return super().esperar(timeout_s)
+
+    def _descartar(self):
+        conexion, self._conexion = self._conexion, None
+        if conexion is not None:
+            try:
+                conexion.close()
+            except Exception:
+                pass
+
+    def cerrar(self):
+        super().cerrar()
+        self._descartar()
+
+
+def crear_despertador(engine, canal: str, timeout_listen_s: Optional[float] = None):
+    if engine.dialect.name == 'postgresql':
+        return DespertadorPostgres(engine, canal, timeout_listen_s)
+    return DespertadorSondeo()
@@ -0,0 +1,80 @@
+"""Envío asíncrono a Pulsar con límite de mensajes en vuelo.
+
+Envuelve `producer.send_async` en un `concurrent.futures.Future` por mensaje.
+Cuando hay `max_en_vuelo` mensajes sin confirmar, `enviar` bloquea hasta que
+el broker confirme alguno (backpressure) en lugar de crecer sin límite.
+`flush()` espera a que todo lo pendiente quede confirmado.
+
+Quien confirma algo después de publicar (commit, ack del mensaje de entrada)
+debe esperar antes los Futures con `esperar_confirmaciones`; si no, un envío
+fallido se pierde sin que nadie lo note.
+"""
+import threading
+import time
+from concurrent.futures import Future
+from typing import Callable, Iterable, Optional
+
+import pulsar
+
+
+class EnvioAsincrono:
+    def __init__(self, productor, max_en_vuelo: int = 1000):
+        self.productor = productor
+        self._cupos = threading.BoundedSemaphore(max_en_vuelo)
+        self._en_vuelo = 0
+        self._vacio = threading.Condition()
+
+    def enviar(self, contenido: bytes, callback: Optional[Callable] = None, **opciones) -> Future:
+        """Encola `contenido`; el Future se completa con el MessageId o con la excepción del envío.
+
+        `callback(futuro)` se invoca al completarse, desde el hilo de I/O del cliente.
+        """
+        futuro = Future()
+        if callback is not None:
+            futuro.add_done_callback(callback)
+        self._cupos.acquire()
+        with self._vacio:
+            self._en_vuelo += 1
+
+        def _al_confirmar(resultado, message_id):
+            if resultado == pulsar.Result.Ok:
+                futuro.set_result(message_id)
+            else:
+                futuro.set_exception(RuntimeError(f"Pulsar error: {resultado}"))
+            self._liberar()
+
+        try:
+            self.productor.send_async(contenido, _al_confirmar, **opciones)
+        except Exception as exc:
+            futuro.set_exception(RuntimeError(f"Pulsar error: {exc}"))
+            self._liberar()
+        return futuro
+
+    def en_vuelo(self) -> int:
+        with self._vacio:
+            return self._en_vuelo
+
+    def _liberar(self):
+        self._cupos.release()
+        with self._vacio:
+            self._en_vuelo -= 1
+            if self._en_vuelo == 0:
+                self._vacio.notify_all()
+
+    def flush(self, timeout: Optional[float] = None) -> bool:
+        """Fuerza el envío de los lotes abiertos y espera las confirmaciones pendientes."""
+        self.productor.flush()
+        with self._vacio:
+            return self._vacio.wait_for(lambda: self._en_vuelo == 0, timeout=timeout)
+
+
+def esperar_confirmaciones(resultados: Iterable, timeout: Optional[float] = 30.0):
+    """Espera que el broker confirme cada Future de `resultados` y relanza el primer error.
+
+    Los resultados que no son Future (envíos síncronos, ya confirmados) se ignoran.
+    `timeout` es el plazo total para todos.
+    """
+    limite = None if timeout is None else time.monotonic() + timeout
+    for resultado in resultados:
+        if isinstance(resultado, Future):
+            resultado.result(timeout=None if limite is None else max(0.0, limite - time.monotonic()))
@@ -0,0 +1,89 @@
+"""Buffer de escritura diferida (write-behind) con vaciado por tamaño o tiempo.
+
+Los ítems se acumulan y se escriben juntos con `escribir(items)`, al llegar a
+`max_items` o cada `max_espera_ms`. Con `clave`, un ítem nuevo reemplaza al
+pendiente de la misma clave (gana la última escritura).
+
+Cada ítem puede traer callbacks: `confirmar` (p. ej. ack del mensaje) corre solo
+cuando la escritura que lo contiene terminó, y `rechazar` (nack) si falló. Así
+nada se confirma antes de ser durable.
+"""
+import logging
+import threading
+from typing import Callable, Hashable, List, Optional
+
+
+class BufferEscrituraDiferida:
+    def __init__(self, escribir: Callable[[List], None], clave: Optional[Callable[[object], Hashable]] = None,
+                 max_items: int = 500, max_espera_ms: int = 50):
+        self.escribir = escribir
+        self.clave = clave
+        self.max_items = max_items
+        self.max_espera_s = max_espera_ms / 1000.0
+        self._items = {}
+        self._secuencia = 0
+        self._confirmar: List[Callable] = []
+        self._rechazar: List[Callable] = []
+        self._lock = threading.Lock()
+        self._lock_vaciado = threading.Lock()
+        self._detener = threading.Event()
+        self._hilo = threading.Thread(target=self._temporizar, name='escritura-diferida', daemon=True)
+        self._hilo.start()
+
+    def agregar(self, item, confirmar: Optional[Callable] = None, rechazar: Optional[Callable] = None):
+        with self._lock:
+            if self.clave is not None:
+                clave = self.clave(item)
+                # pop + insert: el ítem reemplazado pasa al final (orden de la última escritura)
+                self._items.pop(clave, None)
+            else:
+                clave = self._secuencia
+                self._secuencia += 1
+            self._items[clave] = item
+            if confirmar is not None:
+                self._confirmar.append(confirmar)
+            if rechazar is not None:
+                self._rechazar.append(rechazar)
+            lleno = len(self._items) >= self.max_items or len(self._confirmar) >= self.max_items
+        if lleno:
+            self.vaciar()
+
+    def pendientes(self) -> int:
+        with self._lock:
+            return len(self._items)
+
+    def vaciar(self) -> int:
+        """Escribe lo acumulado; retorna cuántos ítems quedaron durables (0 si falló)."""
+        # Vaciados serializados: uno más nuevo nunca se adelanta a uno anterior
+        with self._lock_vaciado:
+            with self._lock:
+                items, confirmar, rechazar = list(self._items.values()), self._confirmar, self._rechazar
+                self._items, self._confirmar, self._rechazar = {}, [], []
+            if not items and not confirmar:
+                return 0
+            try:
+                if items:
+                    self.escribir(items)
+            except Exception:
+                logging.exception(f'[ESCRITURA-DIFERIDA] Falló la escritura de {len(items)} ítems')
+                for cb in rechazar:
+                    try:
+                        cb()
+                    except Exception:
+                        logging.exception('[ESCRITURA-DIFERIDA] Falló un rechazo')
+                return 0
+            for cb in confirmar:
+                try:
+                    cb()
+                except Exception:
+                    logging.exception('[ESCRITURA-DIFERIDA] Falló una confirmación')
+            return len(items)
+
+    def _temporizar(self):
+        while not self._detener.wait(self.max_espera_s):
+            self.vaciar()
+
+    def cerrar(self):
+        self._detener.set()
+        self._hilo.join(timeout=5)
+        self.vaciar()
@@ -0,0 +1,88 @@
+"""Caché de idempotencia en dos niveles delante de `processed_events`.
+
+- Un LRU con las claves procesadas más recientes responde "ya visto" con certeza.
+- Un filtro de Bloom con las claves registradas recientemente responde
+  "no registrada aquí". Tiene dos generaciones: cuando la actual llega a su
+  capacidad pasa a ser la anterior y se empieza una vacía, así la tasa de falsos
+  positivos no crece sin límite en un proceso de larga vida.
+
+Solo los posibles positivos del Bloom requieren consultar la base. Una clave más
+antigua que las dos generaciones, o que otra réplica procesó, llega como "nunca
+vista": la caché es una optimización y el reclamo en `processed_events`
+(INSERT ... RETURNING) sigue siendo la fuente de verdad.
+"""
+import hashlib
+import math
+import threading
+from collections import OrderedDict
+from typing import Hashable, Iterable, Optional
+
+
+class FiltroBloom:
+    def __init__(self, capacidad: int = 1_000_000, tasa_fp: float = 0.001):
+        self.capacidad = capacidad
+        self.insertadas = 0
+        self.bits = max(8, int(-capacidad * math.log(tasa_fp) / (math.log(2) ** 2)))
+        self.hashes = max(1, round(self.bits / capacidad * math.log(2)))
+        self._arreglo = bytearray((self.bits + 7) // 8)
+
+    def _posiciones(self, clave: str):
+        # Doble hashing (Kirsch-Mitzenmacher) sobre un único digest
+        digest = hashlib.blake2b(clave.encode('utf-8'), digest_size=16).digest()
+        h1, h2 = int.from_bytes(digest[:8], 'little'), int.from_bytes(digest[8:], 'little') | 1
+        return ((h1 + i * h2) % self.bits for i in range(self.hashes))
+
+    def agregar(self, clave: str):
+        self.insertadas += 1
+        for p in self._posiciones(clave):
+            self._arreglo[p >> 3] |= 1 << (p & 7)
+
+    def __contains__(self, clave: str) -> bool:
+        return all(self._arreglo[p >> 3] & (1 << (p & 7)) for p in self._posiciones(clave))
+
+
+class CacheIdempotencia:
+    def __init__(self, capacidad_lru: int = 100_000, capacidad_bloom: int = 1_000_000, tasa_fp: float = 0.001):
+        self.capacidad_lru = capacidad_lru
+        self._lru: "OrderedDict[Hashable, None]" = OrderedDict()
+        self.capacidad_bloom = capacidad_bloom
+        self.tasa_fp = tasa_fp
+        self._bloom = FiltroBloom(capacidad_bloom, tasa_fp)
+        self._bloom_anterior: Optional[FiltroBloom] = None
+        self.rotaciones = 0
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _texto(clave) -> str:
+        return '\x1f'.join(map(str, clave)) if isinstance(clave, tuple) else str(clave)
+
+    def visto(self, clave) -> Optional[bool]:
+        """True: procesada (LRU). False: nunca registrada aquí (Bloom). None: posible positivo, consultar la base."""
+        with self._lock:
+            if clave in self._lru:
+                self._lru.move_to_end(clave)
+                return True
+            texto = self._texto(clave)
+            if texto in self._bloom or (self._bloom_anterior is not None and texto in self._bloom_anterior):
+                return None
+            return False
+
+    def registrar(self, clave):
+        with self._lock:
+            if self._bloom.insertadas >= self._bloom.capacidad:
+                self._bloom_anterior = self._bloom
+                self._bloom = FiltroBloom(self.capacidad_bloom, self.tasa_fp)
+                self.rotaciones += 1
+            self._bloom.agregar(self._texto(clave))
+            self._lru[clave] = None
+            self._lru.move_to_end(clave)
+            if len(self._lru) > self.capacidad_lru:
+                self._lru.popitem(last=False)
+
+    def calentar(self, claves: Iterable) -> int:
+        """Registra claves ya procesadas (de la más antigua a la más reciente)."""
+        n = 0
+        for clave in claves:
+            self.registrar(clave)
+            n += 1
+        return n
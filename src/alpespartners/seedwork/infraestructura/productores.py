@@ -0,0 +1,121 @@
+"""Pool compartido de productores Pulsar.
+
+Mantiene un único `pulsar.Client` por proceso y un productor por
+(tópico, schema), creados de forma perezosa y reutilizados entre hilos.
+Si un envío falla, el productor se descarta y se recrea una vez (reconexión);
+al terminar el proceso se cierran todos los productores y el cliente.
+"""
+import atexit
+import logging
+import os
+import threading
+from functools import lru_cache
+from typing import Callable, Optional
+
+import pulsar
+from pulsar.schema import AvroSchema
+
+from alpespartners.seedwork.infraestructura import utils
+
+OPERATION_TIMEOUT = int(os.getenv('PULSAR_OPERATION_TIMEOUT', '30'))
+
+
+def broker_url() -> str:
+    return os.getenv('PULSAR_BROKER_URL') or f'pulsar://{utils.broker_host()}:6650'
+
+
+@lru_cache(maxsize=None)
+def schema_avro(clase):
+    """AvroSchema construido una sola vez por clase Record."""
+    return AvroSchema(clase)
+
+
+class PoolProductores:
+    def __init__(self, url: str = None, crear_cliente: Callable = None):
+        self.url = url or broker_url()
+        self._crear_cliente = crear_cliente or (
+            lambda url: pulsar.Client(url, operation_timeout_seconds=OPERATION_TIMEOUT)
+        )
+        self._cliente = None
+        self._productores = {}
+        self._lock = threading.Lock()
+
+    def cliente(self):
+        with self._lock:
+            return self._cliente_sin_lock()
+
+    def _cliente_sin_lock(self):
+        if self._cliente is None:
+            self._cliente = self._crear_cliente(self.url)
+        return self._cliente
+
+    def productor(self, topico: str, clase=None):
+        """Productor para `topico`; con `clase` (Record) se publica con su AvroSchema."""
+        clave = (topico, clase)
+        productor = self._productores.get(clave)
+        if productor is not None:
+            return productor
+        with self._lock:
+            productor = self._productores.get(clave)
+            if productor is None:
+                opciones = {'schema': schema_avro(clase)} if clase is not None else {}
+                productor = self._cliente_sin_lock().create_producer(topico, **opciones)
+                self._productores[clave] = productor
+        return productor
+
+    def invalidar(self, topico: str, clase=None):
+        with self._lock:
+            productor = self._productores.pop((topico, clase), None)
+        if productor is not None:
+            try:
+                productor.close()
+            except Exception:
+                pass
+
+    def enviar(self, topico: str, mensaje, clase=None, **opciones):
+        """Envía `mensaje`; si falla, recrea el productor y reintenta una vez."""
+        try:
+            return self.productor(topico, clase).send(mensaje, **opciones)
+        except Exception as e:
+            logging.warning(f"[PRODUCTORES] Envío a {topico} falló ({e}); recreando productor")
+            self.invalidar(topico, clase)
+            return self.productor(topico, clase).send(mensaje, **opciones)
+
+    def cerrar(self):
+        with self._lock:
+            productores, self._productores = list(self._productores.values()), {}
+            cliente, self._cliente = self._cliente, None
+        for productor in productores:
+            try:
+                productor.flush()
+                productor.close()
+            except Exception:
+                pass
+        if cliente is not None:
+            try:
+                cliente.close()
+            except Exception:
+                pass
+
+
+_pool: Optional[PoolProductores] = None
+_pool_lock = threading.Lock()
+
+
+def pool_productores() -> PoolProductores:
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = PoolProductores()
+        return _pool
+
+
+def cerrar_productores():
+    global _pool
+    with _pool_lock:
+        pool, _pool = _pool, None
+    if pool is not None:
+        pool.cerrar()
+
+
+atexit.register(cerrar_productores)
@@ -0,0 +1,132 @@
+"""Rueda de temporizadores jerárquica (hierarchical timing wheel).
+
+Programar y cancelar un temporizador es O(1): cada temporizador se ubica en un
+slot según cuántos ticks faltan para su vencimiento, y los niveles superiores
+se "cascadean" hacia los inferiores a medida que avanza el tiempo. Un solo
+hilo atiende cualquier cantidad de plazos pendientes, en lugar de un sleep
+por cada uno.
+"""
+import logging
+import math
+import threading
+import time
+from typing import Callable, Hashable, Optional
+
+# Tolerancia para que plazos exactos (p. ej. 3.3s con ticks de 0.1s) no salten un tick por redondeo
+_EPSILON = 1e-6
+
+
+class Temporizador:
+    __slots__ = ('expira', 'callback', 'clave', 'cancelado')
+
+    def __init__(self, expira: int, callback: Callable, clave: Hashable = None):
+        self.expira = expira
+        self.callback = callback
+        self.clave = clave
+        self.cancelado = False
+
+
+class RuedaTemporizadores:
+    def __init__(self, tick_ms: int = 100, slots: int = 64, niveles: int = 4, reloj: Callable = time.monotonic):
+        self.tick = tick_ms / 1000.0
+        self.slots = slots
+        self.niveles = niveles
+        self.reloj = reloj
+        self.inicio = reloj()
+        self.actual = 0
+        self.ruedas = [[[] for _ in range(slots)] for _ in range(niveles)]
+        self._por_clave = {}
+        self._lock = threading.Lock()
+        self._activo = False
+        self._hilo = None
+
+    def programar(self, retraso_s: float, callback: Callable, clave: Hashable = None) -> Temporizador:
+        """Ejecuta `callback()` tras `retraso_s` segundos; una clave repetida reemplaza al anterior."""
+        with self._lock:
+            transcurrido = (self.reloj() - self.inicio) / self.tick
+            expira = max(self.actual + 1, math.ceil(transcurrido + retraso_s / self.tick - _EPSILON))
+            temporizador = Temporizador(expira, callback, clave)
+            if clave is not None:
+                anterior = self._por_clave.pop(clave, None)
+                if anterior is not None:
+                    anterior.cancelado = True
+                self._por_clave[clave] = temporizador
+            self._insertar(temporizador)
+        return temporizador
+
+    def cancelar(self, clave: Hashable) -> bool:
+        with self._lock:
+            temporizador = self._por_clave.pop(clave, None)
+        if temporizador is None:
+            return False
+        # Borrado perezoso: se descarta cuando su slot se procesa
+        temporizador.cancelado = True
+        return True
+
+    def pendientes(self) -> int:
+        with self._lock:
+            return len(self._por_clave)
+
+    def _insertar(self, temporizador: Temporizador):
+        delta = temporizador.expira - self.actual
+        for nivel in range(self.niveles):
+            if delta < self.slots ** (nivel + 1):
+                slot = (temporizador.expira // self.slots ** nivel) % self.slots
+                self.ruedas[nivel][slot].append(temporizador)
+                return
+        # Fuera de rango: se ubica en el último nivel y se reubica en cada cascada
+        nivel = self.niveles - 1
+        expira = self.actual + self.slots ** self.niveles - 1
+        self.ruedas[nivel][(expira // self.slots ** nivel) % self.slots].append(temporizador)
+
+    def _cascadear(self):
+        for nivel in range(1, self.niveles):
+            if self.actual % self.slots ** nivel != 0:
+                break
+            slot = (self.actual // self.slots ** nivel) % self.slots
+            temporizadores, self.ruedas[nivel][slot] = self.ruedas[nivel][slot], []
+            for temporizador in temporizadores:
+                if not temporizador.cancelado:
+                    self._insertar(temporizador)
+
+    def avanzar(self, ahora: Optional[float] = None) -> int:
+        """Procesa los ticks transcurridos hasta `ahora`; retorna cuántos temporizadores vencieron."""
+        ahora = self.reloj() if ahora is None else ahora
+        objetivo = int((ahora - self.inicio) / self.tick + _EPSILON)
+        vencidos = []
+        with self._lock:
+            while self.actual < objetivo:
+                self.actual += 1
+                self._cascadear()
+                slot = self.actual % self.slots
+                temporizadores, self.ruedas[0][slot] = self.ruedas[0][slot], []
+                for temporizador in temporizadores:
+                    if temporizador.cancelado:
+                        continue
+                    if temporizador.expira > self.actual:
+                        self._insertar(temporizador)
+                        continue
+                    if temporizador.clave is not None:
+                        self._por_clave.pop(temporizador.clave, None)
+                    vencidos.append(temporizador)
+        for temporizador in vencidos:
+            try:
+                temporizador.callback()
+            except Exception:
+                logging.exception(f"[TEMPORIZADORES] Error ejecutando temporizador {temporizador.clave}")
+        return len(vencidos)
+
+    def iniciar(self):
+        self._activo = True
+        self._hilo = threading.Thread(target=self._ciclo, name='rueda-temporizadores', daemon=True)
+        self._hilo.start()
+
+    def _ciclo(self):
+        while self._activo:
+            time.sleep(self.tick)
+            self.avanzar()
+
+    def detener(self):
+        self._activo = False
+        if self._hilo is not None:
+            self._hilo.join(timeout=5)
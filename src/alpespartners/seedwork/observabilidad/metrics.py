@@ -20,12 +20,16 @@ def _pct(arr, p):
 def metrics():
     # Copiar para evitar condiciones de carrera
     a = list(_lat)
+    from alpespartners.config.db import pool_stats
+    from alpespartners.seedwork.infraestructura.cache import estadisticas_caches
     return jsonify({
         "count": _count,
         "errors": _errors,
         "p50": _pct(a, 0.50),
         "p95": _pct(a, 0.95),
         "p99": _pct(a, 0.99),
+        "db_pools": pool_stats(),
+        "caches": estadisticas_caches(),
     })
 
 def register_metrics(app):
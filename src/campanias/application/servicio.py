@@ -11,10 +11,16 @@ from alpespartners.seedwork.infraestructura import utils
 import pulsar
 import json
 import threading
+from dataclasses import asdict
 from datetime import datetime
 from campanias.domain.entidades import EstadoCampania
-from campanias.infrastructure.event_store import append_event
-from campanias.infrastructure.publisher import publish_event
+from campanias.infrastructure.event_store import append_event, append_events, transaccion
+from campanias.infrastructure.publisher import publish_event, TOPIC_EVENTOS_CAMPANIAS as TOPIC_OUTBOX_CAMPANIAS
+from campanias.infrastructure.repos import SQL_UPSERT_CAMPANIA_VIEW, campanias_view_cache, invalidate_campanias_view
+from campanias.infrastructure.snapshots import load_campania, refresh_snapshots
+from campanias.infrastructure.state_index import STATES, campaign_state_index
+from alpespartners.infra.message_bus import DbOutboxBus
+from sqlalchemy import text
 
 # Pulsar topics (should come from config)
 TOPIC_COMANDOS_CAMPANIAS = 'persistent://public/default/comandos.campanias'
@@ -36,13 +42,18 @@ class CampaniasService:
         campania = Campania.crear(cmd.idCampania, cmd.idCliente, cmd.itinerario)
         evento = CampaniaCreada(cmd.idCampania, cmd.idCliente, cmd.itinerario, datetime.utcnow())
         # 2. Append event sourcing
-        self.event_repo.append_event(evento)
+        version = self._registrar("CampaniaCreada.v1", evento)
         # 3. Upsert proyección
-        self.proy_repo.upsert(cmd.idCampania, estado="CREADA")
+        self.proy_repo.upsert(cmd.idCampania, estado="CREADA", version=version)
         # 4. Publicar evento integración
         self.publish_event("CampaniaCreada", evento)
         logging.info(f"Campania creada: {cmd.idCampania}")
 
+    def _registrar(self, tipo, evento) -> int:
+        """Agrega `evento` al event_store; retorna su id, que es la versión de la proyección."""
+        data = {k: v.isoformat() if isinstance(v, datetime) else v for k, v in asdict(evento).items()}
+        return append_event(evento.idCampania, tipo, data)["id"]
+
     def publish_event(self, tipo, evento):
         envelope = {"type": tipo, "data": evento.to_dict()}
         self.eventos_producer.send(json.dumps(envelope).encode("utf-8"))
@@ -70,14 +81,14 @@ class CampaniasService:
                     idCampania = data.get("idCampania")
                     if tipo == "PagoConfirmado":
                         evento = CampaniaAprobada(idCampania, datetime.utcnow(), origen="PAGOS")
-                        self.event_repo.append_event(evento)
-                        self.proy_repo.upsert(idCampania, estado="APROBADA")
+                        version = self._registrar("CampaniaAprobada.v1", evento)
+                        self.proy_repo.upsert(idCampania, estado="APROBADA", version=version)
                         self.publish_event("CampaniaAprobada", evento)
                         logging.info(f"Campania aprobada: {idCampania}")
                     elif tipo == "PagoRevertido":
                         evento = CampaniaCancelada(idCampania, motivo=data.get("motivo"), fechaCancelacion=datetime.utcnow())
-                        self.event_repo.append_event(evento)
-                        self.proy_repo.upsert(idCampania, estado="CANCELADA")
+                        version = self._registrar("CampaniaCancelada.v1", evento)
+                        self.proy_repo.upsert(idCampania, estado="CANCELADA", version=version)
                         self.publish_event("CampaniaCancelada", evento)
                         logging.info(f"Campania cancelada: {idCampania}")
                     consumer.acknowledge(msg)
@@ -149,22 +160,56 @@ def crear_campania_cmd(data):
         'idCliente': idCliente,
         'itinerario': itinerario
     }
-    append_event(idCampania, 'CampaniaCreada.v1', event_data)
-    # Persist event first and update projection. Publishing to Pulsar is best-effort;
-    # if Pulsar is temporarily unavailable we should still return success to the API
-    # because the local state and event store are already updated.
-    try:
-        publish_event('CampaniaCreada.v1', event_data)
-    except Exception as e:
-        # Log and continue; the system's consumers can recover the missing integration
-        # publication later or the publisher will retry when available.
-        import logging
-        logging.warning(f"publish_event failed (continuing): {e}")
-    repo = CampaniaViewRepo(db.session)
-    repo.upsert(idCampania, idCliente, EstadoCampania.PENDIENTE.value)
+    # Event, projection and outbox row are committed together in one transaction;
+    # the outbox relay publishes CampaniaCreada to Pulsar asynchronously, so the
+    # request never waits on the broker and a rollback never leaves a stray message.
+    with transaccion() as conn:
+        version = append_events([(idCampania, 'CampaniaCreada.v1', event_data)], conn=conn)[0]
+        conn.execute(text(SQL_UPSERT_CAMPANIA_VIEW),
+                     {"idc": idCampania, "idcli": idCliente, "est": EstadoCampania.PENDIENTE.value, "ver": version})
+        DbOutboxBus().publish(TOPIC_OUTBOX_CAMPANIAS, event_data, aggregate_id=idCampania, conn=conn,
+                              event_type='CampaniaCreada.v1')
+        refresh_snapshots(conn, [idCampania])
+    invalidate_campanias_view([idCampania])
     return {'status': 'accepted', 'idCampania': idCampania}
 
 
+def _cargar_campania(repo, id_campania):
+    """campanias_view row, or the campaign rehydrated from its snapshot plus event tail while
+    the view has not caught up (projection lag, a rebuild in progress). Read-only: a GET
+    never writes snapshots."""
+    result = repo.get(id_campania)
+    if result is None:
+        campania = load_campania(id_campania, save=False)
+        if campania is not None:
+            result = {"id": campania.idCampania, "idCliente": campania.idCliente, "estado": campania.estado}
+    return result
+
+
 def obtener_campania_qry(id_campania):
+    """Read-through: served from campanias_view_cache until a writer invalidates it or the TTL expires."""
     repo = CampaniaViewRepo(db.session)
-    return repo.get(id_campania)
+    result = campanias_view_cache.obtener(id_campania, lambda: _cargar_campania(repo, id_campania))
+    return dict(result) if result else result
+
+
+def contar_campanias_qry():
+    """Campaigns per state, from the in-memory state index once it has caught up."""
+    index = campaign_state_index()
+    if index is not None and index.ready.is_set():
+        counts = index.counts()
+    else:
+        counts = CampaniaViewRepo(db.session).count_by_state()
+    counts = {estado: counts.get(estado, 0) for estado in STATES}
+    return {**counts, "total": sum(counts.values())}
+
+
+def listar_campanias_cliente_qry(id_cliente, estado=None, limite=None):
+    if estado is not None and estado not in STATES:
+        raise ValueError(f'estado debe ser uno de {", ".join(STATES)}')
+    if limite is not None and limite <= 0:
+        raise ValueError('limite debe ser un entero positivo')
+    index = campaign_state_index()
+    if index is not None and index.ready.is_set():
+        return index.campaigns_of(id_cliente, estado, limite)
+    return CampaniaViewRepo(db.session).list_by_client(id_cliente, estado, limite)
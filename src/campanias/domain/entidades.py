@@ -16,6 +16,48 @@ class Campania:
     def crear(idCampania: str, idCliente: str, itinerario: List[str]):
         return Campania(idCampania=idCampania, idCliente=idCliente, itinerario=itinerario)
 
+    def aplicar(self, tipo: str, data: dict):
+        """Evoluciona el estado con un evento del event store; los tipos ajenos se ignoran."""
+        if tipo.startswith('CampaniaCreada'):
+            self.idCliente = data.get('idCliente', self.idCliente)
+            self.itinerario = data.get('itinerario', self.itinerario)
+            self.estado = EstadoCampania.PENDIENTE.value
+        elif tipo.startswith('CampaniaAprobada'):
+            self.estado = EstadoCampania.APROBADA.value
+        elif tipo.startswith('CampaniaCancelada'):
+            self.estado = EstadoCampania.CANCELADA.value
+
+    @staticmethod
+    def desde_eventos(idCampania: str, eventos, base: Optional['Campania'] = None) -> Optional['Campania']:
+        """Rehidrata desde `base` (p. ej. un snapshot) aplicando `eventos` como pares (tipo, data)."""
+        campania = base
+        for tipo, data in eventos:
+            if campania is None:
+                if not tipo.startswith('CampaniaCreada'):
+                    continue
+                campania = Campania(idCampania=idCampania, idCliente=data.get('idCliente'), itinerario=[])
+            campania.aplicar(tipo, data)
+        return campania
+
+    def to_dict(self):
+        return {
+            "idCampania": self.idCampania,
+            "idCliente": self.idCliente,
+            "itinerario": self.itinerario,
+            "estado": self.estado,
+            "fechaCreacion": self.fechaCreacion.isoformat(),
+        }
+
+    @staticmethod
+    def from_dict(data: dict):
+        return Campania(
+            idCampania=data["idCampania"],
+            idCliente=data["idCliente"],
+            itinerario=data.get("itinerario") or [],
+            estado=data.get("estado", "CREADA"),
+            fechaCreacion=datetime.fromisoformat(data["fechaCreacion"]) if data.get("fechaCreacion") else datetime.utcnow(),
+        )
+
 
 @dataclass
 class CampaniaCreada:
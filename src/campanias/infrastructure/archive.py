@@ -0,0 +1,305 @@
+"""
+Cold storage for event_store: monthly partitions archived into local segments.
+
+On Postgres event_store is range-partitioned by month on `occurred_on` (see
+alpespartners_core_schema.sql). The hot table only ever holds the last
+EVENT_STORE_HOT_MONTHS months. Older months are written to immutable segment
+files and then detached and dropped, so the hot heap and its indexes stay
+bounded and archiving never rewrites them. Months that landed in the DEFAULT
+partition are first moved into a partition of their own. On a plain event_store
+(create_all, SQLite) partition work is skipped and archived months are deleted.
+
+The services create upcoming partitions on a timer (`start_partition_maintenance`,
+START_EVENT_STORE_PARTITIONS=1 by default).
+
+A segment is a pair of files in EVENT_STORE_ARCHIVE_DIR:
+- `event_store-YYYY-MM.seg` is a sequence of zlib-compressed blocks of JSON lines,
+  in id order.
+- `event_store-YYYY-MM.idx.json` holds the block table and the blocks that contain
+  each aggregate.
+The index is written last and marks the segment complete. Segments are never
+modified once written.
+
+Readers (`iter_events`, `events_of`, snapshots, catch-up and rebuild) read archived
+events before the hot table, and do nothing while no archive dir is configured.
+Archiving goes by `occurred_on` while readers go by id, and a slow transaction can
+commit a low id into a month that stays hot. So below the horizon the hot table is
+read by `occurred_on >= boundary()` and merged with the segments in id order,
+instead of being cut at `id > horizon()`.
+
+Usage:
+    PYTHONPATH=src python -m campanias.infrastructure.archive --hot-months 3
+"""
+import argparse
+import json
+import logging
+import os
+import re
+import threading
+import zlib
+from datetime import date, datetime
+from typing import Dict, Iterator, List, Optional, Sequence, Tuple
+
+from sqlalchemy import text
+
+from alpespartners.config.db import database_url, get_engine
+
+ARCHIVE_DIR = os.getenv('EVENT_STORE_ARCHIVE_DIR') or None
+HOT_MONTHS = int(os.getenv('EVENT_STORE_HOT_MONTHS', '3'))
+PARTITIONS_AHEAD = int(os.getenv('EVENT_STORE_PARTITIONS_AHEAD', '2'))
+PARTITIONS_INTERVAL_S = int(os.getenv('EVENT_STORE_PARTITIONS_INTERVAL_S', '3600'))
+BLOCK_EVENTS = 1000
+
+_SEGMENT = re.compile(r'^event_store-(\d{4})-(\d{2})\.idx\.json$')
+
+Row = Tuple[int, str, str, dict, datetime]
+
+
+def month_start(d) -> date:
+    return date(d.year, d.month, 1)
+
+
+def add_months(d: date, months: int) -> date:
+    y, m = divmod(d.year * 12 + d.month - 1 + months, 12)
+    return date(y, m + 1, 1)
+
+
+def partition_name(month: date) -> str:
+    return f"event_store_{month:%Y_%m}"
+
+
+class SegmentArchive:
+    def __init__(self, directory: str):
+        self.directory = directory
+        self._indexes: Dict[str, dict] = {}
+
+    def _paths(self, month: date):
+        base = os.path.join(self.directory, f"event_store-{month:%Y-%m}")
+        return base + '.seg', base + '.idx.json'
+
+    def segments(self) -> List[dict]:
+        """Complete segments in month order; indexes are immutable, so they are cached."""
+        if not os.path.isdir(self.directory):
+            return []
+        names = sorted(n for n in os.listdir(self.directory) if _SEGMENT.match(n))
+        for name in names:
+            if name not in self._indexes:
+                with open(os.path.join(self.directory, name)) as f:
+                    self._indexes[name] = json.load(f)
+        return [self._indexes[n] for n in names]
+
+    def horizon(self) -> int:
+        """Highest archived event id (0 when nothing is archived)."""
+        return max((s['last_id'] for s in self.segments() if s['count']), default=0)
+
+    def boundary(self) -> Optional[datetime]:
+        """Start of the month after the last archived one; hot rows from here on are not archived."""
+        months = [s['month'] for s in self.segments()]
+        if not months:
+            return None
+        return datetime.combine(add_months(date.fromisoformat(max(months) + '-01'), 1), datetime.min.time())
+
+    def has(self, month: date) -> bool:
+        return os.path.exists(self._paths(month)[1])
+
+    def write_segment(self, month: date, rows: Iterator[Row], block_events: int = BLOCK_EVENTS) -> dict:
+        """Write `rows` (id order) as the segment for `month`; returns its index."""
+        seg_path, idx_path = self._paths(month)
+        if os.path.exists(idx_path):
+            raise FileExistsError(f'segment for {month:%Y-%m} already archived')
+        os.makedirs(self.directory, exist_ok=True)
+        index = {"month": f"{month:%Y-%m}", "file": os.path.basename(seg_path),
+                 "first_id": None, "last_id": None, "count": 0, "blocks": [], "aggregates": {}}
+
+        def flush(f, block):
+            data = zlib.compress('\n'.join(json.dumps(r) for r in block).encode('utf-8'), 6)
+            index["blocks"].append([f.tell(), len(data), block[0][0], block[-1][0]])
+            f.write(data)
+            number = len(index["blocks"]) - 1
+            for aggregate_id in {r[1] for r in block}:
+                index["aggregates"].setdefault(aggregate_id, []).append(number)
+
+        with open(seg_path + '.tmp', 'wb') as f:
+            block = []
+            for id_, aggregate_id, type_, payload, occurred_on in rows:
+                block.append([id_, aggregate_id, type_, payload,
+                              occurred_on.isoformat() if isinstance(occurred_on, datetime) else occurred_on])
+                index["first_id"] = index["first_id"] or id_
+                index["last_id"] = id_
+                index["count"] += 1
+                if len(block) >= block_events:
+                    flush(f, block)
+                    block = []
+            if block:
+                flush(f, block)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(seg_path + '.tmp', seg_path)
+        with open(idx_path + '.tmp', 'w') as f:
+            json.dump(index, f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(idx_path + '.tmp', idx_path)
+        return index
+
+    def _read_blocks(self, segment: dict, blocks: Sequence[int]) -> Iterator[Row]:
+        with open(os.path.join(self.directory, segment["file"]), 'rb') as f:
+            for number in blocks:
+                offset, length, _, _ = segment["blocks"][number]
+                f.seek(offset)
+                for line in zlib.decompress(f.read(length)).decode('utf-8').split('\n'):
+                    id_, aggregate_id, type_, payload, occurred_on = json.loads(line)
+                    yield id_, aggregate_id, type_, payload, datetime.fromisoformat(occurred_on) if occurred_on else None
+
+    def iter_events(self, from_position: int = 0, types: Optional[Sequence[str]] = None) -> Iterator[Row]:
+        for segment in self.segments():
+            wanted = [n for n, (_, _, _, last) in enumerate(segment["blocks"]) if last > from_position]
+            for row in self._read_blocks(segment, wanted):
+                if row[0] > from_position and (not types or row[2] in types):
+                    yield row
+
+    def events_of(self, aggregate_id: str, after: int = 0) -> Iterator[Row]:
+        """Archived events of one aggregate, reading only the blocks the index points to."""
+        for segment in self.segments():
+            if segment["count"] == 0 or segment["last_id"] <= after:
+                continue
+            for row in self._read_blocks(segment, segment["aggregates"].get(aggregate_id, [])):
+                if row[1] == aggregate_id and row[0] > after:
+                    yield row
+
+
+_archive: Optional[SegmentArchive] = None
+
+
+def get_archive() -> Optional[SegmentArchive]:
+    """Process-wide archive for EVENT_STORE_ARCHIVE_DIR, or None when archival is off."""
+    global _archive
+    if ARCHIVE_DIR and (_archive is None or _archive.directory != ARCHIVE_DIR):
+        _archive = SegmentArchive(ARCHIVE_DIR)
+    return _archive if ARCHIVE_DIR else None
+
+
+def is_partitioned(conn) -> bool:
+    """Whether event_store is a partitioned Postgres table (not the plain create_all one)."""
+    return conn.dialect.name == 'postgresql' and bool(conn.execute(text(
+        "SELECT EXISTS (SELECT 1 FROM pg_partitioned_table WHERE partrelid = to_regclass('event_store'))"
+    )).scalar())
+
+
+def ensure_partitions(engine, months_ahead: int = PARTITIONS_AHEAD, today: Optional[date] = None) -> List[str]:
+    """Create the monthly partitions for the current month and `months_ahead` more (partitioned Postgres only)."""
+    current = month_start(today or datetime.utcnow())
+    months = [add_months(current, i) for i in range(months_ahead + 1)]
+    with engine.begin() as conn:
+        if not is_partitioned(conn):
+            return []
+        for month in months:
+            conn.execute(text("SELECT event_store_crear_particion(:mes)"), {"mes": month})
+    return [partition_name(m) for m in months]
+
+
+def start_partition_maintenance(interval_s: float = PARTITIONS_INTERVAL_S, engine=None) -> threading.Event:
+    """Run `ensure_partitions` now and every `interval_s` in a daemon thread; `set()` the returned event to stop."""
+    stop = threading.Event()
+
+    def loop():
+        while not stop.is_set():
+            try:
+                ensure_partitions(engine or get_engine(database_url()))
+            except Exception:
+                logging.exception('[ARCHIVE] Failed to create event_store partitions')
+            stop.wait(interval_s)
+
+    threading.Thread(target=loop, name='event-store-partitions', daemon=True).start()
+    return stop
+
+
+def _month_rows(conn, start: date, end: date) -> Iterator[Row]:
+    result = conn.execution_options(stream_results=True, yield_per=BLOCK_EVENTS).execute(
+        text("SELECT id, aggregate_id, type, payload, occurred_on FROM event_store "
+             "WHERE occurred_on >= :start AND occurred_on < :end ORDER BY id"),
+        {"start": start, "end": end},
+    )
+    for id_, aggregate_id, type_, payload, occurred_on in result:
+        if isinstance(payload, (str, bytes)):
+            payload = json.loads(payload) if payload else {}
+        if isinstance(occurred_on, str):
+            occurred_on = datetime.fromisoformat(occurred_on)
+        yield id_, aggregate_id, type_, payload, occurred_on
+
+
+def _drop_month(conn, start: date, end: date):
+    name = partition_name(start)
+    if is_partitioned(conn) and conn.execute(
+            text("SELECT to_regclass(:name) IS NOT NULL"), {"name": name}).scalar():
+        # Detach + drop: no dead tuples and no index maintenance on the hot table
+        conn.execute(text(f"ALTER TABLE event_store DETACH PARTITION {name}"))
+        conn.execute(text(f"DROP TABLE {name}"))
+    else:
+        conn.execute(text("DELETE FROM event_store WHERE occurred_on >= :start AND occurred_on < :end"),
+                     {"start": start, "end": end})
+
+
+def archive_month(engine, month: date, archive: SegmentArchive) -> int:
+    """Archive one month of events into a segment and remove it from the hot table."""
+    start, end = month_start(month), add_months(month_start(month), 1)
+    with engine.connect() as conn:
+        with conn.begin():
+            if is_partitioned(conn):
+                # Moves the month's rows out of DEFAULT, so it is detached instead of deleted
+                conn.execute(text("SELECT event_store_crear_particion(:mes)"), {"mes": start})
+            expected = conn.execute(
+                text("SELECT COUNT(*) FROM event_store WHERE occurred_on >= :start AND occurred_on < :end"),
+                {"start": start, "end": end}).scalar()
+        if expected and not archive.has(start):
+            with conn.begin():
+                written = archive.write_segment(start, _month_rows(conn, start, end))["count"]
+            if written != expected:
+                raise RuntimeError(f'{start:%Y-%m}: archived {written} events, expected {expected}')
+        with conn.begin():
+            _drop_month(conn, start, end)
+    return expected
+
+
+def archive_cold_months(engine=None, archive: Optional[SegmentArchive] = None,
+                        hot_months: int = HOT_MONTHS, today: Optional[date] = None) -> Dict[str, int]:
+    """Archive every month older than the `hot_months` most recent ones; returns events per month."""
+    engine = engine or get_engine(database_url())
+    archive = archive or get_archive()
+    if archive is None:
+        raise RuntimeError('EVENT_STORE_ARCHIVE_DIR not set; cannot archive event_store')
+    cutoff = add_months(month_start(today or datetime.utcnow()), -(hot_months - 1))
+    with engine.connect() as conn:
+        oldest = conn.execute(text("SELECT MIN(occurred_on) FROM event_store WHERE occurred_on < :cutoff"),
+                              {"cutoff": cutoff}).scalar()
+    if isinstance(oldest, str):
+        oldest = datetime.fromisoformat(oldest)
+    archived = {}
+    month = month_start(oldest) if oldest else cutoff
+    while month < cutoff:
+        archived[f"{month:%Y-%m}"] = archive_month(engine, month, archive)
+        logging.info(f"[ARCHIVE] event_store {month:%Y-%m}: {archived[f'{month:%Y-%m}']} events archived")
+        month = add_months(month, 1)
+    return archived
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--db-url', default=None, help='SQLAlchemy URL (defaults to DB_URL/DATABASE_URL)')
+    parser.add_argument('--archive-dir', default=ARCHIVE_DIR)
+    parser.add_argument('--hot-months', type=int, default=HOT_MONTHS)
+    parser.add_argument('--months-ahead', type=int, default=PARTITIONS_AHEAD)
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO)
+    db_url = args.db_url or database_url()
+    if not db_url or not args.archive_dir:
+        parser.error('a database URL and an archive dir are required')
+    engine = get_engine(db_url)
+    print({
+        "partitions": ensure_partitions(engine, args.months_ahead),
+        "archived": archive_cold_months(engine, SegmentArchive(args.archive_dir), args.hot_months),
+    })
+
+
+if __name__ == '__main__':
+    main()
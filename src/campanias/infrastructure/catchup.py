@@ -0,0 +1,209 @@
+"""
+Catch-up subscriptions over the event_store global position (event id).
+
+A subscription keeps its checkpoint in `projection_checkpoints`. Each step reads
+a large batch of events after it, hands the batch to the projection handler, and
+advances the checkpoint in the same transaction. DB projections therefore apply
+each event exactly once, with no broker involved. Once caught up, the subscriber
+sleeps on LISTEN `event_store_nuevo` (NOTIFY trigger on insert), or polls on SQLite.
+
+Ids are assigned at insert time but become visible at commit, so a newer id can be
+visible before an older one. When the batch has a gap, the reader stops before it
+and retries. On Postgres it notes the snapshot xmax when it first sees the gap and
+skips it only once the snapshot xmin has passed that mark: every transaction that
+could still commit the missing id has ended, so the insert was rolled back. Other
+engines skip a gap once the event after it is older than CATCHUP_GAP_WAIT_MS.
+Every skip is logged. A checkpoint behind the event_store archive horizon is first
+advanced through the archived segments.
+"""
+import logging
+import os
+import threading
+from datetime import datetime, timedelta
+from itertools import islice
+from typing import Callable, List, Optional, Sequence
+
+from sqlalchemy import bindparam, text
+
+from alpespartners.config.db import database_url, get_engine
+from alpespartners.seedwork.infraestructura.despertador import crear_despertador
+from campanias.infrastructure.archive import get_archive
+from campanias.infrastructure.event_store import StoredEvent, iter_events
+from campanias.infrastructure.projection import fold_view_changes, merge_params, merge_view_sql
+from campanias.infrastructure.repos import invalidate_campanias_view
+
+CATCHUP_BATCH_SIZE = int(os.getenv('CATCHUP_BATCH_SIZE', '5000'))
+CATCHUP_GAP_WAIT_MS = int(os.getenv('CATCHUP_GAP_WAIT_MS', '60000'))
+CATCHUP_POLL_MS = int(os.getenv('CATCHUP_POLL_MS', '1000'))
+CATCHUP_CHANNEL = 'event_store_nuevo'
+SQL_SNAPSHOT_XIDS = (
+    "SELECT pg_snapshot_xmin(pg_current_snapshot())::text::bigint, "
+    "pg_snapshot_xmax(pg_current_snapshot())::text::bigint"
+)
+SQL_CHECKPOINT = "SELECT position FROM projection_checkpoints WHERE name = :name"
+SQL_SAVE_CHECKPOINT = (
+    "INSERT INTO projection_checkpoints (name, position, updated_at) VALUES (:name, :position, CURRENT_TIMESTAMP) "
+    "ON CONFLICT (name) DO UPDATE SET position = EXCLUDED.position, updated_at = EXCLUDED.updated_at"
+)
+
+
+class GapTracker:
+    """Trims a run of unfiltered events at the first id gap that may still be filled.
+
+    Keeps the gap it is waiting on between calls, so one instance must follow a
+    single position (a subscription, or the rebuild tail).
+    """
+
+    def __init__(self, name: str):
+        self.name = name
+        self._gap = None
+
+    def _xids(self, conn) -> Optional[tuple]:
+        """(xmin, xmax) of the current Postgres snapshot; None on other engines."""
+        if conn.dialect.name != 'postgresql':
+            return None
+        return tuple(conn.execute(text(SQL_SNAPSHOT_XIDS)).one())
+
+    def _settled(self, previous: int, event, xids: Optional[tuple]) -> bool:
+        if xids is not None:
+            xmin, xmax = xids
+            if self._gap is None or self._gap[0] != previous:
+                # Transactions with an xid below xmax may still commit the missing ids
+                self._gap = (previous, xmax)
+                return False
+            return xmin >= self._gap[1]
+        occurred_on = event.occurred_on
+        if isinstance(occurred_on, str):
+            occurred_on = datetime.fromisoformat(occurred_on)
+        return occurred_on is None or occurred_on <= datetime.utcnow() - timedelta(milliseconds=CATCHUP_GAP_WAIT_MS)
+
+    def until_gap(self, position: int, events: Sequence, conn) -> list:
+        """`events` (with `id` and `occurred_on`) after `position`, up to the first unsettled gap."""
+        xids = ()
+        previous = position
+        for i, event in enumerate(events):
+            if event.id != previous + 1:
+                if xids == ():
+                    xids = self._xids(conn)
+                if not self._settled(previous, event, xids):
+                    return list(events[:i])
+                logging.warning(f'[CATCHUP] {self.name} skipping ids {previous + 1}..{event.id - 1} (never committed)')
+            previous = event.id
+        return list(events)
+
+
+class CatchUpSubscription:
+    def __init__(self, name: str, handler: Callable[[List[StoredEvent], object], None],
+                 types: Optional[Sequence[str]] = None, batch_size: int = CATCHUP_BATCH_SIZE, engine=None,
+                 after_commit: Optional[Callable[[List[StoredEvent]], None]] = None):
+        """`handler(events, conn)` runs inside the transaction that advances the checkpoint;
+        `after_commit(events)` runs once it has committed (e.g. to invalidate caches)."""
+        self.name = name
+        self.handler = handler
+        self.after_commit = after_commit
+        self.types = list(types) if types else None
+        self.batch_size = batch_size
+        self._engine = engine
+        self._running = threading.Event()
+        self._thread = None
+        self._wakeup = None
+        self.gaps = GapTracker(name)
+
+    @property
+    def engine(self):
+        if self._engine is None:
+            db_url = database_url()
+            if not db_url:
+                raise RuntimeError('DB_URL not set; cannot run catch-up subscription')
+            self._engine = get_engine(db_url)
+        return self._engine
+
+    def _query(self):
+        q = "SELECT id, aggregate_id, type, payload, occurred_on FROM event_store WHERE id > :position"
+        if self.types:
+            q += " AND type IN :types"
+        q = text(q + " ORDER BY id LIMIT :limit")
+        return q.bindparams(bindparam('types', expanding=True)) if self.types else q
+
+    def _until_gap(self, position: int, events: List[StoredEvent], conn) -> List[StoredEvent]:
+        # Type filtering makes ids sparse by design; gaps are only meaningful unfiltered
+        if self.types:
+            return events
+        return self.gaps.until_gap(position, events, conn)
+
+    def _load_position(self, conn) -> int:
+        return conn.execute(text(SQL_CHECKPOINT), {"name": self.name}).scalar() or 0
+
+    def _save_position(self, conn, position: int):
+        conn.execute(text(SQL_SAVE_CHECKPOINT), {"name": self.name, "position": position})
+
+    def position(self) -> int:
+        with self.engine.connect() as conn:
+            return self._load_position(conn)
+
+    def run_once(self) -> int:
+        """Apply the next batch; returns how many events were handled."""
+        with self.engine.begin() as conn:
+            position = self._load_position(conn)
+            archive = get_archive()
+            horizon = archive.horizon() if archive is not None else 0
+            if position < horizon:
+                # Archived months are settled: no gaps to wait for. Hot rows with ids below the
+                # horizon (late commits into a hot month) are merged in by iter_events.
+                rows = iter_events(position, self.types, conn=conn, until=horizon)
+                try:
+                    events = list(islice(rows, self.batch_size))
+                finally:
+                    rows.close()
+            else:
+                params = {"position": position, "limit": self.batch_size}
+                if self.types:
+                    params["types"] = self.types
+                events = [StoredEvent(*r) for r in conn.execute(self._query(), params)]
+                events = self._until_gap(position, events, conn)
+            if not events:
+                return 0
+            self.handler(events, conn)
+            self._save_position(conn, events[-1].id)
+        if self.after_commit is not None:
+            self.after_commit(events)
+        return len(events)
+
+    def run_forever(self, poll_ms: int = CATCHUP_POLL_MS):
+        wakeup = self._wakeup = crear_despertador(self.engine, CATCHUP_CHANNEL)
+        self._running.set()
+        try:
+            while self._running.is_set():
+                try:
+                    # Catching up: keep reading while batches come back full
+                    if self.run_once() >= self.batch_size:
+                        continue
+                except Exception:
+                    logging.exception(f'[CATCHUP] {self.name} failed; retrying')
+                wakeup.esperar(poll_ms / 1000.0)
+        finally:
+            wakeup.cerrar()
+
+    def start(self):
+        self._thread = threading.Thread(target=self.run_forever, name=f'catchup-{self.name}', daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._running.clear()
+        if self._wakeup is not None:
+            self._wakeup.notificar()
+        if self._thread is not None:
+            self._thread.join(timeout=5)
+
+
+def project_campanias_view(events: List[StoredEvent], conn):
+    rows = fold_view_changes((e.id, e.aggregate_id, e.type, e.payload) for e in events)
+    if rows:
+        conn.execute(text(merge_view_sql('campanias_view')), merge_params(rows))
+
+
+def campanias_view_subscription(engine=None) -> CatchUpSubscription:
+    # Unfiltered so gap detection sees every id; other event types fold to nothing
+    return CatchUpSubscription('campanias_view', project_campanias_view, engine=engine,
+                               after_commit=lambda events: invalidate_campanias_view({e.aggregate_id for e in events}))
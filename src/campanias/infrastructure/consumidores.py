@@ -1,20 +1,73 @@
 import os
 import json
 import logging
+import threading
 import time
 import pulsar
 from pulsar import ConsumerType
-from campanias.infrastructure.event_store import append_event
+from alpespartners.seedwork.infraestructura.envio_asincrono import esperar_confirmaciones
+from alpespartners.seedwork.infraestructura.idempotencia import CacheIdempotencia
+from campanias.infrastructure.event_store import append_events
 from campanias.infrastructure.publisher import publish_event
-from sqlalchemy import create_engine, text
+from campanias.infrastructure.repos import SQL_UPSERT_CAMPANIA_VIEW, invalidate_campanias_view, upsert_campanias_view
+from campanias.infrastructure.snapshots import refresh_snapshots
+from sqlalchemy import text
 from sqlalchemy.exc import IntegrityError
+from alpespartners.config.db import database_url, get_engine
 
 PULSAR_BROKER_URL = os.environ.get('PULSAR_BROKER_URL')
 # Prefer the canonical topic used by the pagos publisher; allow override from env
 TOPIC_EVENTOS_PAGOS = os.environ.get('TOPIC_EVENTOS_PAGOS', 'persistent://public/default/eventos.pagos')
 
 
-def suscribirse_a_eventos_pagos():
+SUBSCRIPTION = 'campanias-sub-eventos-pagos'
+# Batch mode: with CAMPANIAS_BATCH_MAX_MESSAGES > 1 the consumer drains the topic with
+# batch_receive on a Failover subscription of its own (the broker rejects a consumer whose
+# type differs from the subscription's, so it cannot share the Shared/KeyShared one), and
+# acks each message once its batch commits.
+BATCH_SUBSCRIPTION = os.environ.get('CAMPANIAS_BATCH_SUBSCRIPTION', 'campanias-sub-eventos-pagos-lotes')
+BATCH_MAX_MESSAGES = int(os.environ.get('CAMPANIAS_BATCH_MAX_MESSAGES', '1'))
+BATCH_MAX_BYTES = int(os.environ.get('CAMPANIAS_BATCH_MAX_BYTES', str(10 * 1024 * 1024)))
+BATCH_TIMEOUT_MS = int(os.environ.get('CAMPANIAS_BATCH_TIMEOUT_MS', '100'))
+# Parallel mode: with CAMPANIAS_CONSUMER_WORKERS > 1 messages are hashed by
+# CAMPANIAS_CONSUMER_ORDER_KEY onto that many worker threads (per-aggregate order kept).
+CONSUMER_WORKERS = int(os.environ.get('CAMPANIAS_CONSUMER_WORKERS', '1'))
+CONSUMER_ORDER_KEY = os.environ.get('CAMPANIAS_CONSUMER_ORDER_KEY', 'idCampania')
+# Failures are retried inline so a nack never lets later messages of the campaign overtake it;
+# unset means retry until it succeeds.
+CONSUMER_MAX_RETRIES = int(os.environ['CAMPANIAS_CONSUMER_MAX_RETRIES']) if os.environ.get('CAMPANIAS_CONSUMER_MAX_RETRIES') else None
+# Write-behind mode: with CAMPANIAS_WRITE_BEHIND_MS > 0 received messages are buffered and
+# applied together by procesar_lote (one multi-row view upsert, last write wins per campaign)
+# every that many ms or CAMPANIAS_WRITE_BEHIND_MAX messages; they are acked only after it commits.
+WRITE_BEHIND_MS = int(os.environ.get('CAMPANIAS_WRITE_BEHIND_MS', '0'))
+WRITE_BEHIND_MAX = int(os.environ.get('CAMPANIAS_WRITE_BEHIND_MAX', '500'))
+
+# Authoritative claim: returns a row only for the first delivery of an event. processed_events
+# is partitioned by day (bucket) and its unique key includes the bucket, so NOT EXISTS catches
+# redeliveries of events first processed on an earlier day. NOT EXISTS + ON CONFLICT is not
+# atomic across buckets (two replicas around midnight both pass NOT EXISTS and insert into
+# different days), so on Postgres the claims first take a transaction advisory lock per event id.
+SQL_LOCK_EVENT_IDS = (
+    "SELECT pg_advisory_xact_lock(h) FROM (SELECT DISTINCT hashtext(e) AS h "
+    "FROM unnest(CAST(:eids AS text[])) AS e ORDER BY h) AS locks"
+)
+SQL_CLAIM_PROCESSED = (
+    "INSERT INTO processed_events (aggregate_id, event_type, event_id) SELECT :agg, :et, :eid "
+    "WHERE NOT EXISTS (SELECT 1 FROM processed_events WHERE aggregate_id = :agg AND event_type = :et "
+    "AND event_id = :eid) ON CONFLICT DO NOTHING RETURNING id"
+)
+
+# In-process idempotency front cache (LRU + Bloom) warmed from the most recent processed_events rows
+IDEMPOTENCY_LRU_SIZE = int(os.environ.get('CAMPANIAS_IDEMPOTENCY_LRU_SIZE', '100000'))
+IDEMPOTENCY_BLOOM_CAPACITY = int(os.environ.get('CAMPANIAS_IDEMPOTENCY_BLOOM_CAPACITY', '1000000'))
+IDEMPOTENCY_WARM_ROWS = int(os.environ.get('CAMPANIAS_IDEMPOTENCY_WARM_ROWS', '100000'))
+
+_idempotency_cache = None
+_idempotency_lock = threading.Lock()
+
+
+def _suscribir(subscription_name=SUBSCRIPTION, **opciones):
+    """Subscribe to the pagos events topic with retries; returns (client, consumer)."""
     client = None
     consumer = None
     for attempt in range(10):
@@ -23,9 +76,9 @@ def suscribirse_a_eventos_pagos():
             client = pulsar.Client(PULSAR_BROKER_URL)
             consumer = client.subscribe(
                 TOPIC_EVENTOS_PAGOS,
-                subscription_name="campanias-sub-eventos-pagos",
-                consumer_type=ConsumerType.Shared,
+                subscription_name=subscription_name,
                 initial_position=pulsar.InitialPosition.Earliest,
+                **opciones,
             )
             logging.info(f"[CAMPANIAS] Suscripción a {TOPIC_EVENTOS_PAGOS} establecida (attempt {attempt+1})")
             break
@@ -40,172 +93,353 @@ def suscribirse_a_eventos_pagos():
     if consumer is None:
         raise Exception(f"No se pudo suscribir a {TOPIC_EVENTOS_PAGOS} después de varios intentos")
     logging.info(f"[CAMPANIAS] Suscrito a eventos pagos: {TOPIC_EVENTOS_PAGOS}")
+    return client, consumer
 
-    db_url = os.getenv('DB_URL') or os.getenv('DATABASE_URL')
+
+def _engine_verificado():
+    """Shared DB engine, verified with retries in case the DB is not yet resolvable."""
+    db_url = database_url()
     if not db_url:
         raise RuntimeError('DB_URL not set; cannot create DB engine')
-    db_url_sql = db_url.replace('+psycopg2', '')
-    logging.info(f"[CAMPANIAS] DB engine will use: {db_url_sql}")
-    # Create engine with retries in case the DB hostname or service is not yet resolvable
-    engine = None
-    parsed = None
-    try:
-        from urllib.parse import urlparse
-        parsed = urlparse(db_url_sql)
-        hostname = parsed.hostname
-    except Exception:
-        hostname = None
-
+    engine = get_engine(db_url)
+    logging.info(f"[CAMPANIAS] DB engine will use: {engine.url.render_as_string(hide_password=True)}")
+    hostname = engine.url.host
     for attempt in range(10):
         try:
             if hostname:
-                try:
-                    import socket
-                    socket.gethostbyname(hostname)
-                except Exception:
-                    raise
-            engine = create_engine(db_url_sql, pool_pre_ping=True)
+                import socket
+                socket.gethostbyname(hostname)
             # try a quick connection
             with engine.connect() as conn:
                 conn.execute(text('SELECT 1'))
-            logging.info(f"[CAMPANIAS] DB engine created and verified (attempt {attempt+1})")
-            break
+            logging.info(f"[CAMPANIAS] DB engine verified (attempt {attempt+1})")
+            return engine
         except Exception as e:
             logging.warning(f"[CAMPANIAS] DB engine not ready (attempt {attempt+1}/10): {e}")
             time.sleep(min(2 ** attempt, 30))
-    if engine is None:
-        raise RuntimeError('Could not create DB engine after retries')
+    raise RuntimeError('Could not create DB engine after retries')
 
-    def is_event_processed_raw(aggregate_id, event_type, event_id):
-        q = text("SELECT 1 FROM processed_events WHERE aggregate_id = :agg AND event_type = :et AND event_id = :eid LIMIT 1")
-        with engine.connect() as c:
-            r = c.execute(q, {"agg": aggregate_id, "et": event_type, "eid": event_id})
-            return r.first() is not None
 
-    # backward-compatible alias used elsewhere — keep a safe alias to avoid NameError
-    def check_event_processed_raw(aggregate_id, event_type, event_id):
-        try:
-            return is_event_processed_raw(aggregate_id, event_type, event_id)
-        except Exception:
-            # If something unexpected happens, surface False so consumers can proceed
-            return False
+def _evento_campania(tipo, id_campania, data):
+    """Map a pagos event to (event type, event payload, view state), or None if not relevant."""
+    from datetime import datetime
+    if tipo == "PagoConfirmado.v1":
+        from campanias.domain.entidades import CampaniaAprobada
+        evento = CampaniaAprobada(idCampania=id_campania, fechaAprobacion=datetime.utcnow())
+        return "CampaniaAprobada.v1", evento.to_dict(), "APROBADA"
+    if tipo == "PagoRevertido.v1":
+        from campanias.domain.entidades import CampaniaCancelada
+        evento = CampaniaCancelada(
+            idCampania=id_campania,
+            motivo=data.get('motivo', 'Pago fallido'),
+            fechaCancelacion=datetime.utcnow()
+        )
+        return "CampaniaCancelada.v1", evento.to_dict(), "CANCELADA"
+    return None
+
+
+def _decodificar(msg):
+    """Decode a pagos message into (tipo, data, id_campania, event_id); None if unusable."""
+    raw = msg.data()
+    try:
+        payload = json.loads(raw)
+    except Exception as e:
+        logging.warning(f"[CAMPANIAS] Error decodificando JSON. Payload raw: {raw}. Error: {e}")
+        return None
+    tipo = payload.get("type")
+    data = payload.get("data") or {}
+    id_campania = data.get("idCampania")
+    if id_campania is None or tipo is None:
+        logging.error(f"[CAMPANIAS] Evento sin id_campania o tipo. Payload: {payload}")
+        return None
+    event_id = payload.get("event_id") or msg.message_id().serialize().hex()
+    return tipo, data, id_campania, event_id
+
+
+def idempotency_cache(engine):
+    """Process-wide idempotency cache, warmed from processed_events on first use."""
+    global _idempotency_cache
+    with _idempotency_lock:
+        if _idempotency_cache is None:
+            cache = CacheIdempotencia(IDEMPOTENCY_LRU_SIZE, IDEMPOTENCY_BLOOM_CAPACITY)
+            try:
+                with engine.connect() as c:
+                    recientes = c.execute(text(
+                        "SELECT aggregate_id, event_type, event_id FROM processed_events ORDER BY id DESC LIMIT :n"
+                    ), {"n": IDEMPOTENCY_WARM_ROWS}).fetchall()
+                cache.calentar(tuple(r) for r in reversed(recientes))
+                logging.info(f"[CAMPANIAS] Caché de idempotencia calentada con {len(recientes)} eventos")
+            except Exception:
+                logging.exception("[CAMPANIAS] No se pudo calentar la caché de idempotencia")
+            _idempotency_cache = cache
+        return _idempotency_cache
+
 
-    def mark_event_processed_raw(aggregate_id, event_type, event_id):
-        q = text("INSERT INTO processed_events (aggregate_id, event_type, event_id) VALUES (:agg, :et, :eid) ON CONFLICT DO NOTHING")
-        with engine.begin() as c:
-            c.execute(q, {"agg": aggregate_id, "et": event_type, "eid": event_id})
+def _lock_event_ids(c, event_ids):
+    """Serialize concurrent claims of the same event ids until commit (Postgres only).
+    Locks are taken in hash order so overlapping batches cannot deadlock."""
+    if c.dialect.name == 'postgresql':
+        c.execute(text(SQL_LOCK_EVENT_IDS), {"eids": sorted(set(event_ids))})
 
-    def upsert_campania_view_raw(id_campania, id_cliente, estado):
+
+def _claim_batch(c, keys):
+    """Claim `keys` with one multi-row INSERT; returns the keys this call claimed."""
+    if not keys:
+        return set()
+    _lock_event_ids(c, [k[2] for k in keys])
+    values = ', '.join(f"(:a{i}, :t{i}, :e{i})" for i in range(len(keys)))
+    params = {}
+    for i, (id_campania, tipo, event_id) in enumerate(keys):
+        params.update({f"a{i}": id_campania, f"t{i}": tipo, f"e{i}": event_id})
+    q = text(
+        "INSERT INTO processed_events (aggregate_id, event_type, event_id) "
+        f"SELECT v.column1, v.column2, v.column3 FROM (VALUES {values}) AS v "
+        "WHERE NOT EXISTS (SELECT 1 FROM processed_events p WHERE p.aggregate_id = v.column1 "
+        "AND p.event_type = v.column2 AND p.event_id = v.column3) "
+        "ON CONFLICT DO NOTHING RETURNING aggregate_id, event_type, event_id"
+    )
+    return {tuple(r) for r in c.execute(q, params)}
+
+
+def procesar_lote(engine, mensajes):
+    """Process a batch of pagos messages with set-based DB writes.
+
+    Duplicates are filtered through the idempotency cache; only its possible
+    positives are checked against processed_events, with a single query. The
+    rest are claimed in processed_events with one multi-row insert, and only the
+    claimed events are written (campaign events and campanias_view upserts) in
+    that same transaction. Integration events are published before it commits.
+    Returns the number of newly processed events.
+    """
+    from sqlalchemy import bindparam
+
+    cache = idempotency_cache(engine)
+    pendientes = {}
+    for msg in mensajes:
+        decodificado = _decodificar(msg)
+        if decodificado is None:
+            continue
+        tipo, data, id_campania, event_id = decodificado
+        pendientes.setdefault((id_campania, tipo, event_id), data)
+    if not pendientes:
+        return 0
+
+    vistos = {k for k in pendientes if cache.visto(k)}
+    dudosos = [k for k in pendientes if k not in vistos and cache.visto(k) is None]
+    if dudosos:
         q = text(
-            "INSERT INTO campanias_view (id, id_cliente, estado, updated_at) VALUES (:idc, :idcli, :est, now())"
-            " ON CONFLICT (id) DO UPDATE SET id_cliente = EXCLUDED.id_cliente, estado = EXCLUDED.estado, updated_at = now()"
-        )
-        with engine.begin() as c:
-            c.execute(q, {"idc": id_campania, "idcli": id_cliente, "est": estado})
+            "SELECT aggregate_id, event_type, event_id FROM processed_events WHERE event_id IN :eids"
+        ).bindparams(bindparam('eids', expanding=True))
+        with engine.connect() as c:
+            vistos |= {tuple(r) for r in c.execute(q, {"eids": sorted({k[2] for k in dudosos})})}
+    nuevos = [(k, data) for k, data in pendientes.items() if k not in vistos]
+    if not nuevos:
+        logging.info(f"[CAMPANIAS] Lote de {len(mensajes)} mensajes ya procesado")
+        return 0
+
+    eventos, vistas, publicaciones = [], [], []
+    with engine.begin() as c:
+        reclamados = _claim_batch(c, [k for k, _ in nuevos])
+        nuevos = [(k, data) for k, data in nuevos if k in reclamados]
+        for (id_campania, tipo, _), data in nuevos:
+            resultado = _evento_campania(tipo, id_campania, data)
+            if resultado is None:
+                continue
+            tipo_campania, evento, estado = resultado
+            eventos.append((id_campania, tipo_campania, evento))
+            vistas.append({"idc": id_campania, "idcli": data.get("idCliente"), "est": estado})
+            publicaciones.append((tipo_campania, evento))
+        if eventos:
+            for vista, version in zip(vistas, append_events(eventos, conn=c)):
+                vista["ver"] = version
+            upsert_campanias_view(c, vistas)
+            refresh_snapshots(c, [e[0] for e in eventos])
+        # A failed publish rolls the batch back so the redelivery publishes again; in async
+        # mode the sends are pipelined and all their acks awaited before the commit
+        esperar_confirmaciones([publish_event(tipo_campania, evento) for tipo_campania, evento in publicaciones])
+    invalidate_campanias_view({e[0] for e in eventos})
+    cache.calentar(pendientes)
+    logging.info(f"[CAMPANIAS] Lote procesado: {len(mensajes)} mensajes, {len(nuevos)} nuevos, {len(eventos)} eventos de campania")
+    return len(nuevos)
 
+
+def suscribirse_a_eventos_pagos_en_lotes():
+    """Batch consumer loop: batch_receive + set-based writes + per-message ack."""
+    client, consumer = _suscribir(
+        BATCH_SUBSCRIPTION,
+        consumer_type=ConsumerType.Failover,
+        batch_receive_policy=pulsar.ConsumerBatchReceivePolicy(BATCH_MAX_MESSAGES, BATCH_MAX_BYTES, BATCH_TIMEOUT_MS),
+    )
+    engine = _engine_verificado()
     try:
         while True:
+            mensajes = list(consumer.batch_receive())
+            if not mensajes:
+                continue
             try:
-                msg = consumer.receive()
-                raw = msg.data()
-                try:
-                    logging.debug(f"[CAMPANIAS] Mensaje recibido (len={len(raw)}): {raw}")
-                    payload = json.loads(raw)
-                except Exception as e:
-                    logging.warning(f"[CAMPANIAS] Error decodificando JSON. Payload raw: {raw}. Error: {e}")
+                procesar_lote(engine, mensajes)
+                # A batch can span partitions; a cumulative ack would only cover one of them
+                for msg in mensajes:
                     consumer.acknowledge(msg)
-                    continue
+            except Exception as e:
+                import traceback
+                logging.error(f"[CAMPANIAS] Error procesando lote de eventos de pagos: {e}\n{traceback.format_exc()}")
+                for msg in mensajes:
+                    try:
+                        consumer.negative_acknowledge(msg)
+                    except Exception:
+                        pass
+    finally:
+        try:
+            consumer.close()
+        except Exception:
+            pass
+        try:
+            client.close()
+        except Exception:
+            pass
 
-                logging.debug(f"[CAMPANIAS] Payload decodificado: {payload}")
-                tipo = payload.get("type")
-                data = payload.get("data")
-                id_campania = data.get("idCampania") if data else None
-                event_id = payload.get("event_id") or msg.message_id().serialize().hex()
-                logging.info(f"[CAMPANIAS] Procesando evento: tipo={tipo}, id_campania={id_campania}, event_id={event_id}")
 
-                if id_campania is None or tipo is None:
-                    logging.error(f"[CAMPANIAS] Evento sin id_campania o tipo. Payload: {payload}")
-                    consumer.acknowledge(msg)
-                    continue
+def _is_event_processed_raw(engine, aggregate_id, event_type, event_id):
+    q = text("SELECT 1 FROM processed_events WHERE aggregate_id = :agg AND event_type = :et AND event_id = :eid LIMIT 1")
+    with engine.connect() as c:
+        r = c.execute(q, {"agg": aggregate_id, "et": event_type, "eid": event_id})
+        return r.first() is not None
 
-                if is_event_processed_raw(id_campania, tipo, event_id):
-                    logging.info(f"[CAMPANIAS] Evento ya procesado: {event_id}")
-                    consumer.acknowledge(msg)
-                    continue
 
-                if tipo == "PagoConfirmado.v1":
-                    from campanias.domain.entidades import CampaniaAprobada
-                    from datetime import datetime
-                    evento_aprobada = CampaniaAprobada(
-                        idCampania=id_campania,
-                        fechaAprobacion=datetime.utcnow()
-                    )
-                    logging.info(f"[CAMPANIAS] About to append_event for {id_campania} type=CampaniaAprobada.v1")
-                    try:
-                        append_res = append_event(id_campania, "CampaniaAprobada.v1", evento_aprobada.to_dict())
-                        logging.info(f"[CAMPANIAS] append_event result: {append_res}")
-                    except Exception:
-                        logging.exception(f"[CAMPANIAS] append_event failed for {id_campania}")
-                    logging.info(f"[CAMPANIAS] append_event complete for {id_campania} type=CampaniaAprobada.v1")
-                    try:
-                        upsert_campania_view_raw(id_campania, data.get("idCliente"), "APROBADA")
-                        logging.info(f"[CAMPANIAS] Upsert campanias_view successful for {id_campania}")
-                    except IntegrityError as ie:
-                        logging.error(f"[CAMPANIAS] IntegrityError on upsert APROBADA: {ie}")
-                        mark_event_processed_raw(id_campania, tipo, event_id)
-                        consumer.acknowledge(msg)
-                        logging.info(f"[CAMPANIAS] Evento marcado procesado tras IntegrityError: {event_id}")
-                        continue
-                    publish_event("CampaniaAprobada.v1", evento_aprobada.to_dict())
-                    logging.info(f"[CAMPANIAS] Campania APROBADA: {id_campania}")
-
-                elif tipo == "PagoRevertido.v1":
-                    from campanias.domain.entidades import CampaniaCancelada
-                    from datetime import datetime
-                    evento_cancelada = CampaniaCancelada(
-                        idCampania=id_campania,
-                        motivo=data.get('motivo', 'Pago fallido'),
-                        fechaCancelacion=datetime.utcnow()
-                    )
-                    logging.info(f"[CAMPANIAS] About to append_event for {id_campania} type=CampaniaCancelada.v1")
-                    try:
-                        append_res = append_event(id_campania, "CampaniaCancelada.v1", evento_cancelada.to_dict())
-                        logging.info(f"[CAMPANIAS] append_event result: {append_res}")
-                    except Exception:
-                        logging.exception(f"[CAMPANIAS] append_event failed for {id_campania}")
-                    logging.info(f"[CAMPANIAS] append_event complete for {id_campania} type=CampaniaCancelada.v1")
-                    try:
-                        upsert_campania_view_raw(id_campania, data.get("idCliente"), "CANCELADA")
-                    except IntegrityError as ie:
-                        logging.error(f"[CAMPANIAS] IntegrityError on upsert CANCELADA: {ie}")
-                        mark_event_processed_raw(id_campania, tipo, event_id)
-                        consumer.acknowledge(msg)
-                        logging.info(f"[CAMPANIAS] Evento marcado procesado tras IntegrityError: {event_id}")
-                        continue
-                    publish_event("CampaniaCancelada.v1", evento_cancelada.to_dict())
-                    logging.info(f"[CAMPANIAS] Campania CANCELADA: {id_campania}")
+def procesar_mensaje(engine, msg):
+    """Apply one pagos message to campanias. Returns normally when the message can be
+    acked (including undecodable or duplicated messages) and raises to request a nack.
+
+    The idempotency cache answers most lookups without touching the DB. The
+    processed_events claim, the campaign event and the view upsert then share one
+    transaction, so a duplicate that slipped past the cache changes nothing."""
+    logging.debug(f"[CAMPANIAS] Mensaje recibido (len={len(msg.data())}): {msg.data()}")
+    decodificado = _decodificar(msg)
+    if decodificado is None:
+        return
+    tipo, data, id_campania, event_id = decodificado
+    logging.info(f"[CAMPANIAS] Procesando evento: tipo={tipo}, id_campania={id_campania}, event_id={event_id}")
+
+    clave = (id_campania, tipo, event_id)
+    cache = idempotency_cache(engine)
+    visto = cache.visto(clave)
+    if visto is None:
+        # Possible Bloom positive: only now ask the DB
+        visto = _is_event_processed_raw(engine, id_campania, tipo, event_id)
+    if visto:
+        cache.registrar(clave)
+        logging.info(f"[CAMPANIAS] Evento ya procesado: {event_id}")
+        return
+
+    resultado = _evento_campania(tipo, id_campania, data)
+    with engine.begin() as c:
+        _lock_event_ids(c, [event_id])
+        if c.execute(text(SQL_CLAIM_PROCESSED), {"agg": id_campania, "et": tipo, "eid": event_id}).first() is None:
+            cache.registrar(clave)
+            logging.info(f"[CAMPANIAS] Evento ya procesado (otra réplica): {event_id}")
+            return
+        if resultado is not None:
+            tipo_campania, evento, estado = resultado
+            version = append_events([(id_campania, tipo_campania, evento)], conn=c)[0]
+            refresh_snapshots(c, [id_campania])
+            try:
+                with c.begin_nested():
+                    c.execute(text(SQL_UPSERT_CAMPANIA_VIEW), {"idc": id_campania, "idcli": data.get("idCliente"),
+                                                               "est": estado, "ver": version})
+            except IntegrityError as ie:
+                # Keep the claim to avoid a retry storm; payload should be fixed upstream.
+                logging.error(f"[CAMPANIAS] IntegrityError on upsert {estado}: {ie}")
+                resultado = None
+            else:
+                # A failed publish rolls the transaction back so the redelivery publishes again
+                esperar_confirmaciones([publish_event(tipo_campania, evento)])
+                logging.info(f"[CAMPANIAS] Campania {estado}: {id_campania}")
+    if resultado is not None:
+        invalidate_campanias_view([id_campania])
+    cache.registrar(clave)
+    logging.info(f"[CAMPANIAS] Evento marcado como procesado: {event_id} (aggregate={id_campania}, type={tipo})")
+
+
+def _consumir_con_escritura_diferida(client, consumer, engine):
+    """Receive loop that buffers messages and acks them only once their batch is durable."""
+    from alpespartners.seedwork.infraestructura.escritura_diferida import BufferEscrituraDiferida
+
+    buffer = BufferEscrituraDiferida(
+        lambda mensajes: procesar_lote(engine, mensajes),
+        max_items=WRITE_BEHIND_MAX,
+        max_espera_ms=WRITE_BEHIND_MS,
+    )
+    logging.info(f"[CAMPANIAS] Consumidor write-behind: hasta {WRITE_BEHIND_MAX} mensajes o {WRITE_BEHIND_MS} ms por escritura")
+    try:
+        while True:
+            msg = consumer.receive()
+            buffer.agregar(
+                msg,
+                confirmar=lambda m=msg: consumer.acknowledge(m),
+                rechazar=lambda m=msg: consumer.negative_acknowledge(m),
+            )
+    finally:
+        buffer.cerrar()
+        try:
+            consumer.close()
+        except Exception:
+            pass
+        try:
+            client.close()
+        except Exception:
+            pass
 
-                try:
-                    mark_event_processed_raw(id_campania, tipo, event_id)
-                    try:
-                        exists = check_event_processed_raw(id_campania, tipo, event_id)
-                    except NameError:
-                        exists = is_event_processed_raw(id_campania, tipo, event_id)
-                    logging.info(f"[CAMPANIAS] Evento marcado como procesado: {event_id} (aggregate={id_campania}, type={tipo}) - persisted={exists}")
-                except Exception:
-                    logging.exception(f"[CAMPANIAS] Error marcando evento como procesado: {event_id}")
 
+def suscribirse_a_eventos_pagos():
+    if BATCH_MAX_MESSAGES > 1:
+        return suscribirse_a_eventos_pagos_en_lotes()
+
+    if CONSUMER_WORKERS > 1:
+        # Key_Shared lets several replicas split campaigns while the broker keeps
+        # every idCampania (partition_key) on a single consumer.
+        client, consumer = _suscribir(consumer_type=ConsumerType.KeyShared)
+    else:
+        client, consumer = _suscribir(consumer_type=ConsumerType.Shared)
+    engine = _engine_verificado()
+
+    if WRITE_BEHIND_MS > 0:
+        return _consumir_con_escritura_diferida(client, consumer, engine)
+
+    despachador = None
+    if CONSUMER_WORKERS > 1:
+        from alpespartners.seedwork.infraestructura.despachador_ordenado import DespachadorPorClave, clave_por_campo
+        despachador = DespachadorPorClave(
+            lambda msg: procesar_mensaje(engine, msg),
+            workers=CONSUMER_WORKERS,
+            clave=clave_por_campo(CONSUMER_ORDER_KEY),
+            max_reintentos=CONSUMER_MAX_RETRIES,
+        )
+        logging.info(f"[CAMPANIAS] Consumidor con {CONSUMER_WORKERS} workers ordenados por {CONSUMER_ORDER_KEY}")
+
+    try:
+        while True:
+            msg = None
+            try:
+                msg = consumer.receive()
+                if despachador is not None:
+                    despachador.despachar(consumer, msg)
+                    continue
+                procesar_mensaje(engine, msg)
                 consumer.acknowledge(msg)
 
             except Exception as e:
                 import traceback
                 logging.error(f"[CAMPANIAS] Error procesando evento de pagos: {e}\n{traceback.format_exc()}")
                 try:
-                    consumer.negative_acknowledge(msg)
+                    if msg is not None:
+                        consumer.negative_acknowledge(msg)
                 except Exception:
                     pass
 
     finally:
+        if despachador is not None:
+            despachador.detener()
         try:
             consumer.close()
         except Exception:
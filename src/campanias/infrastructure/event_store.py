@@ -1,43 +1,202 @@
+import heapq
 import json
+import re
+from contextlib import contextmanager
 from datetime import datetime
-from typing import Any, Dict, List
-from sqlalchemy import create_engine, text
-from alpespartners.config.db import db
+from itertools import takewhile
+from typing import Any, Dict, Iterable, Iterator, List, NamedTuple, Optional, Sequence, Tuple, Union
+from sqlalchemy import bindparam, insert, select, text
+from alpespartners.config.db import db, database_url, get_engine
+from campanias.infrastructure.archive import get_archive
 from campanias.infrastructure.repos import EventStoreModel
-import os
 
+ITER_BATCH_SIZE = 1000
 
-def append_event(aggregate_id: str, type_: str, data: Dict[str, Any]) -> Dict[str, Any]:
-    db_url = os.getenv('DB_URL') or os.getenv('DATABASE_URL')
-    if not db_url:
-        record = EventStoreModel(
-            aggregate_id=aggregate_id,
-            aggregate_type='Campania',
-            type=type_,
-            payload=json.dumps(data),
-            occurred_on=datetime.utcnow()
-        )
-        db.session.add(record)
+# Payload keys with their own expression index on Postgres (see alpespartners_core_schema.sql)
+INDEXED_PAYLOAD_KEYS = ('idCliente', 'idCampania', 'idPago')
+_KEY = re.compile(r'^[A-Za-z_][A-Za-z0-9_]*$')
+
+
+class StoredEvent(NamedTuple):
+    """Plain-tuple view of an event_store row; read `payload` with `decode_payload`."""
+    id: int
+    aggregate_id: str
+    type: str
+    payload: Union[str, Dict[str, Any]]
+    occurred_on: datetime
+
+
+def decode_payload(payload) -> Dict[str, Any]:
+    """JSONB comes back already decoded on Postgres; the SQLite fallback stores JSON text."""
+    if not payload:
+        return {}
+    if isinstance(payload, (str, bytes)):
+        return json.loads(payload)
+    return payload
+
+
+@contextmanager
+def transaccion():
+    """Connection inside one transaction: the shared engine when DB_URL is set,
+    otherwise the Flask SQLAlchemy session's connection. Commits once on exit."""
+    db_url = database_url()
+    if db_url:
+        with get_engine(db_url).begin() as c:
+            yield c
+        return
+    conn = db.session.connection()
+    try:
+        yield conn
         db.session.commit()
-        return {"id": record.id, "aggregate_id": record.aggregate_id, "type": record.type}
+    except Exception:
+        db.session.rollback()
+        raise
 
-    db_url_sql = db_url.replace('+psycopg2', '')
-    engine = create_engine(db_url_sql, pool_pre_ping=True)
-    insert_q = text(
-        "INSERT INTO event_store (aggregate_id, aggregate_type, type, payload, occurred_on) "
-        "VALUES (:agg, 'Campania', :type, :payload, now()) RETURNING id"
-    )
-    with engine.begin() as conn:
-        res = conn.execute(insert_q, {"agg": aggregate_id, "type": type_, "payload": json.dumps(data)})
-        row = res.fetchone()
-        inserted_id = row[0] if row is not None else None
+
+def append_event(aggregate_id: str, type_: str, data: Dict[str, Any]) -> Dict[str, Any]:
+    inserted_id = append_events([(aggregate_id, type_, data)])[0]
     return {"id": inserted_id, "aggregate_id": aggregate_id, "type": type_}
 
 
+def append_events(events: Iterable[Tuple[str, str, Dict[str, Any]]], conn=None) -> List[int]:
+    """
+    Append a batch of `(aggregate_id, type_, data)` events in a single transaction.
+    Returns the assigned ids in the same order as `events`. SQLAlchemy renders the
+    batch as multi-row `INSERT ... VALUES ... RETURNING id` statements; when `conn`
+    is given the rows are written inside the caller's transaction.
+    """
+    now = datetime.utcnow()
+    rows = [
+        {
+            "aggregate_id": aggregate_id,
+            "aggregate_type": 'Campania',
+            "type": type_,
+            "payload": data,
+            "occurred_on": now,
+        }
+        for aggregate_id, type_, data in events
+    ]
+    if not rows:
+        return []
+    table = EventStoreModel.__table__
+    stmt = insert(table).returning(table.c.id, sort_by_parameter_order=True)
+
+    if conn is not None:
+        return [r[0] for r in conn.execute(stmt, rows)]
+
+    with transaccion() as c:
+        return [r[0] for r in c.execute(stmt, rows)]
+
+
 def events_of(aggregate_id: str):
-    return (
-        db.session.query(EventStoreModel)
-        .filter_by(aggregate_id=aggregate_id)
-        .order_by(EventStoreModel.id)
-        .all()
+    """All events of one aggregate in id order, archived and hot ones merged."""
+    archive = get_archive()
+    boundary = archive.boundary() if archive else None
+    cold = [
+        EventStoreModel(id=id_, aggregate_id=agg, aggregate_type='Campania', type=type_,
+                        payload=payload, occurred_on=occurred_on)
+        for id_, agg, type_, payload, occurred_on in (archive.events_of(aggregate_id) if archive else ())
+    ]
+    hot = db.session.query(EventStoreModel).filter_by(aggregate_id=aggregate_id)
+    if boundary is not None:
+        hot = hot.filter(EventStoreModel.occurred_on >= boundary)
+    return sorted(cold + hot.order_by(EventStoreModel.id).all(), key=lambda e: e.id)
+
+
+def iter_events(from_position: int = 0, types: Optional[Sequence[str]] = None,
+                batch_size: int = ITER_BATCH_SIZE, conn=None, until: Optional[int] = None) -> Iterator[StoredEvent]:
+    """
+    Stream events with id > `from_position` (and <= `until`, if given) in id order,
+    optionally only `types`. Below the archive horizon, archived segments are
+    merged with the hot rows from the archive boundary on. Hot rows come through a
+    server-side cursor (`stream_results` + `yield_per`), so memory stays bounded
+    by `batch_size` however large the store is. Resume a scan by passing the last
+    seen `StoredEvent.id` as `from_position`.
+    """
+    table = EventStoreModel.__table__
+    stmt = (
+        select(table.c.id, table.c.aggregate_id, table.c.type, table.c.payload, table.c.occurred_on)
+        .where(table.c.id > from_position)
+        .order_by(table.c.id)
     )
+    if types:
+        stmt = stmt.where(table.c.type.in_(list(types)))
+    if until is not None:
+        stmt = stmt.where(table.c.id <= until)
+    cold = None
+    archive = get_archive()
+    if archive is not None and from_position < archive.horizon():
+        cold = (StoredEvent(*row) for row in archive.iter_events(from_position, types))
+        if until is not None:
+            cold = takewhile(lambda e: e.id <= until, cold)
+        stmt = stmt.where(table.c.occurred_on >= archive.boundary())
+
+    def merged(c):
+        hot = _stream(c, stmt, batch_size)
+        return heapq.merge(cold, hot, key=lambda e: e.id) if cold is not None else hot
+
+    if conn is not None:
+        yield from merged(conn)
+        return
+    db_url = database_url()
+    engine = get_engine(db_url) if db_url else db.engine
+    with engine.connect() as c:
+        yield from merged(c)
+
+
+def _stream(conn, stmt, batch_size: int) -> Iterator[StoredEvent]:
+    result = conn.execution_options(stream_results=True, yield_per=batch_size).execute(stmt)
+    try:
+        for row in result:
+            yield StoredEvent(*row)
+    finally:
+        result.close()
+
+
+def _payload_filter(dialect: str, where: Dict[str, Any]):
+    """Index-friendly predicates for `payload` matching every key/value in `where`."""
+    for key in where:
+        if not _KEY.match(key):
+            raise ValueError(f'Invalid payload key: {key!r}')
+    if dialect != 'postgresql':
+        return [
+            text(f"json_extract(event_store.payload, '$.{key}') = :w_{key}").bindparams(**{f"w_{key}": value})
+            for key, value in where.items()
+        ]
+    # Common keys hit their btree expression index; the rest use containment over the GIN index
+    clauses = [
+        text(f"(event_store.payload ->> '{key}') = :w_{key}").bindparams(**{f"w_{key}": str(value)})
+        for key, value in where.items() if key in INDEXED_PAYLOAD_KEYS and isinstance(value, str)
+    ]
+    rest = {k: v for k, v in where.items() if not (k in INDEXED_PAYLOAD_KEYS and isinstance(v, str))}
+    if rest:
+        clauses.append(text("event_store.payload @> CAST(:w_contains AS jsonb)")
+                       .bindparams(bindparam('w_contains', json.dumps(rest))))
+    return clauses
+
+
+def find_events(type: Optional[str] = None, where: Optional[Dict[str, Any]] = None,
+                aggregate_id: Optional[str] = None, limit: int = 100, conn=None) -> List[StoredEvent]:
+    """
+    Events matching `type`, `aggregate_id` and payload equality on `where`, newest first.
+    `find_events(type='CampaniaCreada.v1', where={'idCliente': 'cli-1'})` is served by
+    the payload indexes on Postgres instead of scanning and decoding every row.
+    """
+    table = EventStoreModel.__table__
+    stmt = select(table.c.id, table.c.aggregate_id, table.c.type, table.c.payload, table.c.occurred_on)
+    if type:
+        stmt = stmt.where(table.c.type == type)
+    if aggregate_id:
+        stmt = stmt.where(table.c.aggregate_id == aggregate_id)
+    stmt = stmt.order_by(table.c.id.desc()).limit(limit)
+
+    def run(c):
+        q = stmt.where(*_payload_filter(c.dialect.name, where)) if where else stmt
+        return [StoredEvent(*row) for row in c.execute(q)]
+
+    if conn is not None:
+        return run(conn)
+    db_url = database_url()
+    engine = get_engine(db_url) if db_url else db.engine
+    with engine.connect() as c:
+        return run(c)
@@ -0,0 +1,67 @@
+"""
+campanias_view projection from event_store events.
+
+`view_changes` maps one stored event to the view columns it sets, mirroring
+what the live consumers write. `fold_view_changes` collapses a run of events
+into one row per campaign, and `merge_view_sql` writes those rows so that
+columns a chunk did not touch keep their stored value. Each row carries the
+event_store id of its last event as `version`; a row is only overwritten by a
+newer version, so writers may apply events out of order.
+"""
+from typing import Dict, Iterable, Optional
+
+from campanias.domain.entidades import EstadoCampania
+from campanias.infrastructure.event_store import decode_payload
+
+PROJECTED_TYPES = (
+    'CampaniaCreada.v1', 'CampaniaAprobada.v1', 'CampaniaCancelada.v1',
+    'PagoConfirmado.v1', 'PagoRevertido.v1',
+)
+
+_STATES = {
+    'CampaniaCreada': EstadoCampania.PENDIENTE.value,
+    'CampaniaAprobada': EstadoCampania.APROBADA.value,
+    'CampaniaCancelada': EstadoCampania.CANCELADA.value,
+    # direct pagos fallback writes (see pagos.infraestructura.despachadores)
+    'PagoConfirmado': EstadoCampania.APROBADA.value,
+    'PagoRevertido': EstadoCampania.CANCELADA.value,
+}
+
+
+def view_changes(type_: str, data: dict) -> Optional[Dict[str, str]]:
+    state = _STATES.get(type_.split('.')[0])
+    if state is None:
+        return None
+    changes = {"estado": state}
+    if data.get('idCliente'):
+        changes["id_cliente"] = data['idCliente']
+    return changes
+
+
+def fold_view_changes(events: Iterable) -> Dict[str, dict]:
+    """`events` are (id, aggregate_id, type, payload) in id order."""
+    rows: Dict[str, dict] = {}
+    for id_, aggregate_id, type_, payload in events:
+        changes = view_changes(type_, decode_payload(payload))
+        if changes:
+            row = rows.setdefault(aggregate_id, {})
+            row.update(changes)
+            row["version"] = id_
+    return rows
+
+
+def merge_view_sql(table: str = 'campanias_view') -> str:
+    return (
+        f"INSERT INTO {table} (id, id_cliente, estado, version, updated_at) "
+        "VALUES (:idc, :idcli, :est, :ver, CURRENT_TIMESTAMP) "
+        f"ON CONFLICT (id) DO UPDATE SET id_cliente = COALESCE(EXCLUDED.id_cliente, {table}.id_cliente), "
+        f"estado = COALESCE(EXCLUDED.estado, {table}.estado), version = EXCLUDED.version, "
+        f"updated_at = CURRENT_TIMESTAMP WHERE {table}.version < EXCLUDED.version"
+    )
+
+
+def merge_params(rows: Dict[str, dict]):
+    return [
+        {"idc": agg, "idcli": changes.get("id_cliente"), "est": changes.get("estado"), "ver": changes["version"]}
+        for agg, changes in rows.items()
+    ]
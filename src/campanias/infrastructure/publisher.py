@@ -1,16 +1,25 @@
 import os
 import json
+import atexit
 import pulsar
 from threading import Lock
+from alpespartners.seedwork.infraestructura.envio_asincrono import EnvioAsincrono
 
 _pulsar_client = None
 _producer = None
+_envio_async = None
 _lock = Lock()
 
 
 PULSAR_BROKER_URL = os.getenv('PULSAR_BROKER_URL', 'pulsar://broker:6650')
 TOPIC_EVENTOS_CAMPANIAS = os.getenv('TOPIC_EVENTOS_CAMPANIAS', 'persistent://public/default/eventos.campanias')
 
+# Async mode: publish_event returns a Future instead of waiting for the broker ack. Callers that
+# commit or ack after publishing must wait on it first (seedwork esperar_confirmaciones).
+PUBLISH_ASYNC = os.getenv('PULSAR_PUBLISH_ASYNC', '0') == '1'
+BATCHING_MAX_PUBLISH_DELAY_MS = int(os.getenv('PULSAR_BATCHING_MAX_PUBLISH_DELAY_MS', '10'))
+MAX_IN_FLIGHT = int(os.getenv('PULSAR_MAX_IN_FLIGHT', '1000'))
+
 
 def get_producer():
     global _pulsar_client, _producer
@@ -21,7 +30,39 @@ def get_producer():
             _producer = _pulsar_client.create_producer(TOPIC_EVENTOS_CAMPANIAS)
     return _producer
 
+def get_async_sender():
+    """Lazily create a batching producer wrapped with a bounded in-flight sender."""
+    global _pulsar_client, _envio_async
+    with _lock:
+        if _pulsar_client is None:
+            _pulsar_client = pulsar.Client(PULSAR_BROKER_URL)
+        if _envio_async is None:
+            producer = _pulsar_client.create_producer(
+                TOPIC_EVENTOS_CAMPANIAS,
+                batching_enabled=True,
+                batching_max_publish_delay_ms=BATCHING_MAX_PUBLISH_DELAY_MS,
+                max_pending_messages=MAX_IN_FLIGHT,
+                block_if_queue_full=True,
+            )
+            _envio_async = EnvioAsincrono(producer, max_en_vuelo=MAX_IN_FLIGHT)
+    return _envio_async
+
+def publish_event_async(type_: str, data: dict, callback=None):
+    """Publish without waiting for the broker; returns a Future resolved with the MessageId."""
+    envelope = {"type": type_, "data": data}
+    return get_async_sender().enviar(json.dumps(envelope).encode('utf-8'), callback)
+
+def flush(timeout=None):
+    """Wait until every async publication has been acknowledged (graceful shutdown)."""
+    if _envio_async is not None:
+        return _envio_async.flush(timeout)
+    return True
+
+atexit.register(flush)
+
 def publish_event(type_: str, data: dict):
+    if PUBLISH_ASYNC:
+        return publish_event_async(type_, data)
     envelope = {"type": type_, "data": data}
     producer = get_producer()
     producer.send(json.dumps(envelope).encode('utf-8'))
@@ -0,0 +1,249 @@
+"""
+Parallel, checkpointed rebuild of campanias_view from event_store.
+
+Events are replayed into the shadow table `campanias_view_rebuild`. Aggregates
+are split into partitions by hash, and each partition is replayed by a worker
+process. Every chunk of events and its checkpoint (`projection_checkpoints`)
+are written in the same transaction, so an interrupted rebuild resumes where it
+stopped. Archived segments (see campanias.infrastructure.archive) are replayed
+first, in the parent process. When every partition is done, the shadow table is
+swapped in within one transaction, which first replays whatever arrived during
+the rebuild. The rebuild runs in its own process, so it cannot clear the services'
+campanias_view_cache; their entries expire within CAMPANIAS_VIEW_CACHE_TTL_MS.
+
+Partitions filter by type and hash, so they cannot see id gaps themselves. The
+replay is bounded by the settled position: the catch-up gap rules (GapTracker)
+applied to the unfiltered ids, so no partition moves past an insert that may
+still commit. At the swap the live campanias_view subscription is rewound to the
+settled position, and it re-applies the tail past any gap still open.
+
+Usage:
+    PYTHONPATH=src python -m campanias.infrastructure.rebuild --partitions 16 --workers 8
+"""
+import argparse
+import logging
+import os
+import re
+import time
+import zlib
+from concurrent.futures import ProcessPoolExecutor
+from itertools import islice
+from typing import Optional
+
+from sqlalchemy import bindparam, text
+
+from alpespartners.config.db import database_url, dispose_engines, get_engine
+from campanias.infrastructure.archive import get_archive
+from campanias.infrastructure.catchup import SQL_CHECKPOINT, SQL_SAVE_CHECKPOINT, GapTracker
+from campanias.infrastructure.projection import (
+    PROJECTED_TYPES, fold_view_changes, merge_params, merge_view_sql,
+)
+
+VIEW = 'campanias_view'
+SHADOW = 'campanias_view_rebuild'
+CHUNK_SIZE = 5000
+
+SQL_CREATE_SHADOW = f"CREATE TABLE IF NOT EXISTS {SHADOW} (LIKE {VIEW} INCLUDING ALL)"
+SQL_SQLITE_TABLE_DDL = "SELECT sql FROM sqlite_master WHERE type = 'table' AND name = :name"
+SQL_TAIL_IDS = "SELECT id, occurred_on FROM event_store WHERE id > :position ORDER BY id LIMIT :limit"
+# Rewinds the live catch-up subscription of campanias_view (see catchup.campanias_view_subscription)
+SQL_REWIND_LIVE = "UPDATE projection_checkpoints SET position = :position WHERE name = :name AND position > :position"
+# How long the rebuild waits for an open id gap to settle before it stops in front of it
+REBUILD_GAP_WAIT_MS = int(os.getenv('REBUILD_GAP_WAIT_MS', '60000'))
+_GAP_RECHECK_S = 0.1
+
+
+def _partition_of(aggregate_id, partitions):
+    return zlib.crc32(str(aggregate_id or '').encode('utf-8')) % partitions
+
+
+def _partition_sql(dialect: str) -> str:
+    # Same partitioning within a dialect is all a resume needs
+    if dialect == 'postgresql':
+        return "mod(abs(hashtext(aggregate_id)::bigint), :partitions) = :partition"
+    return "campanias_partition(aggregate_id, :partitions) = :partition"
+
+
+def _connect(engine):
+    conn = engine.connect()
+    if engine.dialect.name == 'sqlite':
+        conn.connection.driver_connection.create_function('campanias_partition', 2, _partition_of)
+    return conn
+
+
+def create_shadow(conn):
+    """Create the shadow table with campanias_view's current columns, defaults and constraints."""
+    if conn.dialect.name == 'postgresql':
+        conn.execute(text(SQL_CREATE_SHADOW))
+        return
+    # SQLite has no CREATE TABLE ... LIKE: reuse the stored DDL of the view table
+    ddl = conn.execute(text(SQL_SQLITE_TABLE_DDL), {"name": VIEW}).scalar()
+    conn.execute(text(re.sub(r'^CREATE TABLE\s+["`]?' + VIEW + r'["`]?', f"CREATE TABLE IF NOT EXISTS {SHADOW}", ddl)))
+
+
+def settled_position(conn, after: int, batch_size: int = CHUNK_SIZE, wait_s: float = 0.0) -> int:
+    """Last event id past `after` below which no insert can still commit (catch-up gap rules).
+
+    An open gap is re-checked for up to `wait_s` seconds before the scan stops in front of it.
+    """
+    gaps = GapTracker(f"{SHADOW}:tail")
+    deadline = time.monotonic() + wait_s
+    position = after
+    while True:
+        events = conn.execute(text(SQL_TAIL_IDS), {"position": position, "limit": batch_size}).fetchall()
+        settled = gaps.until_gap(position, events, conn)
+        if settled:
+            position = settled[-1].id
+        if len(settled) == len(events):
+            if len(events) < batch_size:
+                return position
+        elif time.monotonic() >= deadline:
+            return position
+        else:
+            time.sleep(_GAP_RECHECK_S)
+
+
+def _init_worker():
+    # Forked workers must not reuse the parent's pooled connections
+    dispose_engines(close=False)
+
+
+def checkpoint_name(partition: int, partitions: int) -> str:
+    return f"{SHADOW}:{partition}/{partitions}"
+
+
+def _replay_chunk(conn, partition: int, partitions: int, after: int, limit: Optional[int],
+                  until: Optional[int] = None):
+    """Apply one chunk (ids up to `until`) to the shadow table; returns (last position, events read)."""
+    q = text(
+        "SELECT id, aggregate_id, type, payload FROM event_store "
+        f"WHERE id > :after AND type IN :types AND {_partition_sql(conn.dialect.name)}"
+        + (" AND id <= :until" if until is not None else "") + " ORDER BY id"
+        + (" LIMIT :limit" if limit else "")
+    ).bindparams(bindparam('types', expanding=True))
+    params = {"after": after, "types": list(PROJECTED_TYPES), "partitions": partitions, "partition": partition}
+    if until is not None:
+        params["until"] = until
+    if limit:
+        params["limit"] = limit
+    events = conn.execute(q, params).fetchall()
+    if not events:
+        return after, 0
+    rows = fold_view_changes(events)
+    if rows:
+        conn.execute(text(merge_view_sql(SHADOW)), merge_params(rows))
+    position = events[-1][0]
+    conn.execute(text(SQL_SAVE_CHECKPOINT), {"name": checkpoint_name(partition, partitions), "position": position})
+    return position, len(events)
+
+
+def rebuild_partition(db_url: str, partition: int, partitions: int, chunk_size: int = CHUNK_SIZE,
+                      until: Optional[int] = None) -> int:
+    """Replay one partition (up to `until`) into the shadow table from its checkpoint; returns events applied."""
+    engine = get_engine(db_url)
+    total = 0
+    with _connect(engine) as conn:
+        with conn.begin():
+            position = conn.execute(text(SQL_CHECKPOINT), {"name": checkpoint_name(partition, partitions)}).scalar() or 0
+        while True:
+            with conn.begin():
+                position, read = _replay_chunk(conn, partition, partitions, position, chunk_size, until)
+            total += read
+            if read < chunk_size:
+                return total
+
+
+def replay_archive(db_url: str, chunk_size: int = CHUNK_SIZE) -> int:
+    """Replay archived segments into the shadow table before the partitions run over the hot table."""
+    archive = get_archive()
+    if archive is None:
+        return 0
+    engine = get_engine(db_url)
+    name = f"{SHADOW}:archive"
+    with engine.begin() as conn:
+        position = conn.execute(text(SQL_CHECKPOINT), {"name": name}).scalar() or 0
+    total = 0
+    events = archive.iter_events(position, PROJECTED_TYPES)
+    while True:
+        chunk = list(islice(events, chunk_size))
+        if not chunk:
+            return total
+        with engine.begin() as conn:
+            rows = fold_view_changes(row[:4] for row in chunk)
+            if rows:
+                conn.execute(text(merge_view_sql(SHADOW)), merge_params(rows))
+            conn.execute(text(SQL_SAVE_CHECKPOINT), {"name": name, "position": chunk[-1][0]})
+        total += len(chunk)
+
+
+def swap_in(db_url: str, partitions: int, after: int = 0) -> int:
+    """Catch up the tail and replace campanias_view with the shadow table atomically.
+
+    `after` is the settled position the partitions were replayed up to.
+    """
+    engine = get_engine(db_url)
+    caught_up = 0
+    with _connect(engine) as conn, conn.begin():
+        if conn.dialect.name == 'postgresql':
+            # Hold off live projection writes while the tail is applied and tables are renamed
+            conn.execute(text(f"LOCK TABLE {VIEW} IN EXCLUSIVE MODE"))
+        # No waiting here: writers blocked on the lock may hold the missing ids
+        settled = settled_position(conn, after)
+        for partition in range(partitions):
+            position = conn.execute(text(SQL_CHECKPOINT), {"name": checkpoint_name(partition, partitions)}).scalar() or 0
+            caught_up += _replay_chunk(conn, partition, partitions, position, None)[1]
+        conn.execute(text(f"ALTER TABLE {VIEW} RENAME TO {VIEW}_old"))
+        conn.execute(text(f"ALTER TABLE {SHADOW} RENAME TO {VIEW}"))
+        conn.execute(text(f"DROP TABLE {VIEW}_old"))
+        # Events past an open gap may still be missing from the tail; the live subscription re-applies them
+        conn.execute(text(SQL_REWIND_LIVE), {"name": VIEW, "position": settled})
+        conn.execute(text("DELETE FROM projection_checkpoints WHERE name LIKE :prefix"), {"prefix": f"{SHADOW}:%"})
+    return caught_up
+
+
+def rebuild_campanias_view(db_url: Optional[str] = None, partitions: int = 8, workers: int = 8,
+                           chunk_size: int = CHUNK_SIZE, reset: bool = False) -> dict:
+    """Rebuild campanias_view; reruns with the same `partitions` resume from the checkpoints."""
+    db_url = db_url or database_url()
+    if not db_url:
+        raise RuntimeError('DB_URL not set; cannot rebuild campanias_view')
+    engine = get_engine(db_url)
+    with engine.begin() as conn:
+        if reset:
+            conn.execute(text(f"DROP TABLE IF EXISTS {SHADOW}"))
+            conn.execute(text("DELETE FROM projection_checkpoints WHERE name LIKE :prefix"), {"prefix": f"{SHADOW}:%"})
+        create_shadow(conn)
+    with engine.connect() as conn:
+        archive = get_archive()
+        # Archived ids are settled; only the hot table can still have open gaps
+        until = settled_position(conn, archive.horizon() if archive is not None else 0,
+                                 wait_s=REBUILD_GAP_WAIT_MS / 1000.0)
+
+    archived = replay_archive(db_url)
+    if workers <= 1:
+        applied = [rebuild_partition(db_url, p, partitions, chunk_size, until) for p in range(partitions)]
+    else:
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker) as pool:
+            applied = list(pool.map(
+                rebuild_partition, [db_url] * partitions, range(partitions),
+                [partitions] * partitions, [chunk_size] * partitions, [until] * partitions,
+            ))
+    caught_up = swap_in(db_url, partitions, until)
+    logging.info(f"[REBUILD] {VIEW}: {archived + sum(applied)} events replayed, {caught_up} caught up at swap")
+    return {"events": archived + sum(applied), "caught_up": caught_up, "partitions": partitions}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--db-url', default=None, help='SQLAlchemy URL (defaults to DB_URL/DATABASE_URL)')
+    parser.add_argument('--partitions', type=int, default=8)
+    parser.add_argument('--workers', type=int, default=8)
+    parser.add_argument('--chunk-size', type=int, default=CHUNK_SIZE)
+    parser.add_argument('--reset', action='store_true', help='discard checkpoints and the shadow table first')
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO)
+    print(rebuild_campanias_view(args.db_url, args.partitions, args.workers, args.chunk_size, args.reset))
+
+
+if __name__ == '__main__':
+    main()
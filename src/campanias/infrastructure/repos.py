@@ -1,8 +1,39 @@
+import json
+import os
 from sqlalchemy import Column, Integer, String, Text, DateTime
 from sqlalchemy import text
+from sqlalchemy.dialects.postgresql import JSONB
+from sqlalchemy.types import TypeDecorator
 from alpespartners.config.db import db
+from alpespartners.seedwork.infraestructura.cache import CacheLRU
 from datetime import datetime
 
+VIEW_CACHE_SIZE = int(os.getenv('CAMPANIAS_VIEW_CACHE_SIZE', '10000'))
+VIEW_CACHE_TTL_MS = int(os.getenv('CAMPANIAS_VIEW_CACHE_TTL_MS', '2000'))
+
+# Read-through cache for campanias_view lookups (GET /campanias/<id> is polled by the BFF).
+# Writers call invalidate_campanias_view() after commit; the TTL bounds how stale a row
+# written by another replica can be.
+campanias_view_cache = CacheLRU(VIEW_CACHE_SIZE, VIEW_CACHE_TTL_MS / 1000.0, nombre='campanias_view')
+
+
+class JsonPayload(TypeDecorator):
+    """JSONB en Postgres (indexable con GIN/expresiones); texto JSON en otros motores (SQLite)."""
+    impl = Text
+    cache_ok = True
+
+    def load_dialect_impl(self, dialect):
+        if dialect.name == 'postgresql':
+            return dialect.type_descriptor(JSONB())
+        return dialect.type_descriptor(Text())
+
+    def process_bind_param(self, value, dialect):
+        if value is None:
+            return None
+        if dialect.name == 'postgresql':
+            return json.loads(value) if isinstance(value, str) else value
+        return value if isinstance(value, str) else json.dumps(value)
+
 
 class EventStoreModel(db.Model):
     __tablename__ = 'event_store'
@@ -10,20 +41,72 @@ class EventStoreModel(db.Model):
     aggregate_id = Column(String(255), index=True)
     aggregate_type = Column(String(255))
     type = Column(String(255))
-    payload = Column(Text)
+    payload = Column(JsonPayload)
     occurred_on = Column(DateTime, default=datetime.utcnow)
 
 
+class CampaniaSnapshotModel(db.Model):
+    """Último snapshot de cada campania; `version` es el id del último evento aplicado."""
+    __tablename__ = 'campania_snapshots'
+    aggregate_id = Column(String(255), primary_key=True)
+    version = Column(Integer, nullable=False)
+    state = Column(Text, nullable=False)
+    created_at = Column(DateTime, default=datetime.utcnow)
+
+
+class ProjectionCheckpointModel(db.Model):
+    """Posición (id de event_store) hasta la que una proyección ya aplicó eventos."""
+    __tablename__ = 'projection_checkpoints'
+    name = Column(String(255), primary_key=True)
+    position = Column(Integer, nullable=False, default=0)
+    updated_at = Column(DateTime, default=datetime.utcnow)
+
+
+# Version-guarded: `:ver` is the event_store id of the event behind the write, and an older
+# event never overwrites a newer one (id_cliente is kept when the event does not carry it).
+_ON_CONFLICT_CAMPANIA_VIEW = (
+    " ON CONFLICT (id) DO UPDATE SET id_cliente = COALESCE(EXCLUDED.id_cliente, campanias_view.id_cliente),"
+    " estado = EXCLUDED.estado, version = EXCLUDED.version, updated_at = CURRENT_TIMESTAMP"
+    " WHERE campanias_view.version < EXCLUDED.version"
+)
+SQL_UPSERT_CAMPANIA_VIEW = (
+    "INSERT INTO campanias_view (id, id_cliente, estado, version, updated_at)"
+    " VALUES (:idc, :idcli, :est, :ver, CURRENT_TIMESTAMP)" + _ON_CONFLICT_CAMPANIA_VIEW
+)
+
+
+def upsert_campanias_view(conn, rows, chunk_size: int = 1000) -> int:
+    """
+    Upsert campanias_view rows ({"idc", "idcli", "est", "ver"}) with multi-row statements.
+    Rows for the same campaign are coalesced first, and the highest version wins; a
+    single INSERT ... ON CONFLICT cannot touch the same row twice. Returns the rows sent.
+    """
+    latest = {}
+    for row in rows:
+        if row["idc"] not in latest or latest[row["idc"]]["ver"] < row["ver"]:
+            latest[row["idc"]] = row
+    pending = list(latest.values())
+    for start in range(0, len(pending), chunk_size):
+        chunk = pending[start:start + chunk_size]
+        values = ', '.join(f"(:idc{i}, :idcli{i}, :est{i}, :ver{i}, CURRENT_TIMESTAMP)" for i in range(len(chunk)))
+        params = {}
+        for i, row in enumerate(chunk):
+            params.update({f"idc{i}": row["idc"], f"idcli{i}": row["idcli"], f"est{i}": row["est"], f"ver{i}": row["ver"]})
+        conn.execute(text(
+            f"INSERT INTO campanias_view (id, id_cliente, estado, version, updated_at) VALUES {values}"
+            + _ON_CONFLICT_CAMPANIA_VIEW
+        ), params)
+    return len(pending)
+
+
 class CampaniaViewRepo:
     def __init__(self, session):
         self.session = session
 
-    def upsert(self, id_campania, id_cliente=None, estado=None):
-        q = text(
-            "INSERT INTO campanias_view (id, id_cliente, estado, updated_at) VALUES (:idc, :idcli, :est, now()) "
-            "ON CONFLICT (id) DO UPDATE SET id_cliente = EXCLUDED.id_cliente, estado = EXCLUDED.estado, updated_at = now()"
-        )
-        self.session.execute(q, {"idc": id_campania, "idcli": id_cliente, "est": estado})
+    def upsert(self, id_campania, id_cliente=None, estado=None, *, version: int):
+        """`version` is the event_store id behind the write; an older version never overwrites a newer row."""
+        self.session.execute(text(SQL_UPSERT_CAMPANIA_VIEW),
+                             {"idc": id_campania, "idcli": id_cliente, "est": estado, "ver": version})
         self.session.commit()
 
     def get(self, id_campania):
@@ -31,3 +114,25 @@ class CampaniaViewRepo:
         if not r:
             return None
         return {"id": r[0], "idCliente": r[1], "estado": r[2]}
+
+    def count_by_state(self):
+        rows = self.session.execute(text("SELECT estado, COUNT(*) FROM campanias_view GROUP BY estado")).fetchall()
+        return {r[0]: r[1] for r in rows if r[0] is not None}
+
+    def list_by_client(self, id_cliente, estado=None, limit=None):
+        q = "SELECT id, id_cliente, estado FROM campanias_view WHERE id_cliente = :idcli"
+        params = {"idcli": id_cliente}
+        if estado is not None:
+            q += " AND estado = :est"
+            params["est"] = estado
+        if limit is not None:
+            q += " LIMIT :limit"
+            params["limit"] = limit
+        return [{"id": r[0], "idCliente": r[1], "estado": r[2]} for r in self.session.execute(text(q), params)]
+
+
+def invalidate_campanias_view(ids):
+    """Drop cached campanias_view rows; call once the write that changed them has committed."""
+    ids = list(ids)
+    if ids:
+        campanias_view_cache.invalidar(*ids)
@@ -0,0 +1,99 @@
+"""
+Snapshots for event-sourced campaigns.
+
+`load_campania` reads the latest snapshot and replays only the events appended
+after it, so rehydration cost is bounded by the snapshot interval instead of the
+full history. Tails older than the event_store archive horizon are read from the
+archived segments and merged with the hot rows from the archive boundary on.
+
+Snapshots are written on the command path: writers call `refresh_snapshots` in
+the transaction that appends the events, and a snapshot is taken when the tail
+reaches CAMPANIAS_SNAPSHOT_EVERY events or the campaign changed state since the
+last one. `obtener_campania_qry` falls back to a read-only load when
+campanias_view has no row for the campaign yet.
+"""
+import json
+import os
+from typing import Iterable, Optional
+from sqlalchemy import text
+from alpespartners.config.db import db, database_url, get_engine
+from campanias.domain.entidades import Campania
+from campanias.infrastructure.archive import get_archive
+from campanias.infrastructure.event_store import decode_payload, transaccion
+
+SNAPSHOT_EVERY = int(os.getenv('CAMPANIAS_SNAPSHOT_EVERY', '50'))
+
+SQL_LOAD_SNAPSHOT = "SELECT version, state FROM campania_snapshots WHERE aggregate_id = :agg"
+SQL_HAS_HOT_EVENTS = "SELECT 1 FROM event_store WHERE aggregate_id = :agg LIMIT 1"
+SQL_EVENTS_AFTER = (
+    "SELECT id, type, payload FROM event_store WHERE aggregate_id = :agg AND id > :version ORDER BY id"
+)
+SQL_HOT_EVENTS_AFTER = (
+    "SELECT id, type, payload FROM event_store WHERE aggregate_id = :agg AND id > :version "
+    "AND occurred_on >= :boundary ORDER BY id"
+)
+SQL_SAVE_SNAPSHOT = (
+    "INSERT INTO campania_snapshots (aggregate_id, version, state, created_at) "
+    "VALUES (:agg, :version, :state, CURRENT_TIMESTAMP) "
+    "ON CONFLICT (aggregate_id) DO UPDATE SET version = EXCLUDED.version, state = EXCLUDED.state, "
+    "created_at = EXCLUDED.created_at WHERE campania_snapshots.version < EXCLUDED.version"
+)
+
+
+def should_snapshot(tail_length: int, previous_state: Optional[str], current_state: Optional[str]) -> bool:
+    return tail_length >= SNAPSHOT_EVERY or (tail_length > 0 and previous_state != current_state)
+
+
+def save_snapshot(conn, campania: Campania, version: int):
+    """Store `campania` as of event `version`; an older snapshot never overwrites a newer one."""
+    conn.execute(text(SQL_SAVE_SNAPSHOT), {
+        "agg": campania.idCampania,
+        "version": version,
+        "state": json.dumps(campania.to_dict()),
+    })
+
+
+def load_campania(aggregate_id: str, conn=None, save: bool = True) -> Optional[Campania]:
+    """Rebuild a campaign from its latest snapshot plus the events after it.
+
+    With `save=False` (query path) nothing is written and a plain connection is
+    used; a campaign with neither a snapshot nor hot events is reported missing
+    without scanning the archive, since campanias_view already holds archived ones.
+    """
+    if conn is None:
+        if save:
+            with transaccion() as c:
+                return load_campania(aggregate_id, c)
+        db_url = database_url()
+        engine = get_engine(db_url) if db_url else db.engine
+        with engine.connect() as c:
+            return load_campania(aggregate_id, c, save=False)
+
+    row = conn.execute(text(SQL_LOAD_SNAPSHOT), {"agg": aggregate_id}).fetchone()
+    if row is None and not save and conn.execute(text(SQL_HAS_HOT_EVENTS), {"agg": aggregate_id}).first() is None:
+        return None
+    base, version = (Campania.from_dict(json.loads(row[1])), row[0]) if row else (None, 0)
+    previous_state = base.estado if base else None
+    archive = get_archive()
+    if archive is not None and version < archive.horizon():
+        # Snapshot (if any) predates the archive horizon: the older part of the tail is cold
+        cold = [(id_, type_, payload) for id_, _, type_, payload, _ in archive.events_of(aggregate_id, version)]
+        hot = conn.execute(text(SQL_HOT_EVENTS_AFTER),
+                           {"agg": aggregate_id, "version": version, "boundary": archive.boundary()}).fetchall()
+        tail = sorted(cold + [tuple(r) for r in hot])
+    else:
+        tail = conn.execute(text(SQL_EVENTS_AFTER), {"agg": aggregate_id, "version": version}).fetchall()
+    campania = Campania.desde_eventos(
+        aggregate_id,
+        ((type_, decode_payload(payload)) for _, type_, payload in tail),
+        base=base,
+    )
+    if save and campania is not None and should_snapshot(len(tail), previous_state, campania.estado):
+        save_snapshot(conn, campania, tail[-1][0])
+    return campania
+
+
+def refresh_snapshots(conn, aggregate_ids: Iterable[str]):
+    """Take the snapshots now due for `aggregate_ids`, inside the writer's transaction."""
+    for aggregate_id in dict.fromkeys(aggregate_ids):
+        load_campania(aggregate_id, conn)
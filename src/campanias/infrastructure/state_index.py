@@ -0,0 +1,169 @@
+"""
+In-process index of campaign state and client, fed from event_store.
+
+Answers "how many campaigns per state" and "campaigns of client X" from memory,
+without scanning campanias_view. Each campaign takes one slot in parallel typed
+arrays (state code, client code and last applied event id). Campaign and client ids
+are interned strings, with one dict for id -> slot and one array of slots per
+client. Per-state counts are kept up to date on every change, so counting is O(1)
+and listing a client is O(its campaigns).
+
+The index follows event_store through a catch-up subscription whose position
+lives in memory. On boot it replays from position 0 (archive first, then the hot
+table), and afterwards it wakes on NOTIFY like the DB projections. State changes
+use `view_changes`, the same mapping as campanias_view. A slot only moves forward
+in event id, so re-applying a batch is harmless.
+
+Until the first catch-up completes `ready` is unset, and callers should fall back
+to campanias_view.
+"""
+import sys
+import threading
+from array import array
+from typing import Dict, List, Optional
+
+from campanias.domain.entidades import EstadoCampania
+from campanias.infrastructure.catchup import CatchUpSubscription
+from campanias.infrastructure.event_store import decode_payload
+from campanias.infrastructure.projection import view_changes
+
+STATES = tuple(e.value for e in EstadoCampania)
+_STATE_CODES = {state: code for code, state in enumerate(STATES)}
+_NONE = -1
+
+
+class CampaignStateIndex:
+    def __init__(self):
+        self._slots: Dict[str, int] = {}
+        self._ids: List[str] = []
+        self._states = array('b')
+        self._clients = array('i')
+        self._versions = array('q')
+        self._client_codes: Dict[str, int] = {}
+        self._client_ids: List[str] = []
+        self._by_client: List[array] = []
+        self._counts = [0] * len(STATES)
+        self._lock = threading.Lock()
+        self.position = 0
+        self.ready = threading.Event()
+
+    def __len__(self):
+        return len(self._ids)
+
+    def _slot(self, campaign_id: str) -> int:
+        slot = self._slots.get(campaign_id)
+        if slot is None:
+            slot = self._slots[sys.intern(campaign_id)] = len(self._ids)
+            self._ids.append(sys.intern(campaign_id))
+            self._states.append(_NONE)
+            self._clients.append(_NONE)
+            self._versions.append(0)
+        return slot
+
+    def _client_code(self, client_id: str) -> int:
+        code = self._client_codes.get(client_id)
+        if code is None:
+            code = self._client_codes[sys.intern(client_id)] = len(self._client_ids)
+            self._client_ids.append(sys.intern(client_id))
+            self._by_client.append(array('i'))
+        return code
+
+    def apply(self, version: int, campaign_id: str, type_: str, payload) -> bool:
+        """Apply one event_store row; returns whether it changed the index."""
+        changes = view_changes(type_, decode_payload(payload))
+        if not changes:
+            return False
+        with self._lock:
+            slot = self._slot(campaign_id)
+            if self._versions[slot] >= version:
+                return False
+            self._versions[slot] = version
+            client_id = changes.get("id_cliente")
+            if client_id is not None:
+                code = self._client_code(client_id)
+                previous = self._clients[slot]
+                if previous != code:
+                    if previous != _NONE:
+                        self._by_client[previous].remove(slot)
+                    self._by_client[code].append(slot)
+                    self._clients[slot] = code
+            state = _STATE_CODES[changes["estado"]]
+            previous = self._states[slot]
+            if previous != state:
+                if previous != _NONE:
+                    self._counts[previous] -= 1
+                self._counts[state] += 1
+                self._states[slot] = state
+        return True
+
+    def _row(self, slot: int) -> dict:
+        state, client = self._states[slot], self._clients[slot]
+        return {
+            "id": self._ids[slot],
+            "idCliente": self._client_ids[client] if client != _NONE else None,
+            "estado": STATES[state] if state != _NONE else None,
+        }
+
+    def get(self, campaign_id: str) -> Optional[dict]:
+        with self._lock:
+            slot = self._slots.get(campaign_id)
+            return self._row(slot) if slot is not None else None
+
+    def counts(self) -> Dict[str, int]:
+        with self._lock:
+            return dict(zip(STATES, self._counts))
+
+    def campaigns_of(self, client_id: str, estado: Optional[str] = None, limit: Optional[int] = None) -> List[dict]:
+        """Campaigns of a client in first-seen order, optionally only those in `estado`."""
+        wanted = _STATE_CODES[estado] if estado is not None else None
+        with self._lock:
+            code = self._client_codes.get(client_id)
+            if code is None:
+                return []
+            rows = []
+            for slot in self._by_client[code]:
+                if wanted is None or self._states[slot] == wanted:
+                    rows.append(self._row(slot))
+                    if limit is not None and len(rows) >= limit:
+                        break
+            return rows
+
+
+class StateIndexSubscription(CatchUpSubscription):
+    """Catch-up subscription whose checkpoint is the in-memory index position."""
+
+    def __init__(self, index: CampaignStateIndex, engine=None, **kwargs):
+        super().__init__('campaign_state_index', self._apply, engine=engine, **kwargs)
+        self.index = index
+
+    def _apply(self, events, conn):
+        for e in events:
+            self.index.apply(e.id, e.aggregate_id, e.type, e.payload)
+
+    def _load_position(self, conn) -> int:
+        return self.index.position
+
+    def _save_position(self, conn, position: int):
+        self.index.position = position
+
+    def run_once(self) -> int:
+        handled = super().run_once()
+        if handled < self.batch_size:
+            self.index.ready.set()
+        return handled
+
+
+_index: Optional[CampaignStateIndex] = None
+
+
+def campaign_state_index() -> Optional[CampaignStateIndex]:
+    """The process index, or None when it was not started (START_CAMPAIGN_STATE_INDEX)."""
+    return _index
+
+
+def start_campaign_state_index(engine=None) -> CampaignStateIndex:
+    global _index
+    if _index is None:
+        _index = CampaignStateIndex()
+        StateIndexSubscription(_index, engine=engine).start()
+    return _index
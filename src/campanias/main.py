@@ -70,6 +70,42 @@ def try_create_app(module_name: str):
             except Exception:
                 # Non-fatal: continue serving the Flask app even if consumer thread fails to start
                 logging.exception('Failed to start local consumers')
+            # CampaniaCreada is written to the outbox; the relay publishes it to Pulsar.
+            if os.environ.get('START_OUTBOX_RELAY', '1') == '1':
+                try:
+                    from alpespartners.infra.message_bus.publicador import PublicadorPulsar
+                    from alpespartners.infra.message_bus.relay import iniciar_relay
+                    iniciar_relay(PublicadorPulsar())
+                except Exception:
+                    logging.exception('Failed to start outbox relay')
+            # campanias_view is also projected straight from event_store, so a missed publish cannot leave it stale.
+            if os.environ.get('START_CATCHUP_PROJECTIONS', '0') == '1':
+                try:
+                    from campanias.infrastructure.catchup import campanias_view_subscription
+                    campanias_view_subscription().start()
+                except Exception:
+                    logging.exception('Failed to start catch-up projections')
+            # In-memory state index behind /campanias/conteo and /campanias/clientes/<id>
+            if os.environ.get('START_CAMPAIGN_STATE_INDEX', '0') == '1':
+                try:
+                    from campanias.infrastructure.state_index import start_campaign_state_index
+                    start_campaign_state_index()
+                except Exception:
+                    logging.exception('Failed to start campaign state index')
+            # processed_events pruning, tied to the broker redelivery window
+            if os.environ.get('START_PROCESSED_EVENTS_PRUNER', '0') == '1':
+                try:
+                    from alpespartners.infra.retencion import iniciar_poda
+                    iniciar_poda()
+                except Exception:
+                    logging.exception('Failed to start processed_events pruner')
+            # Monthly event_store partitions ahead of time (no-op unless event_store is partitioned)
+            if os.environ.get('START_EVENT_STORE_PARTITIONS', '1') == '1':
+                try:
+                    from campanias.infrastructure.archive import start_partition_maintenance
+                    start_partition_maintenance()
+                except Exception:
+                    logging.exception('Failed to start event_store partition maintenance')
             try:
                 print('App url_map:')
                 print(app.url_map)
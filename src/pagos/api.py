@@ -1,8 +1,13 @@
+import os
 from flask import Flask, jsonify
 
 def create_app():
     app = Flask('pagos')
 
+    if os.getenv('START_OUTBOX_RELAY', '0') == '1':
+        from pagos.infraestructura.outbox import outbox_relay
+        outbox_relay(interval_ms=int(os.getenv('OUTBOX_POLL_INTERVAL_MS', '1000')))
+
     @app.route('/')
     def index():
         return jsonify({'service': 'pagos', 'status': 'ok'})
@@ -1,36 +1,38 @@
 from pagos.infrastructure.publisher import publish_event
-import os
+from alpespartners.seedwork.infraestructura.envio_asincrono import esperar_confirmaciones
 import json
-from sqlalchemy import create_engine, text
+from sqlalchemy import text
+from alpespartners.config.db import database_url, get_engine
 
 
-def _upsert_campania_view_direct(id_campania, id_cliente, estado):
-    db_url = os.getenv('DB_URL') or os.getenv('DATABASE_URL')
+def _upsert_campania_view_direct(id_campania, id_cliente, estado, version):
+    db_url = database_url()
     if not db_url:
         # If no DB URL is configured, nothing to do for fallback
         return
-    db_url_sql = db_url.replace('+psycopg2', '')
-    engine = create_engine(db_url_sql, pool_pre_ping=True)
+    engine = get_engine(db_url)
+    # Guarded by version (event_store id) like the campanias writers: an older event never wins
     q = text(
-        "INSERT INTO campanias_view (id, id_cliente, estado, updated_at) VALUES (:idc, :idcli, :est, now())"
-        " ON CONFLICT (id) DO UPDATE SET id_cliente = EXCLUDED.id_cliente, estado = EXCLUDED.estado, updated_at = now()"
+        "INSERT INTO campanias_view (id, id_cliente, estado, version, updated_at) VALUES (:idc, :idcli, :est, :ver, now())"
+        " ON CONFLICT (id) DO UPDATE SET id_cliente = COALESCE(EXCLUDED.id_cliente, campanias_view.id_cliente),"
+        " estado = EXCLUDED.estado, version = EXCLUDED.version, updated_at = now()"
+        " WHERE campanias_view.version < EXCLUDED.version"
     )
     with engine.begin() as c:
-        c.execute(q, {"idc": id_campania, "idcli": id_cliente, "est": estado})
+        c.execute(q, {"idc": id_campania, "idcli": id_cliente, "est": estado, "ver": version})
 
 
 def _append_event_direct(aggregate_id, type_, data):
-    db_url = os.getenv('DB_URL') or os.getenv('DATABASE_URL')
+    db_url = database_url()
     if not db_url:
         return
-    db_url_sql = db_url.replace('+psycopg2', '')
-    engine = create_engine(db_url_sql, pool_pre_ping=True)
+    engine = get_engine(db_url)
     insert_q = text(
         "INSERT INTO event_store (aggregate_id, aggregate_type, type, payload, occurred_on) "
         "VALUES (:agg, 'Pago', :type, :payload, now()) RETURNING id"
     )
     with engine.begin() as conn:
-        conn.execute(insert_q, {"agg": aggregate_id, "type": type_, "payload": json.dumps(data)})
+        return conn.execute(insert_q, {"agg": aggregate_id, "type": type_, "payload": json.dumps(data)}).scalar()
 
 
 def despachar_pago_exitoso(payload):
@@ -42,7 +44,8 @@ def despachar_pago_exitoso(payload):
     This keeps the E2E happy-path working while broker issues are resolved.
     """
     try:
-        publish_event('PagoConfirmado.v1', payload)
+        # Async mode returns a Future: wait for the broker ack so a failure reaches the fallback
+        esperar_confirmaciones([publish_event('PagoConfirmado.v1', payload)])
         return
     except Exception as exc:
         # Log the fallback path and perform direct DB writes so tests can continue
@@ -51,11 +54,16 @@ def despachar_pago_exitoso(payload):
     id_campania = payload.get('idCampania')
     id_cliente = payload.get('idCliente')
     if id_campania:
+        version = None
         try:
-            _append_event_direct(id_campania, 'PagoConfirmado.v1', payload)
+            version = _append_event_direct(id_campania, 'PagoConfirmado.v1', payload)
         except Exception as e:
             print(f"[pagos] append_event_direct failed: {e}")
+        if version is None:
+            # Without an event id the version guard cannot order this write; leave the view alone
+            print(f"[pagos] no event_store id for {id_campania}; skipping campanias_view fallback")
+            return
         try:
-            _upsert_campania_view_direct(id_campania, id_cliente, 'APROBADA')
+            _upsert_campania_view_direct(id_campania, id_cliente, 'APROBADA', version)
         except Exception as e:
             print(f"[pagos] upsert_campania_view_direct failed: {e}")
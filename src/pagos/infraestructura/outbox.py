@@ -1,2 +1,44 @@
-def add_to_outbox(event):
-    print(f"Outbox add: {event}")
+"""Outbox de pagos sobre el bus de mensajes compartido.
+
+`add_to_outbox` encola eventos de integración hacia `eventos-pagos-json` y
+`outbox_relay` arranca el relay compartido (ver alpespartners.infra.message_bus),
+que publica cada fila en su tópico con envíos asíncronos, marca las exitosas
+con un solo UPDATE y registra las fallidas una a una con su contador de
+reintentos.
+"""
+import os
+from typing import Callable, List, Optional, Tuple
+
+from alpespartners.infra.message_bus import DbOutboxBus, OutboxWorker
+from alpespartners.infra.message_bus.publicador import PublicadorPulsar
+from alpespartners.infra.message_bus.relay import OUTBOX_RELAY_WORKERS, iniciar_relay
+from alpespartners.infra.message_bus.worker import OUTBOX_BATCH_SIZE
+
+TOPIC_EVENTOS_PAGOS = os.getenv('TOPIC_EVENTOS_PAGOS', 'persistent://public/default/eventos-pagos-json')
+
+
+def add_to_outbox(event_type: str, payload: dict, aggregate_id: str = None, conn=None) -> int:
+    """Encola un evento de integración en el outbox compartido; con `conn` usa la transacción del llamador."""
+    return DbOutboxBus().publish(TOPIC_EVENTOS_PAGOS, payload, aggregate_id=aggregate_id, conn=conn,
+                                 event_type=event_type)
+
+
+def _handler(publicar: Optional[Callable]):
+    if publicar is None:
+        return PublicadorPulsar(TOPIC_EVENTOS_PAGOS)
+    return lambda fila, conn: publicar(fila.event_type, fila.payload)
+
+
+def relay_once(engine, batch_size: int = OUTBOX_BATCH_SIZE, publicar: Callable = None,
+               shards: Optional[List[int]] = None) -> Tuple[int, int]:
+    """Publica un lote del outbox (solo de `shards` si se indican); retorna (enviados, fallidos).
+
+    `publicar(tipo, data)` reemplaza la publicación por tópico de cada fila.
+    """
+    worker = OutboxWorker(_handler(publicar), engine=engine, batch_size=batch_size)
+    return worker.procesar_lote(shards)
+
+
+def outbox_relay(interval_ms: int = 1000, batch_size: int = OUTBOX_BATCH_SIZE, publicar: Callable = None,
+                 workers: int = OUTBOX_RELAY_WORKERS):
+    return iniciar_relay(_handler(publicar), interval_ms=interval_ms, batch_size=batch_size, workers=workers)
@@ -1,10 +1,13 @@
 import os
 import json
+import atexit
 import pulsar
 from threading import Lock
+from alpespartners.seedwork.infraestructura.envio_asincrono import EnvioAsincrono
 
 _pulsar_client = None
 _producer = None
+_envio_async = None
 _lock = Lock()
 
 # Allow overriding broker url and topic via env (compose already sets these)
@@ -15,6 +18,12 @@ TOPIC_EVENTOS_PAGOS = os.getenv('TOPIC_EVENTOS_PAGOS', 'persistent://public/defa
 # Increase from defaults to tolerate broker startup delays in CI/local compose.
 OPERATION_TIMEOUT = int(os.getenv('PULSAR_OPERATION_TIMEOUT', '120'))
 
+# Async mode: publish_event returns a Future instead of waiting for the broker ack. Callers that
+# commit or ack after publishing must wait on it first (seedwork esperar_confirmaciones).
+PUBLISH_ASYNC = os.getenv('PULSAR_PUBLISH_ASYNC', '0') == '1'
+BATCHING_MAX_PUBLISH_DELAY_MS = int(os.getenv('PULSAR_BATCHING_MAX_PUBLISH_DELAY_MS', '10'))
+MAX_IN_FLIGHT = int(os.getenv('PULSAR_MAX_IN_FLIGHT', '1000'))
+
 def get_producer():
     """Lazily create a Pulsar client and producer with a moderate operation timeout.
 
@@ -34,11 +43,58 @@ def get_producer():
             raise RuntimeError(f"Pulsar error during producer creation: {exc}")
     return _producer
 
+def get_async_sender():
+    """Lazily create a batching producer wrapped with a bounded in-flight sender.
+
+    Key-based batching keeps each batch within a single idCampania so Key_Shared
+    consumers still receive every campaign in order.
+    """
+    global _pulsar_client, _envio_async
+    with _lock:
+        try:
+            if _pulsar_client is None:
+                _pulsar_client = pulsar.Client(PULSAR_BROKER_URL, operation_timeout_seconds=OPERATION_TIMEOUT)
+            if _envio_async is None:
+                producer = _pulsar_client.create_producer(
+                    TOPIC_EVENTOS_PAGOS,
+                    batching_enabled=True,
+                    batching_type=pulsar.BatchingType.KeyBased,
+                    batching_max_publish_delay_ms=BATCHING_MAX_PUBLISH_DELAY_MS,
+                    max_pending_messages=MAX_IN_FLIGHT,
+                    block_if_queue_full=True,
+                )
+                _envio_async = EnvioAsincrono(producer, max_en_vuelo=MAX_IN_FLIGHT)
+        except Exception as exc:
+            raise RuntimeError(f"Pulsar error during producer creation: {exc}")
+    return _envio_async
+
+def publish_event_async(type_: str, data: dict, callback=None):
+    """Publish without waiting for the broker; returns a Future resolved with the MessageId."""
+    envelope = {"type": type_, "data": data}
+    partition_key = data.get('idCampania') if isinstance(data, dict) else None
+    opciones = {'partition_key': str(partition_key)} if partition_key else {}
+    return get_async_sender().enviar(json.dumps(envelope).encode('utf-8'), callback, **opciones)
+
+def flush(timeout=None):
+    """Wait until every async publication has been acknowledged (graceful shutdown)."""
+    if _envio_async is not None:
+        return _envio_async.flush(timeout)
+    return True
+
+atexit.register(flush)
+
 def publish_event(type_: str, data: dict):
+    if PUBLISH_ASYNC:
+        return publish_event_async(type_, data)
     envelope = {"type": type_, "data": data}
     try:
         producer = get_producer()
-        producer.send(json.dumps(envelope).encode('utf-8'))
+        # Key by campaign so Key_Shared consumers keep per-campaign ordering
+        partition_key = data.get('idCampania') if isinstance(data, dict) else None
+        if partition_key:
+            producer.send(json.dumps(envelope).encode('utf-8'), partition_key=str(partition_key))
+        else:
+            producer.send(json.dumps(envelope).encode('utf-8'))
     except Exception as exc:
         # Re-raise as RuntimeError with a short message for the Flask handler to return
         raise RuntimeError(f"Pulsar error: {exc}")
@@ -0,0 +1,27 @@
+"""Fixtures compartidas: una base SQLite temporal registrada como DB_URL del proceso"""
+
+import pytest
+from sqlalchemy import text
+
+from alpespartners.config.db import dispose_engines, get_engine
+
+
+@pytest.fixture
+def sqlite_engine(tmp_path, monkeypatch):
+    """Engine compartido (get_engine) sobre un SQLite temporal; cada prueba crea sus tablas."""
+    db_url = f"sqlite:///{tmp_path / 'pruebas.sqlite'}"
+    monkeypatch.setenv('DB_URL', db_url)
+    engine = get_engine(db_url)
+    yield engine
+    dispose_engines()
+
+
+@pytest.fixture
+def campanias_view(sqlite_engine):
+    """Tabla campanias_view como la crean los scripts SQL (no tiene modelo ORM)."""
+    with sqlite_engine.begin() as conn:
+        conn.execute(text(
+            "CREATE TABLE campanias_view (id VARCHAR PRIMARY KEY, id_cliente VARCHAR, estado VARCHAR, "
+            "version BIGINT NOT NULL DEFAULT 0, updated_at TIMESTAMP)"
+        ))
+    return 'campanias_view'
@@ -0,0 +1,94 @@
+"""Pruebas para el archivado de meses fríos del event store en segmentos"""
+
+from datetime import date, datetime
+
+import pytest
+from sqlalchemy import text
+from campanias.infrastructure.repos import EventStoreModel
+from campanias.infrastructure.event_store import append_events, decode_payload, iter_events
+from campanias.infrastructure import archive
+
+
+@pytest.fixture
+def engine(sqlite_engine, tmp_path, monkeypatch):
+    monkeypatch.setattr(archive, 'ARCHIVE_DIR', str(tmp_path / 'segmentos'))
+    EventStoreModel.__table__.create(sqlite_engine)
+    return sqlite_engine
+
+
+def _en_mes(engine, ids, mes):
+    with engine.begin() as conn:
+        for id_ in ids:
+            conn.execute(text("UPDATE event_store SET occurred_on = :t WHERE id = :id"), {"t": mes, "id": id_})
+
+
+def test_archiva_meses_frios_y_la_lectura_es_transparente(engine):
+    # Dados eventos de enero y febrero (fríos) y de junio (caliente)
+    enero = append_events([(f'camp-{i % 3}', 'CampaniaCreada.v1', {'n': i}) for i in range(5)])
+    febrero = append_events([('camp-1', 'CampaniaAprobada.v1', {'n': 5})])
+    junio = append_events([('camp-1', 'CampaniaCancelada.v1', {'n': 6})])
+    _en_mes(engine, enero, datetime(2026, 1, 15))
+    _en_mes(engine, febrero, datetime(2026, 2, 3))
+    _en_mes(engine, junio, datetime(2026, 6, 1))
+
+    # Cuando se archivan los meses fuera de los 3 más recientes, con bloques pequeños
+    archivados = archive.archive_cold_months(engine, archive.SegmentArchive(archive.ARCHIVE_DIR),
+                                             hot_months=3, today=date(2026, 6, 20))
+
+    # Entonces la tabla caliente solo conserva junio y las lecturas cruzan ambos niveles
+    assert archivados == {'2026-01': 5, '2026-02': 1, '2026-03': 0}
+    with engine.connect() as conn:
+        assert conn.execute(text("SELECT COUNT(*) FROM event_store")).scalar() == 1
+    eventos = list(iter_events())
+    assert [e.id for e in eventos] == enero + febrero + junio
+    assert [decode_payload(e.payload)['n'] for e in eventos] == list(range(7))
+    assert [e.id for e in iter_events(from_position=enero[2])] == enero[3:] + febrero + junio
+    frio = archive.get_archive()
+    assert [r[0] for r in frio.events_of('camp-1')] == [enero[1], enero[4], febrero[0]]
+    assert frio.horizon() == febrero[0]
+
+
+def test_segmento_es_inmutable_y_se_busca_por_agregado(tmp_path):
+    # Dado un segmento escrito en bloques de 2 eventos
+    segmentos = archive.SegmentArchive(str(tmp_path))
+    filas = [(i, f'camp-{i % 2}', 'CampaniaCreada.v1', {'n': i}, datetime(2026, 1, 1)) for i in range(1, 6)]
+    indice = segmentos.write_segment(date(2026, 1, 1), iter(filas), block_events=2)
+
+    # Cuando se busca un agregado
+    eventos = list(segmentos.events_of('camp-0', after=2))
+
+    # Entonces solo se leen sus bloques y no se puede reescribir el segmento
+    assert len(indice['blocks']) == 3
+    assert indice['aggregates']['camp-0'] == [0, 1]
+    assert [(r[0], r[3]['n']) for r in eventos] == [(4, 4)]
+    with pytest.raises(FileExistsError):
+        segmentos.write_segment(date(2026, 1, 1), iter(filas))
+
+
+def test_sin_tabla_particionada_no_crea_particiones(engine):
+    # Dado un event_store simple (create_all), como en SQLite o campanias_db
+    # Cuando se aseguran las particiones de los próximos meses
+    particiones = archive.ensure_partitions(engine, months_ahead=2)
+
+    # Entonces no se intenta crear ninguna
+    assert particiones == []
+
+
+def test_evento_caliente_con_id_bajo_el_horizonte_no_se_pierde(engine):
+    # Dado un evento de id bajo confirmado tarde en un mes que sigue caliente
+    enero, tarde, febrero, junio = append_events([
+        (f'camp-{n}', 'CampaniaCreada.v1', {'n': n}) for n in range(4)
+    ])
+    _en_mes(engine, [enero], datetime(2026, 1, 15))
+    _en_mes(engine, [tarde, junio], datetime(2026, 6, 1))
+    _en_mes(engine, [febrero], datetime(2026, 2, 3))
+
+    # Cuando se archivan enero y febrero, dejando el horizonte por encima de ese id
+    archive.archive_cold_months(engine, archive.SegmentArchive(archive.ARCHIVE_DIR),
+                                hot_months=3, today=date(2026, 6, 20))
+    assert archive.get_archive().horizon() == febrero
+
+    # Entonces las lecturas lo incluyen en orden de id
+    assert [e.id for e in iter_events()] == [enero, tarde, febrero, junio]
+    assert [e.id for e in iter_events(until=febrero)] == [enero, tarde, febrero]
+    assert [e.id for e in iter_events(from_position=enero)] == [tarde, febrero, junio]
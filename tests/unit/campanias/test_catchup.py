@@ -0,0 +1,91 @@
+"""Pruebas para la suscripción catch-up sobre la posición global del event store"""
+
+import logging
+from datetime import datetime, timedelta
+
+import pytest
+from sqlalchemy import text
+from campanias.infrastructure.repos import EventStoreModel, ProjectionCheckpointModel
+from campanias.infrastructure.event_store import append_events
+from campanias.infrastructure import catchup
+
+
+@pytest.fixture
+def engine(sqlite_engine, campanias_view):
+    EventStoreModel.__table__.create(sqlite_engine)
+    ProjectionCheckpointModel.__table__.create(sqlite_engine)
+    return sqlite_engine
+
+
+def _vista(engine):
+    with engine.connect() as conn:
+        return {r[0]: (r[1], r[2]) for r in conn.execute(text("SELECT id, id_cliente, estado FROM campanias_view"))}
+
+
+def test_proyecta_en_lotes_y_retoma_desde_el_checkpoint(engine):
+    # Dadas 5 campanias creadas y una suscripción con lotes de 2
+    append_events([(f'camp-{i}', 'CampaniaCreada.v1', {'idCliente': f'cli-{i}'}) for i in range(5)])
+    suscripcion = catchup.CatchUpSubscription('campanias_view', catchup.project_campanias_view,
+                                              batch_size=2, engine=engine)
+
+    # Cuando se pone al día y luego llegan eventos nuevos
+    assert [suscripcion.run_once() for _ in range(4)] == [2, 2, 1, 0]
+    append_events([('camp-0', 'CampaniaAprobada.v1', {'idCampania': 'camp-0'})])
+    reanudada = catchup.campanias_view_subscription(engine=engine)
+
+    # Entonces una nueva instancia solo aplica la cola posterior al checkpoint persistido
+    assert reanudada.position() == 5
+    assert reanudada.run_once() == 1
+    assert reanudada.position() == 6
+    vista = _vista(engine)
+    assert vista['camp-0'] == ('cli-0', 'APROBADA')
+    assert vista['camp-4'] == ('cli-4', 'PENDIENTE')
+
+
+def test_se_detiene_ante_un_hueco_reciente_y_lo_salta_al_vencer(engine, caplog):
+    # Dado un hueco en los ids (id 2 aún sin confirmar o revertido)
+    append_events([('camp-a', 'CampaniaCreada.v1', {'idCliente': 'cli-a'})])
+    with engine.begin() as conn:
+        conn.execute(
+            text("INSERT INTO event_store (id, aggregate_id, type, payload, occurred_on) "
+                 "VALUES (3, 'camp-b', 'CampaniaCreada.v1', '{\"idCliente\": \"cli-b\"}', :ahora)"),
+            {"ahora": datetime.utcnow()}
+        )
+    suscripcion = catchup.campanias_view_subscription(engine=engine)
+
+    # Cuando el evento posterior al hueco es reciente
+    assert suscripcion.run_once() == 1
+    assert suscripcion.run_once() == 0
+    assert 'camp-b' not in _vista(engine)
+
+    # Entonces, pasada la espera, el hueco se considera revertido, se registra y se continúa
+    with engine.begin() as conn:
+        conn.execute(text("UPDATE event_store SET occurred_on = :antes WHERE id = 3"),
+                     {"antes": datetime.utcnow() - timedelta(milliseconds=catchup.CATCHUP_GAP_WAIT_MS + 1000)})
+    with caplog.at_level(logging.WARNING):
+        assert suscripcion.run_once() == 1
+    assert _vista(engine)['camp-b'] == ('cli-b', 'PENDIENTE')
+    assert 'skipping ids 2..2' in caplog.text
+
+
+def test_en_postgres_salta_el_hueco_solo_cuando_xmin_supera_el_xmax_observado(engine):
+    # Dado un hueco en los ids y una suscripción que ve snapshots de Postgres
+    append_events([('camp-a', 'CampaniaCreada.v1', {'idCliente': 'cli-a'})])
+    with engine.begin() as conn:
+        conn.execute(
+            text("INSERT INTO event_store (id, aggregate_id, type, payload, occurred_on) "
+                 "VALUES (3, 'camp-b', 'CampaniaCreada.v1', '{\"idCliente\": \"cli-b\"}', :antes)"),
+            {"antes": datetime.utcnow() - timedelta(days=1)}
+        )
+    suscripcion = catchup.campanias_view_subscription(engine=engine)
+    snapshots = iter([(100, 105), (104, 110), (105, 110)])
+    suscripcion.gaps._xids = lambda conn: next(snapshots)
+
+    # Cuando aún puede haber transacciones abiertas desde que se vio el hueco
+    assert suscripcion.run_once() == 1
+    assert suscripcion.run_once() == 0
+    assert 'camp-b' not in _vista(engine)
+
+    # Entonces se salta en cuanto terminaron todas, sin importar la antigüedad del evento
+    assert suscripcion.run_once() == 1
+    assert _vista(engine)['camp-b'] == ('cli-b', 'PENDIENTE')
@@ -0,0 +1,249 @@
+"""Pruebas para el procesamiento en lotes del consumidor de eventos de pagos"""
+
+import json
+import pytest
+from sqlalchemy import text
+from alpespartners.config.db import ProcessedEvent
+from campanias.infrastructure.repos import CampaniaSnapshotModel, EventStoreModel, campanias_view_cache, upsert_campanias_view
+from campanias.infrastructure import consumidores
+from campanias.infrastructure.event_store import append_events
+
+
+class MensajeFalso:
+    def __init__(self, payload, n):
+        self._raw = json.dumps(payload).encode('utf-8')
+        self._id = n
+
+    def data(self):
+        return self._raw
+
+    def message_id(self):
+        n = self._id
+
+        class _Id:
+            def serialize(self):
+                return n.to_bytes(4, 'big')
+        return _Id()
+
+
+def pago(tipo, id_campania, event_id):
+    return {"type": tipo, "event_id": event_id, "data": {"idCampania": id_campania, "idCliente": "cli-1"}}
+
+
+@pytest.fixture
+def engine(sqlite_engine, campanias_view, monkeypatch):
+    monkeypatch.setattr(consumidores, '_idempotency_cache', None)
+    EventStoreModel.__table__.create(sqlite_engine)
+    CampaniaSnapshotModel.__table__.create(sqlite_engine)
+    ProcessedEvent.__table__.create(sqlite_engine)
+    return sqlite_engine
+
+
+@pytest.fixture
+def publicados(monkeypatch):
+    enviados = []
+    monkeypatch.setattr(consumidores, 'publish_event', lambda tipo, data: enviados.append((tipo, data['idCampania'])))
+    return enviados
+
+
+def test_procesar_lote_escribe_eventos_vista_y_marca_procesados(engine, publicados):
+    # Dado un lote con un evento duplicado dentro del mismo lote
+    mensajes = [
+        MensajeFalso(pago("PagoConfirmado.v1", "camp-1", "e1"), 1),
+        MensajeFalso(pago("PagoRevertido.v1", "camp-2", "e2"), 2),
+        MensajeFalso(pago("PagoConfirmado.v1", "camp-1", "e1"), 3),
+    ]
+
+    # Cuando se procesa el lote
+    nuevos = consumidores.procesar_lote(engine, mensajes)
+
+    # Entonces cada evento se aplica una sola vez
+    assert nuevos == 2
+    assert publicados == [("CampaniaAprobada.v1", "camp-1"), ("CampaniaCancelada.v1", "camp-2")]
+    with engine.connect() as conn:
+        estados = dict(conn.execute(text("SELECT id, estado FROM campanias_view")).fetchall())
+        assert estados == {"camp-1": "APROBADA", "camp-2": "CANCELADA"}
+        assert conn.execute(text("SELECT count(*) FROM event_store")).scalar() == 2
+        assert conn.execute(text("SELECT count(*) FROM processed_events")).scalar() == 2
+
+
+def test_procesar_lote_actualiza_el_snapshot_en_la_misma_transaccion(engine, publicados):
+    # Dada una campania creada en el event store
+    append_events([("camp-1", "CampaniaCreada.v1", {"idCliente": "cli-1", "itinerario": []})])
+
+    # Cuando se procesa la confirmación de su pago
+    consumidores.procesar_lote(engine, [MensajeFalso(pago("PagoConfirmado.v1", "camp-1", "e1"), 1)])
+
+    # Entonces el snapshot queda al día con el nuevo estado, sin esperar a una lectura
+    with engine.connect() as conn:
+        version, estado = conn.execute(text("SELECT version, state FROM campania_snapshots")).one()
+        assert version == conn.execute(text("SELECT max(id) FROM event_store")).scalar()
+    assert json.loads(estado)["estado"] == "APROBADA"
+
+
+def test_procesar_lote_ignora_eventos_ya_procesados(engine, publicados):
+    # Dado un lote ya procesado
+    mensajes = [MensajeFalso(pago("PagoConfirmado.v1", "camp-1", "e1"), 1)]
+    consumidores.procesar_lote(engine, mensajes)
+
+    # Cuando se recibe de nuevo (redelivery)
+    nuevos = consumidores.procesar_lote(engine, mensajes)
+
+    # Entonces no se vuelve a escribir ni publicar
+    assert nuevos == 0
+    assert len(publicados) == 1
+    with engine.connect() as conn:
+        assert conn.execute(text("SELECT count(*) FROM event_store")).scalar() == 1
+
+
+def test_procesar_mensaje_responde_duplicados_sin_consultar_la_base(engine, publicados, monkeypatch):
+    # Dado un consumidor con la caché ya calentada
+    consultas = []
+    original = consumidores._is_event_processed_raw
+    monkeypatch.setattr(consumidores, '_is_event_processed_raw',
+                        lambda *a: consultas.append(a[1:]) or original(*a))
+    consumidores.procesar_mensaje(engine, MensajeFalso(pago("PagoConfirmado.v1", "camp-1", "e1"), 1))
+
+    # Cuando llega la redelivery y un evento que otra réplica procesó después del calentamiento
+    with engine.begin() as conn:
+        conn.execute(text("INSERT INTO processed_events (aggregate_id, event_type, event_id) VALUES ('camp-9', 'PagoConfirmado.v1', 'e9')"))
+    consumidores.procesar_mensaje(engine, MensajeFalso(pago("PagoConfirmado.v1", "camp-1", "e1"), 2))
+    consumidores.procesar_mensaje(engine, MensajeFalso(pago("PagoConfirmado.v1", "camp-9", "e9"), 3))
+
+    # Entonces no hay consultas previas y la inserción con ON CONFLICT descarta el duplicado
+    assert consultas == []
+    assert publicados == [("CampaniaAprobada.v1", "camp-1")]
+    with engine.connect() as conn:
+        assert conn.execute(text("SELECT count(*) FROM event_store")).scalar() == 1
+        assert conn.execute(text("SELECT count(*) FROM processed_events")).scalar() == 2
+
+
+def test_el_reclamo_detecta_redeliveries_de_dias_anteriores(engine):
+    # Dado un evento marcado en el bucket de ayer (la unicidad incluye el bucket)
+    with engine.begin() as conn:
+        conn.execute(text("INSERT INTO processed_events (aggregate_id, event_type, event_id, bucket) "
+                          "VALUES ('camp-1', 'PagoConfirmado.v1', 'e1', '2000-01-01')"))
+
+    # Cuando se reclama de nuevo hoy, individualmente y en lote
+    with engine.begin() as conn:
+        individual = conn.execute(text(consumidores.SQL_CLAIM_PROCESSED),
+                                  {"agg": "camp-1", "et": "PagoConfirmado.v1", "eid": "e1"}).first()
+        en_lote = consumidores._claim_batch(conn, [("camp-1", "PagoConfirmado.v1", "e1"),
+                                                   ("camp-2", "PagoConfirmado.v1", "e2")])
+
+    # Entonces solo se reclama el evento nuevo
+    assert individual is None
+    assert en_lote == {("camp-2", "PagoConfirmado.v1", "e2")}
+
+
+def test_procesar_lote_no_reaplica_un_evento_que_el_bloom_no_conoce(engine, publicados, monkeypatch):
+    # Dado un evento que otra réplica ya procesó y que la caché da por nunca visto
+    with engine.begin() as conn:
+        conn.execute(text("INSERT INTO processed_events (aggregate_id, event_type, event_id) "
+                          "VALUES ('camp-1', 'PagoConfirmado.v1', 'e1')"))
+    cache = consumidores.idempotency_cache(engine)
+    monkeypatch.setattr(cache, 'visto', lambda clave: False)
+
+    # Cuando llega en un lote
+    nuevos = consumidores.procesar_lote(engine, [MensajeFalso(pago("PagoConfirmado.v1", "camp-1", "e1"), 1)])
+
+    # Entonces el reclamo en processed_events lo descarta
+    assert nuevos == 0
+    assert publicados == []
+    with engine.connect() as conn:
+        assert conn.execute(text("SELECT count(*) FROM event_store")).scalar() == 0
+
+
+def test_en_postgres_el_reclamo_bloquea_cada_event_id_antes_del_not_exists():
+    # Dada una conexión Postgres que registra las sentencias
+    class _Dialecto:
+        name = 'postgresql'
+
+    class _Conexion:
+        dialect = _Dialecto()
+
+        def __init__(self):
+            self.sentencias = []
+
+        def execute(self, q, params=None):
+            self.sentencias.append((str(q), params))
+            return []
+
+    conn = _Conexion()
+
+    # Cuando se reclama un lote con ids repetidos
+    consumidores._claim_batch(conn, [("camp-2", "PagoConfirmado.v1", "e2"), ("camp-1", "PagoConfirmado.v1", "e1"),
+                                     ("camp-1", "PagoRevertido.v1", "e1")])
+
+    # Entonces primero toma un advisory lock por event_id y luego inserta
+    assert conn.sentencias[0] == (consumidores.SQL_LOCK_EVENT_IDS, {"eids": ["e1", "e2"]})
+    assert conn.sentencias[1][0].startswith("INSERT INTO processed_events")
+
+
+def test_procesar_lote_coalesce_la_vista_por_campania(engine, publicados):
+    # Dado un lote con dos eventos de la misma campania
+    mensajes = [
+        MensajeFalso(pago("PagoConfirmado.v1", "camp-1", "e1"), 1),
+        MensajeFalso(pago("PagoRevertido.v1", "camp-1", "e2"), 2),
+    ]
+
+    # Cuando se procesa el lote
+    consumidores.procesar_lote(engine, mensajes)
+
+    # Entonces ambos eventos quedan en el event store y la vista conserva el último estado
+    with engine.connect() as conn:
+        assert conn.execute(text("SELECT count(*) FROM event_store")).scalar() == 2
+        assert conn.execute(text("SELECT estado FROM campanias_view WHERE id = 'camp-1'")).scalar() == "CANCELADA"
+
+
+def test_la_vista_no_retrocede_ante_una_version_anterior(engine):
+    # Dada una vista ya proyectada hasta la versión 5
+    with engine.begin() as conn:
+        upsert_campanias_view(conn, [{"idc": "camp-1", "idcli": "cli-1", "est": "CANCELADA", "ver": 5}])
+
+    # Cuando un escritor atrasado aplica una versión anterior y otro una posterior sin cliente
+    with engine.begin() as conn:
+        upsert_campanias_view(conn, [{"idc": "camp-1", "idcli": "cli-1", "est": "APROBADA", "ver": 3}])
+    with engine.begin() as conn:
+        fila_intermedia = conn.execute(text("SELECT estado, version FROM campanias_view")).one()
+        upsert_campanias_view(conn, [{"idc": "camp-1", "idcli": None, "est": "APROBADA", "ver": 7}])
+
+    # Entonces la versión anterior se descarta y la posterior avanza conservando el cliente
+    assert tuple(fila_intermedia) == ("CANCELADA", 5)
+    with engine.connect() as conn:
+        assert tuple(conn.execute(text("SELECT id_cliente, estado, version FROM campanias_view")).one()) == ("cli-1", "APROBADA", 7)
+
+
+def test_el_consumidor_invalida_la_cache_de_la_vista(engine, publicados):
+    # Dada una campania leída y cacheada como PENDIENTE
+    campanias_view_cache.limpiar()
+    campanias_view_cache.obtener("camp-1", lambda: {"id": "camp-1", "estado": "PENDIENTE"})
+
+    # Cuando el consumidor aplica un pago confirmado
+    consumidores.procesar_mensaje(engine, MensajeFalso(pago("PagoConfirmado.v1", "camp-1", "e1"), 1))
+
+    # Entonces la siguiente lectura va a la base y ve el nuevo estado
+    def leer():
+        with engine.connect() as conn:
+            return {"estado": conn.execute(text("SELECT estado FROM campanias_view")).scalar()}
+    assert campanias_view_cache.obtener("camp-1", leer) == {"estado": "APROBADA"}
+
+
+def test_un_envio_asincrono_fallido_revierte_el_procesamiento(engine, monkeypatch):
+    # Dado un publicador asíncrono cuyo envío falla después de retornar el Future
+    from concurrent.futures import Future
+
+    def publicar_async(tipo, data):
+        futuro = Future()
+        futuro.set_exception(RuntimeError('Pulsar error: Timeout'))
+        return futuro
+    monkeypatch.setattr(consumidores, 'publish_event', publicar_async)
+
+    # Cuando se procesa el mensaje
+    with pytest.raises(RuntimeError):
+        consumidores.procesar_mensaje(engine, MensajeFalso(pago("PagoConfirmado.v1", "camp-1", "e1"), 1))
+
+    # Entonces no queda nada confirmado y la reentrega volverá a publicar
+    with engine.connect() as conn:
+        assert conn.execute(text("SELECT count(*) FROM processed_events")).scalar() == 0
+        assert conn.execute(text("SELECT count(*) FROM event_store")).scalar() == 0
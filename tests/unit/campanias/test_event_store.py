@@ -0,0 +1,89 @@
+"""Pruebas para el event store de campanias sobre SQLite"""
+
+import json
+import pytest
+from sqlalchemy import text
+from campanias.infrastructure.repos import EventStoreModel
+from campanias.infrastructure.event_store import (
+    append_event, append_events, decode_payload, find_events, iter_events, StoredEvent,
+)
+
+
+@pytest.fixture
+def engine(sqlite_engine):
+    EventStoreModel.__table__.create(sqlite_engine)
+    return sqlite_engine
+
+
+def test_append_events_retorna_ids_en_orden(engine):
+    # Dado un lote de eventos de varias campanias
+    lote = [('camp-1', 'CampaniaCreada.v1', {'n': 1}),
+            ('camp-2', 'CampaniaCreada.v1', {'n': 2}),
+            ('camp-1', 'CampaniaAprobada.v1', {'n': 3})]
+
+    # Cuando se agregan en un solo llamado
+    ids = append_events(lote)
+
+    # Entonces los ids corresponden, en orden, a cada evento del lote
+    assert len(ids) == 3
+    with engine.connect() as conn:
+        filas = {r[0]: json.loads(r[1])['n'] for r in conn.execute(text('SELECT id, payload FROM event_store'))}
+    assert [filas[i] for i in ids] == [1, 2, 3]
+
+
+def test_append_events_vacio_no_escribe(engine):
+    assert append_events([]) == []
+
+
+def test_append_event_usa_la_misma_ruta(engine):
+    # Dado un evento individual
+    resultado = append_event('camp-9', 'CampaniaCreada.v1', {'idCampania': 'camp-9'})
+
+    # Entonces se persiste y retorna su id
+    assert resultado['id'] is not None
+    assert resultado['aggregate_id'] == 'camp-9'
+
+
+def test_iter_events_recorre_desde_una_posicion_filtrando_tipos(engine):
+    # Dado un event store con varios tipos de eventos
+    ids = append_events([('camp-%d' % i, 'CampaniaCreada.v1' if i % 2 else 'PagoConfirmado.v1', {'n': i})
+                         for i in range(10)])
+
+    # Cuando se recorre desde la tercera posición solo CampaniaCreada en lotes pequeños
+    eventos = list(iter_events(from_position=ids[2], types=['CampaniaCreada.v1'], batch_size=2))
+
+    # Entonces se obtienen tuplas livianas en orden de id
+    assert all(isinstance(e, StoredEvent) for e in eventos)
+    assert [json.loads(e.payload)['n'] for e in eventos] == [3, 5, 7, 9]
+    assert [e.id for e in eventos] == sorted(e.id for e in eventos)
+
+
+def test_find_events_filtra_por_tipo_y_campos_del_payload(engine):
+    # Dados eventos de dos clientes
+    append_events([('camp-1', 'CampaniaCreada.v1', {'idCliente': 'cli-1', 'monto': 10}),
+                   ('camp-2', 'CampaniaCreada.v1', {'idCliente': 'cli-2', 'monto': 10}),
+                   ('camp-1', 'CampaniaAprobada.v1', {'idCliente': 'cli-1'})])
+
+    # Cuando se buscan por tipo y por campos del payload
+    creadas = find_events(type='CampaniaCreada.v1', where={'idCliente': 'cli-1'})
+    del_cliente = find_events(where={'idCliente': 'cli-1'})
+
+    # Entonces solo vuelven las coincidencias, de la más reciente a la más antigua
+    assert [(e.aggregate_id, decode_payload(e.payload)['monto']) for e in creadas] == [('camp-1', 10)]
+    assert [e.type for e in del_cliente] == ['CampaniaAprobada.v1', 'CampaniaCreada.v1']
+    assert len(find_events(where={'monto': 10})) == 2
+    with pytest.raises(ValueError):
+        find_events(where={"x') OR 1=1 --": 1})
+
+
+def test_payload_es_jsonb_en_postgres():
+    from sqlalchemy.dialects import postgresql
+    from sqlalchemy.schema import CreateTable
+    from campanias.infrastructure.event_store import _payload_filter
+
+    ddl = str(CreateTable(EventStoreModel.__table__).compile(dialect=postgresql.dialect()))
+    sql = [str(c) for c in _payload_filter('postgresql', {'idCliente': 'cli-1', 'monto': 10})]
+
+    assert 'payload JSONB' in ddl
+    assert sql == ["(event_store.payload ->> 'idCliente') = :w_idCliente",
+                   'event_store.payload @> CAST(:w_contains AS jsonb)']
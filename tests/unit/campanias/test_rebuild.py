@@ -0,0 +1,105 @@
+"""Pruebas para la reconstrucción de campanias_view desde el event store"""
+
+from datetime import datetime
+
+import pytest
+from sqlalchemy import text
+from alpespartners.config.db import get_engine
+from campanias.infrastructure.repos import EventStoreModel, ProjectionCheckpointModel
+from campanias.infrastructure.event_store import append_events
+from campanias.infrastructure import rebuild
+
+
+@pytest.fixture
+def db_url(sqlite_engine, campanias_view):
+    EventStoreModel.__table__.create(sqlite_engine)
+    ProjectionCheckpointModel.__table__.create(sqlite_engine)
+    with sqlite_engine.begin() as conn:
+        # proyección desactualizada por un bug
+        conn.execute(text("INSERT INTO campanias_view (id, id_cliente, estado) VALUES ('camp-0', 'cli-x', 'PENDIENTE')"))
+    return sqlite_engine.url.render_as_string(hide_password=False)
+
+
+def _vista(db_url):
+    with get_engine(db_url).connect() as conn:
+        return {r[0]: (r[1], r[2]) for r in conn.execute(text("SELECT id, id_cliente, estado FROM campanias_view"))}
+
+
+def _historia(n):
+    eventos = []
+    for i in range(n):
+        eventos.append((f'camp-{i}', 'CampaniaCreada.v1', {'idCliente': f'cli-{i}'}))
+    for i in range(0, n, 2):
+        eventos.append((f'camp-{i}', 'CampaniaAprobada.v1', {'idCampania': f'camp-{i}'}))
+    eventos.append(('camp-1', 'CampaniaCancelada.v1', {'idCampania': 'camp-1'}))
+    return eventos
+
+
+def test_rebuild_reemplaza_la_vista_con_la_proyeccion_del_event_store(db_url):
+    # Dada una historia de 20 campanias y una vista desactualizada
+    append_events(_historia(20))
+
+    # Cuando se reconstruye en 4 particiones repartidas en 2 procesos, con lotes pequeños
+    resultado = rebuild.rebuild_campanias_view(db_url, partitions=4, workers=2, chunk_size=3)
+
+    # Entonces la vista refleja exactamente el event store
+    vista = _vista(db_url)
+    assert resultado['events'] == 31
+    assert len(vista) == 20
+    assert vista['camp-0'] == ('cli-0', 'APROBADA')
+    assert vista['camp-1'] == ('cli-1', 'CANCELADA')
+    assert vista['camp-3'] == ('cli-3', 'PENDIENTE')
+
+
+def test_rebuild_reanuda_desde_los_checkpoints(db_url):
+    # Dada una reconstrucción interrumpida tras procesar una partición
+    append_events(_historia(10))
+    with get_engine(db_url).begin() as conn:
+        rebuild.create_shadow(conn)
+    rebuild.rebuild_partition(db_url, 0, 2, chunk_size=2)
+
+    # Cuando se vuelve a ejecutar con las mismas particiones
+    resultado = rebuild.rebuild_campanias_view(db_url, partitions=2, workers=1)
+
+    # Entonces solo se reproduce lo pendiente y la vista queda completa
+    assert 0 < resultado['events'] < 16
+    assert len(_vista(db_url)) == 10
+    with get_engine(db_url).connect() as conn:
+        assert conn.execute(text("SELECT COUNT(*) FROM projection_checkpoints")).scalar() == 0
+
+
+def test_la_sombra_copia_el_esquema_actual_de_la_vista(db_url):
+    # Dada una vista con una columna añadida después de los scripts originales
+    append_events(_historia(2))
+    with get_engine(db_url).begin() as conn:
+        conn.execute(text("ALTER TABLE campanias_view ADD COLUMN notas VARCHAR DEFAULT 'sin notas'"))
+
+    # Cuando se reconstruye
+    rebuild.rebuild_campanias_view(db_url, partitions=2, workers=1)
+
+    # Entonces la vista reconstruida conserva la columna y su valor por defecto
+    with get_engine(db_url).connect() as conn:
+        assert conn.execute(text("SELECT notas FROM campanias_view WHERE id = 'camp-1'")).scalar() == 'sin notas'
+
+
+def test_rebuild_no_avanza_mas_alla_de_un_hueco_abierto(db_url, monkeypatch):
+    # Dado un hueco reciente en los ids (id 2 aún sin confirmar) y la suscripción viva ya en el id 3
+    append_events([('camp-a', 'CampaniaCreada.v1', {'idCliente': 'cli-a'})])
+    with get_engine(db_url).begin() as conn:
+        conn.execute(
+            text("INSERT INTO event_store (id, aggregate_id, type, payload, occurred_on) "
+                 "VALUES (3, 'camp-b', 'CampaniaCreada.v1', '{\"idCliente\": \"cli-b\"}', :ahora)"),
+            {"ahora": datetime.utcnow()}
+        )
+        conn.execute(text("INSERT INTO projection_checkpoints (name, position) VALUES ('campanias_view', 3)"))
+    monkeypatch.setattr(rebuild, 'REBUILD_GAP_WAIT_MS', 0)
+
+    # Cuando se reconstruye
+    resultado = rebuild.rebuild_campanias_view(db_url, partitions=2, workers=1)
+
+    # Entonces las particiones se detienen antes del hueco, la cola se aplica en el swap
+    # y la suscripción viva retrocede para volver a aplicar lo posterior al hueco
+    assert resultado['caught_up'] == 1
+    assert set(_vista(db_url)) == {'camp-a', 'camp-b'}
+    with get_engine(db_url).connect() as conn:
+        assert conn.execute(text("SELECT position FROM projection_checkpoints")).scalar() == 1
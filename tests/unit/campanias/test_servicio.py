@@ -0,0 +1,152 @@
+"""Pruebas para el comando de creación de campanias"""
+
+import json
+import pytest
+import pulsar
+from sqlalchemy import text
+from alpespartners.infra.message_bus.db_outbox import DbOutboxBus, metadata as outbox_metadata
+from alpespartners.infra.message_bus.publicador import PublicadorPulsar
+from alpespartners.infra.message_bus.worker import OutboxWorker
+from campanias.infrastructure.repos import CampaniaSnapshotModel, EventStoreModel
+from campanias.infrastructure.event_store import append_events
+from campanias.application import servicio
+
+CAMPANIA = {"idCampania": "camp-1", "idCliente": "cli-1", "itinerario": ["vuelo1"]}
+
+
+@pytest.fixture
+def engine(sqlite_engine, campanias_view):
+    EventStoreModel.__table__.create(sqlite_engine)
+    CampaniaSnapshotModel.__table__.create(sqlite_engine)
+    outbox_metadata.create_all(sqlite_engine)
+    return sqlite_engine
+
+
+def _contar(engine, tabla):
+    with engine.connect() as conn:
+        return conn.execute(text(f"SELECT COUNT(*) FROM {tabla}")).scalar()
+
+
+def test_crear_campania_escribe_evento_vista_y_outbox_juntos(engine):
+    # Dada una campania válida
+    # Cuando se ejecuta el comando de creación
+    resultado = servicio.crear_campania_cmd(dict(CAMPANIA))
+
+    # Entonces el evento, la proyección y el mensaje del outbox quedan persistidos
+    assert resultado == {'status': 'accepted', 'idCampania': 'camp-1'}
+    with engine.connect() as conn:
+        vista = conn.execute(text("SELECT estado FROM campanias_view WHERE id = 'camp-1'")).scalar()
+        outbox = conn.execute(text("SELECT event_type, aggregate_id, status FROM outbox")).fetchone()
+    assert _contar(engine, 'event_store') == 1
+    assert vista == 'PENDIENTE'
+    assert tuple(outbox) == ('CampaniaCreada.v1', 'camp-1', 'PENDING')
+    assert _contar(engine, 'campania_snapshots') == 1
+
+
+def test_crear_campania_no_deja_escrituras_parciales(engine, monkeypatch):
+    # Dado un outbox que falla al escribir
+    def publish_fallido(self, *args, **kwargs):
+        raise RuntimeError('outbox no disponible')
+    monkeypatch.setattr(DbOutboxBus, 'publish', publish_fallido)
+
+    # Cuando se ejecuta el comando de creación
+    with pytest.raises(RuntimeError):
+        servicio.crear_campania_cmd(dict(CAMPANIA))
+
+    # Entonces ni el evento ni la proyección quedan persistidos
+    assert _contar(engine, 'event_store') == 0
+    assert _contar(engine, 'campanias_view') == 0
+
+
+class _ProductorFalso:
+    """Confirma cada envío en cuanto se encola, como un broker disponible."""
+
+    def __init__(self, topico):
+        self.topico = topico
+        self.enviados = []
+
+    def send_async(self, contenido, callback, **opciones):
+        self.enviados.append((json.loads(contenido), opciones))
+        callback(pulsar.Result.Ok, f'msg-{len(self.enviados)}')
+
+
+class _PoolFalso:
+    def __init__(self):
+        self.productores = {}
+
+    def cliente(self):
+        return self
+
+    def create_producer(self, topico, **opciones):
+        return self.productores.setdefault(topico, _ProductorFalso(topico))
+
+
+def test_crear_campania_llega_a_pulsar_a_traves_del_relay(engine):
+    # Dada una campania creada por el comando (solo escribe en el outbox)
+    servicio.crear_campania_cmd(dict(CAMPANIA))
+    pool = _PoolFalso()
+
+    # Cuando el relay procesa el outbox con el publicador de Pulsar
+    enviados = OutboxWorker(PublicadorPulsar(pool=pool), engine=engine).run_once()
+
+    # Entonces CampaniaCreada se publica con la campania como clave y la fila queda SENT
+    assert enviados == 1
+    productor = pool.productores[servicio.TOPIC_OUTBOX_CAMPANIAS]
+    [(sobre, opciones)] = productor.enviados
+    assert sobre['type'] == 'CampaniaCreada.v1'
+    assert sobre['data']['idCampania'] == 'camp-1'
+    assert opciones == {'partition_key': 'camp-1'}
+    with engine.connect() as conn:
+        assert conn.execute(text("SELECT status FROM outbox")).scalar() == 'SENT'
+
+
+class _VistaVacia:
+    def __init__(self, session):
+        pass
+
+    def get(self, id_campania):
+        return None
+
+
+def test_obtener_campania_rehidrata_desde_eventos_si_la_vista_no_la_tiene(engine, monkeypatch):
+    # Dada una campania aprobada en el event store que la vista aún no refleja
+    append_events([
+        ('camp-2', 'CampaniaCreada.v1', {'idCliente': 'cli-2', 'itinerario': ['vuelo2']}),
+        ('camp-2', 'CampaniaAprobada.v1', {'idCampania': 'camp-2'}),
+    ])
+    monkeypatch.setattr(servicio, 'CampaniaViewRepo', _VistaVacia)
+
+    # Cuando se consulta la campania
+    resultado = servicio.obtener_campania_qry('camp-2')
+
+    # Entonces se responde con el estado rehidratado desde los eventos, sin escribir un snapshot
+    assert resultado == {'id': 'camp-2', 'idCliente': 'cli-2', 'estado': 'APROBADA'}
+    assert _contar(engine, 'campania_snapshots') == 0
+
+
+def test_obtener_campania_sin_eventos_responde_none(engine, monkeypatch):
+    # Dada una campania que no existe ni en la vista ni en el event store
+    monkeypatch.setattr(servicio, 'CampaniaViewRepo', _VistaVacia)
+
+    # Cuando se consulta
+    # Entonces no se encuentra y no se escribe nada
+    assert servicio.obtener_campania_qry('camp-x') is None
+    assert _contar(engine, 'campania_snapshots') == 0
+
+
+@pytest.mark.parametrize('limite', ['0', '-3'])
+def test_listar_por_cliente_rechaza_limites_no_positivos(limite):
+    # Dada la API de campanias
+    from flask import Flask
+    from campanias.application.api import bp
+    app = Flask(__name__)
+    app.register_blueprint(bp)
+
+    # Cuando se pide un listado con un límite no positivo
+    respuesta = app.test_client().get(f'/campanias/clientes/cli-1?limite={limite}')
+
+    # Entonces se responde 400 sin consultar la base
+    assert respuesta.status_code == 400
+    assert 'limite' in respuesta.get_json()['error']
+    with pytest.raises(ValueError):
+        servicio.listar_campanias_cliente_qry('cli-1', limite=int(limite))
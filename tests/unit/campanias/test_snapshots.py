@@ -0,0 +1,60 @@
+"""Pruebas para la rehidratación de campanias con snapshots"""
+
+import pytest
+from sqlalchemy import text
+from campanias.infrastructure.repos import EventStoreModel, CampaniaSnapshotModel
+from campanias.infrastructure.event_store import append_events
+from campanias.infrastructure import snapshots
+
+
+@pytest.fixture
+def engine(sqlite_engine):
+    EventStoreModel.__table__.create(sqlite_engine)
+    CampaniaSnapshotModel.__table__.create(sqlite_engine)
+    return sqlite_engine
+
+
+def _snapshot(engine):
+    with engine.connect() as conn:
+        return conn.execute(text("SELECT version FROM campania_snapshots WHERE aggregate_id = 'camp-1'")).scalar()
+
+
+def test_load_campania_reproduce_la_historia_y_toma_snapshot_al_cambiar_estado(engine):
+    # Dada una campania creada y luego aprobada
+    ids = append_events([
+        ('camp-1', 'CampaniaCreada.v1', {'idCliente': 'cli-1', 'itinerario': ['vuelo1']}),
+        ('camp-1', 'PagoConfirmado.v1', {'idCampania': 'camp-1'}),
+        ('camp-1', 'CampaniaAprobada.v1', {'idCampania': 'camp-1'}),
+    ])
+
+    # Cuando se rehidrata
+    campania = snapshots.load_campania('camp-1')
+
+    # Entonces refleja el último estado y queda un snapshot en el último evento
+    assert (campania.idCliente, campania.itinerario, campania.estado) == ('cli-1', ['vuelo1'], 'APROBADA')
+    assert _snapshot(engine) == ids[-1]
+
+
+def test_load_campania_solo_reproduce_la_cola_posterior_al_snapshot(engine, monkeypatch):
+    # Dada una campania con snapshot y un evento posterior
+    append_events([('camp-1', 'CampaniaCreada.v1', {'idCliente': 'cli-1', 'itinerario': []})])
+    snapshots.load_campania('camp-1')
+    with engine.begin() as conn:
+        # si se reprodujera la historia completa no habría CampaniaCreada
+        conn.execute(text("UPDATE event_store SET type = 'EventoIlegible'"))
+    nuevo = append_events([('camp-1', 'CampaniaCancelada.v1', {'motivo': 'sin fondos'})])[0]
+
+    # Cuando se rehidrata sin la historia anterior al snapshot
+    campania = snapshots.load_campania('camp-1')
+
+    # Entonces se parte del snapshot y se aplica solo la cola
+    assert (campania.idCliente, campania.estado) == ('cli-1', 'CANCELADA')
+    assert _snapshot(engine) == nuevo
+
+
+def test_should_snapshot_por_intervalo_o_cambio_de_estado(monkeypatch):
+    monkeypatch.setattr(snapshots, 'SNAPSHOT_EVERY', 3)
+    assert snapshots.should_snapshot(3, 'PENDIENTE', 'PENDIENTE')
+    assert snapshots.should_snapshot(1, 'PENDIENTE', 'APROBADA')
+    assert not snapshots.should_snapshot(2, 'PENDIENTE', 'PENDIENTE')
+    assert not snapshots.should_snapshot(0, None, None)
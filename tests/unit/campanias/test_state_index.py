@@ -0,0 +1,50 @@
+"""Pruebas para el índice en memoria de estado y cliente de campanias"""
+
+import pytest
+from campanias.infrastructure.repos import EventStoreModel
+from campanias.infrastructure.event_store import append_events
+from campanias.infrastructure.state_index import CampaignStateIndex, StateIndexSubscription
+
+
+@pytest.fixture
+def engine(sqlite_engine):
+    EventStoreModel.__table__.create(sqlite_engine)
+    return sqlite_engine
+
+
+def test_cuenta_por_estado_y_lista_por_cliente_sin_retroceder():
+    # Dado un índice con tres campanias de dos clientes
+    indice = CampaignStateIndex()
+    indice.apply(1, 'camp-1', 'CampaniaCreada.v1', {'idCliente': 'cli-1'})
+    indice.apply(2, 'camp-2', 'CampaniaCreada.v1', '{"idCliente": "cli-1"}')
+    indice.apply(3, 'camp-3', 'CampaniaCreada.v1', {'idCliente': 'cli-2'})
+    indice.apply(5, 'camp-1', 'CampaniaAprobada.v1', {'idCampania': 'camp-1'})
+
+    # Cuando llega tarde un evento anterior y uno de un tipo que no proyecta
+    aplicado_tarde = indice.apply(4, 'camp-1', 'CampaniaCancelada.v1', {'idCampania': 'camp-1'})
+    indice.apply(6, 'camp-3', 'PagoSolicitado.v1', {'idCliente': 'cli-9'})
+
+    # Entonces los conteos y listados reflejan solo el estado más reciente de cada campania
+    assert aplicado_tarde is False
+    assert indice.counts() == {'PENDIENTE': 2, 'APROBADA': 1, 'CANCELADA': 0}
+    assert [c['id'] for c in indice.campaigns_of('cli-1')] == ['camp-1', 'camp-2']
+    assert indice.campaigns_of('cli-1', 'PENDIENTE') == [{'id': 'camp-2', 'idCliente': 'cli-1', 'estado': 'PENDIENTE'}]
+    assert indice.campaigns_of('cli-9') == []
+    assert len(indice) == 3
+
+
+def test_se_reconstruye_desde_el_event_store_y_queda_listo(engine):
+    # Dado un event store con campanias creadas y una cancelada
+    append_events([(f'camp-{i}', 'CampaniaCreada.v1', {'idCliente': f'cli-{i % 2}'}) for i in range(5)])
+    append_events([('camp-0', 'CampaniaCancelada.v1', {'idCampania': 'camp-0'})])
+    indice = CampaignStateIndex()
+    suscripcion = StateIndexSubscription(indice, engine=engine, batch_size=4)
+
+    # Cuando la suscripción se pone al día en lotes
+    assert [suscripcion.run_once() for _ in range(3)] == [4, 2, 0]
+
+    # Entonces el índice quedó listo en la posición del último evento, sin checkpoint persistido
+    assert indice.ready.is_set()
+    assert indice.position == 6
+    assert indice.counts() == {'PENDIENTE': 4, 'APROBADA': 0, 'CANCELADA': 1}
+    assert [c['id'] for c in indice.campaigns_of('cli-0')] == ['camp-0', 'camp-2', 'camp-4']
@@ -0,0 +1,47 @@
+"""Pruebas para el registro de engines compartidos de `alpespartners.config.db`"""
+
+from sqlalchemy import text
+from alpespartners.config.db import get_engine, pool_stats, dispose_engines
+
+
+def test_get_engine_reutiliza_el_engine_por_url(tmp_path):
+    # Dada una URL de base de datos
+    db_url = f"sqlite:///{tmp_path / 'registro.sqlite'}"
+
+    # Cuando se pide el engine varias veces
+    primero = get_engine(db_url)
+    segundo = get_engine(db_url)
+
+    # Entonces se obtiene siempre la misma instancia
+    assert primero is segundo
+    dispose_engines()
+
+
+def test_get_engine_usa_url_del_entorno(tmp_path, monkeypatch):
+    # Dada una URL configurada por entorno
+    db_url = f"sqlite:///{tmp_path / 'entorno.sqlite'}"
+    monkeypatch.delenv('DB_URL', raising=False)
+    monkeypatch.setenv('DATABASE_URL', db_url)
+
+    # Cuando se pide el engine sin argumentos
+    engine = get_engine()
+
+    # Entonces corresponde a la URL del entorno
+    assert engine is get_engine(db_url)
+    dispose_engines()
+
+
+def test_pool_stats_reporta_engines_registrados(tmp_path):
+    # Dado un engine usado al menos una vez
+    db_url = f"sqlite:///{tmp_path / 'stats.sqlite'}"
+    with get_engine(db_url).connect() as conn:
+        conn.execute(text('SELECT 1'))
+
+    # Cuando se consultan las estadísticas
+    stats = pool_stats()
+
+    # Entonces el pool aparece con su tipo y contadores
+    assert db_url in stats
+    assert 'pool' in stats[db_url]
+    assert stats[db_url]['checked_out'] == 0
+    dispose_engines()
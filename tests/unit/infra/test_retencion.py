@@ -0,0 +1,53 @@
+"""Pruebas para la retención de processed_events"""
+
+from datetime import date, datetime
+
+import pytest
+from sqlalchemy import text
+from alpespartners.config.db import ProcessedEvent
+from alpespartners.infra import retencion
+
+
+@pytest.fixture
+def engine(sqlite_engine):
+    ProcessedEvent.__table__.create(sqlite_engine)
+    return sqlite_engine
+
+
+def test_poda_las_marcas_fuera_de_la_ventana_de_redelivery(engine, monkeypatch):
+    # Dada una ventana de redelivery de 2 días (+1 de margen) y marcas de varios días
+    monkeypatch.setattr(retencion, 'VENTANA_REDELIVERY_S', 2 * 24 * 3600)
+    monkeypatch.setattr(retencion, 'MARGEN_S', 24 * 3600)
+    with engine.begin() as conn:
+        for n, dia in enumerate([date(2026, 10, 1), date(2026, 10, 14), date(2026, 10, 15), date(2026, 10, 18)]):
+            conn.execute(text("INSERT INTO processed_events (aggregate_id, event_type, event_id, bucket) "
+                              "VALUES ('camp-1', 'PagoConfirmado.v1', :eid, :dia)"), {"eid": f"e{n}", "dia": dia})
+
+    # Cuando corre la poda
+    reporte = retencion.podar_processed_events(engine, ahora=datetime(2026, 10, 18, 12))
+
+    # Entonces solo quedan los días dentro de la ventana y el reporte lo refleja
+    assert reporte["limite"] == "2026-10-15"
+    assert reporte["filas_podadas"] == 2
+    with engine.connect() as conn:
+        assert [r[0] for r in conn.execute(text("SELECT event_id FROM processed_events ORDER BY id"))] == ["e2", "e3"]
+
+
+def test_sin_particiones_poda_por_lotes(engine, monkeypatch):
+    # Dada una tabla simple con 5 marcas vencidas y lotes de 2 filas
+    monkeypatch.setattr(retencion, 'LOTE_PODA', 2)
+    with engine.begin() as conn:
+        for n in range(6):
+            conn.execute(text("INSERT INTO processed_events (aggregate_id, event_type, event_id, bucket) "
+                              "VALUES ('camp-1', 'PagoConfirmado.v1', :eid, :dia)"),
+                         {"eid": f"e{n}", "dia": date(2026, 1, 1) if n < 5 else date(2026, 10, 18)})
+
+    # Cuando corre la poda
+    reporte = retencion.podar_processed_events(engine, ahora=datetime(2026, 10, 18, 12))
+
+    # Entonces se borran todas las vencidas en varios lotes y no se tocan particiones
+    assert reporte["filas_podadas"] == 5
+    assert reporte["particiones"] == []
+    assert retencion.asegurar_particiones(engine) == []
+    with engine.connect() as conn:
+        assert [r[0] for r in conn.execute(text("SELECT event_id FROM processed_events"))] == ["e5"]
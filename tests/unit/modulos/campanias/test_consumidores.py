@@ -0,0 +1,16 @@
+"""Pruebas para el consumidor de pagos en la ruta heredada de campanias"""
+
+from campanias.infrastructure import consumidores as canonico
+from alpespartners.modulos.campanias.infraestructura import consumidores
+
+
+def test_la_ruta_heredada_delega_en_el_consumidor_canonico(monkeypatch):
+    # Dado el consumidor canónico de campanias
+    llamadas = []
+    monkeypatch.setattr(canonico, 'suscribirse_a_eventos_pagos', lambda: llamadas.append('canonico') or 'ok')
+
+    # Cuando un lanzador arranca el consumidor por la ruta heredada
+    resultado = consumidores.suscribirse_a_eventos_pagos()
+
+    # Entonces se ejecuta el consumidor canónico y no un bucle propio
+    assert (resultado, llamadas) == ('ok', ['canonico'])
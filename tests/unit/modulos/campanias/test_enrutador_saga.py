@@ -0,0 +1,90 @@
+"""Pruebas para el enrutador de respuestas de pagos de las sagas de campanias"""
+
+import json
+import threading
+
+import pulsar
+from alpespartners.modulos.campanias.infraestructura.enrutador_saga import EnrutadorRespuestasSaga
+
+
+class MensajeFalso:
+    def __init__(self, tipo, id_campania):
+        self._raw = json.dumps({"type": tipo, "data": {"idCampania": id_campania}}).encode('utf-8')
+
+    def data(self):
+        return self._raw
+
+
+class ConsumerFalso:
+    def __init__(self, mensajes):
+        self.mensajes = list(mensajes)
+        self.acks = 0
+        self.vacio = threading.Event()
+
+    def receive(self, timeout_millis=None):
+        if not self.mensajes:
+            self.vacio.set()
+            raise pulsar.Timeout()
+        return self.mensajes.pop(0)
+
+    def acknowledge(self, msg):
+        self.acks += 1
+
+
+def test_entrega_cada_respuesta_a_su_saga():
+    # Dadas varias sagas pendientes y respuestas en desorden
+    consumer = ConsumerFalso([MensajeFalso('PagoFallido', 'camp-2'),
+                              MensajeFalso('PagoExitoso', 'camp-1'),
+                              MensajeFalso('PagoExitoso', 'camp-otra')])
+    enrutador = EnrutadorRespuestasSaga(consumer)
+    futuro_1 = enrutador.registrar('camp-1')
+    futuro_2 = enrutador.registrar('camp-2')
+
+    # Cuando el enrutador lee el tópico
+    enrutador.iniciar()
+    consumer.vacio.wait(2)
+    enrutador.detener()
+
+    # Entonces cada saga recibe su respuesta y todos los mensajes se confirman
+    assert futuro_1.result(1)[0] == 'PagoExitoso'
+    assert futuro_2.result(1)[0] == 'PagoFallido'
+    assert consumer.acks == 3
+    assert enrutador.pendientes() == 0
+
+
+def test_respuesta_anticipada_completa_al_registrar():
+    # Dada una respuesta que llega antes de registrar la saga
+    enrutador = EnrutadorRespuestasSaga(ConsumerFalso([]))
+    assert enrutador.entregar('PagoExitoso', {'idCampania': 'camp-9'}) is False
+
+    # Cuando la saga se registra con callback
+    recibidas = []
+    listo = threading.Event()
+    enrutador.registrar('camp-9', lambda tipo, data: (recibidas.append(tipo), listo.set()))
+
+    # Entonces el callback se ejecuta con la respuesta guardada
+    assert listo.wait(2)
+    assert recibidas == ['PagoExitoso']
+    enrutador.detener()
+
+
+def test_se_detiene_si_el_consumer_esta_cerrado():
+    # Dado un consumer que ya fue cerrado
+    class ConsumerCerrado:
+        llamadas = 0
+
+        def receive(self, timeout_millis=None):
+            self.llamadas += 1
+            raise pulsar.AlreadyClosed()
+
+    consumer = ConsumerCerrado()
+    enrutador = EnrutadorRespuestasSaga(consumer)
+
+    # Cuando el enrutador empieza a escuchar
+    enrutador.iniciar()
+    enrutador._hilo.join(timeout=2)
+
+    # Entonces el hilo termina en lugar de girar sobre receive()
+    assert not enrutador._hilo.is_alive()
+    assert consumer.llamadas == 1
+    enrutador.detener()
@@ -0,0 +1,60 @@
+"""Pruebas para el vencimiento de plazos del orquestador de sagas de campanias"""
+
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from alpespartners.modulos.campanias.aplicacion import saga_orquestador
+from alpespartners.modulos.campanias.aplicacion.saga_orquestador import SagaOrquestador
+
+CAMPANIA = {'idCampania': 'camp-1', 'idCliente': 'cli-1'}
+
+
+class _EnrutadorFalso:
+    def __init__(self, pendientes):
+        self.pendientes = set(pendientes)
+
+    def cancelar(self, id_saga):
+        if id_saga not in self.pendientes:
+            return False
+        self.pendientes.discard(id_saga)
+        return True
+
+
+def _orquestador(pendientes):
+    # Sin Pulsar: solo las piezas que usa el vencimiento de plazos
+    saga = object.__new__(SagaOrquestador)
+    saga.enrutador = _EnrutadorFalso(pendientes)
+    saga.compensaciones = ThreadPoolExecutor(max_workers=1, thread_name_prefix='saga-compensaciones')
+    return saga
+
+
+def test_expirar_saga_compensa_fuera_del_hilo_de_la_rueda(monkeypatch):
+    # Dada una saga pendiente cuyo plazo vence
+    saga = _orquestador(['camp-1'])
+    hilos = []
+    monkeypatch.setattr(saga_orquestador.saga_store, 'finalizar_saga',
+                        lambda *args: hilos.append(threading.current_thread().name) or True)
+    monkeypatch.setattr(saga, 'procesar_pago_fallido',
+                        lambda campania, data: hilos.append(data['reason']))
+
+    # Cuando la rueda invoca el callback del plazo
+    saga.expirar_saga(dict(CAMPANIA))
+    saga.compensaciones.shutdown(wait=True)
+
+    # Entonces la saga se retira del enrutador y la compensación corre en el pool
+    assert saga.enrutador.pendientes == set()
+    assert hilos[0].startswith('saga-compensaciones')
+    assert hilos[1] == 'Timeout esperando respuesta de pagos'
+
+
+def test_expirar_saga_ya_respondida_no_compensa(monkeypatch):
+    # Dada una saga cuya respuesta de pagos ya fue entregada
+    saga = _orquestador([])
+    llamadas = []
+    monkeypatch.setattr(saga_orquestador.saga_store, 'finalizar_saga', lambda *args: llamadas.append(args))
+
+    # Cuando vence su plazo
+    saga.expirar_saga(dict(CAMPANIA))
+    saga.compensaciones.shutdown(wait=True)
+
+    # Entonces no se encola ninguna compensación
+    assert llamadas == []
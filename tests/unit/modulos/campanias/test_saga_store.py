@@ -0,0 +1,44 @@
+"""Pruebas para el estado persistente de las sagas de campanias"""
+
+from datetime import datetime, timedelta
+from alpespartners.config.db import get_engine, dispose_engines
+from alpespartners.modulos.campanias.infraestructura import saga_store
+
+
+def _preparar(tmp_path, monkeypatch):
+    db_url = f"sqlite:///{tmp_path / 'sagas.sqlite'}"
+    monkeypatch.setenv('DB_URL', db_url)
+    saga_store.SagaInstanceModel.__table__.create(get_engine(db_url))
+
+
+def test_sagas_pendientes_recupera_las_sagas_en_curso(tmp_path, monkeypatch):
+    # Dadas dos sagas guardadas, una de ellas ya finalizada
+    _preparar(tmp_path, monkeypatch)
+    deadline = datetime.utcnow() + timedelta(seconds=30)
+    saga_store.guardar_saga('camp-1', 'ESPERANDO_PAGO', deadline, {'idCampania': 'camp-1'})
+    saga_store.guardar_saga('camp-2', 'ESPERANDO_PAGO', deadline, {'idCampania': 'camp-2'})
+    saga_store.finalizar_saga('camp-2', 'PAGO_CONFIRMADO', saga_store.ESTADO_COMPLETADA)
+
+    # Cuando se consultan las sagas pendientes
+    pendientes = saga_store.sagas_pendientes()
+
+    # Entonces solo se recupera la saga en curso con su plazo y datos
+    assert [s['id'] for s in pendientes] == ['camp-1']
+    assert pendientes[0]['deadline'] == deadline
+    assert pendientes[0]['data'] == {'idCampania': 'camp-1'}
+    dispose_engines()
+
+
+def test_finalizar_saga_solo_gana_una_vez(tmp_path, monkeypatch):
+    # Dada una saga en curso
+    _preparar(tmp_path, monkeypatch)
+    saga_store.guardar_saga('camp-1', 'ESPERANDO_PAGO', datetime.utcnow(), {'idCampania': 'camp-1'})
+
+    # Cuando la respuesta y el timeout intentan cerrarla
+    respuesta = saga_store.finalizar_saga('camp-1', 'PAGO_CONFIRMADO', saga_store.ESTADO_COMPLETADA)
+    timeout = saga_store.finalizar_saga('camp-1', 'TIMEOUT', saga_store.ESTADO_COMPENSADA)
+
+    # Entonces solo el primero la finaliza
+    assert respuesta is True
+    assert timeout is False
+    dispose_engines()
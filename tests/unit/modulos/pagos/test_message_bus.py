@@ -0,0 +1,110 @@
+"""Pruebas para el bus de mensajes sobre el outbox compartido"""
+
+import pytest
+from sqlalchemy import create_engine, select, update
+from alpespartners.infra.message_bus.db_outbox import metadata, outbox_table, DbOutboxBus
+from alpespartners.infra.message_bus.worker import OutboxWorker
+
+
+def _engine(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'bus.sqlite'}", future=True)
+    metadata.create_all(engine)
+    return engine
+
+
+def _vencer_esperas(engine):
+    with engine.begin() as conn:
+        conn.execute(update(outbox_table).values(next_attempt_at=None))
+
+
+def test_publish_respeta_la_transaccion_del_llamador(tmp_path):
+    # Dado un bus y una transacción del llamador que falla después de publicar
+    engine = _engine(tmp_path)
+    bus = DbOutboxBus(engine)
+    with pytest.raises(RuntimeError):
+        with engine.begin() as conn:
+            bus.publish('pagos.confirmado', {"idCampania": "camp-1"}, aggregate_id='camp-1', conn=conn)
+            raise RuntimeError('falla del caso de uso')
+
+    # Cuando se publica fuera de esa transacción
+    rowid = bus.publish('pagos.confirmado', {"idCampania": "camp-2"}, aggregate_id='camp-2')
+
+    # Entonces solo persiste el mensaje confirmado
+    with engine.connect() as conn:
+        filas = conn.execute(select(outbox_table.c.id, outbox_table.c.aggregate_id)).fetchall()
+    assert [(f.id, f.aggregate_id) for f in filas] == [(rowid, 'camp-2')]
+
+
+def test_worker_agota_reintentos_y_marca_failed(tmp_path):
+    # Dado un mensaje cuyo handler siempre falla y un máximo de dos reintentos
+    engine = _engine(tmp_path)
+    rowid = DbOutboxBus(engine).publish('pagos.confirmado', {"idCampania": "camp-1"})
+
+    def handler(fila, conn):
+        raise ConnectionError('destino caído')
+
+    worker = OutboxWorker(handle_event=handler, engine=engine, max_retries=2)
+
+    # Cuando el worker procesa hasta agotar los reintentos (vencida cada espera)
+    resultados = []
+    for _ in range(3):
+        resultados.append(worker.procesar_lote())
+        _vencer_esperas(engine)
+
+    # Entonces la fila queda FAILED con su último error y deja de reclamarse
+    assert resultados == [(0, 1), (0, 1), (0, 0)]
+    with engine.connect() as conn:
+        fila = conn.execute(select(outbox_table).where(outbox_table.c.id == rowid)).fetchone()
+    assert (fila.status, fila.retries, fila.last_error) == ('FAILED', 2, 'destino caído')
+
+
+def test_worker_no_adelanta_mensajes_de_un_agregado_con_un_fallo(tmp_path):
+    # Dados mensajes intercalados de dos campanias y un destino que rechaza el primero de camp-1
+    engine = _engine(tmp_path)
+    bus = DbOutboxBus(engine)
+    for n, agregado in enumerate(['camp-1', 'camp-2', 'camp-1', 'camp-2']):
+        bus.publish('pagos.confirmado', {"n": n}, aggregate_id=agregado)
+    publicados, fallar = [], {0}
+
+    def handler(fila, conn):
+        if fila.payload["n"] in fallar:
+            fallar.discard(fila.payload["n"])
+            raise ConnectionError('destino caído')
+        publicados.append(fila.payload["n"])
+
+    worker = OutboxWorker(handle_event=handler, engine=engine)
+
+    # Cuando se procesa un lote, se reintenta antes de vencer la espera y luego después
+    primero = worker.procesar_lote()
+    en_espera = worker.procesar_lote()
+    _vencer_esperas(engine)
+    despues = worker.procesar_lote()
+
+    # Entonces camp-1 no publica nada tras su fallo hasta reintentarlo, y sale en orden
+    assert (primero, en_espera, despues) == ((2, 1), (0, 0), (2, 0))
+    assert publicados == [1, 3, 0, 2]
+
+
+def test_agregado_en_espera_no_acapara_el_lote(tmp_path):
+    # Dada una campania con más filas que el lote y cuya primera fila falla, seguida de otra campania
+    engine = _engine(tmp_path)
+    bus = DbOutboxBus(engine)
+    for n, agregado in enumerate(['camp-1'] * 5 + ['camp-2'] * 2):
+        bus.publish('pagos.confirmado', {"n": n}, aggregate_id=agregado)
+    publicados, fallar = [], {0}
+
+    def handler(fila, conn):
+        if fila.payload["n"] in fallar:
+            fallar.discard(fila.payload["n"])
+            raise ConnectionError('destino caído')
+        publicados.append(fila.payload["n"])
+
+    worker = OutboxWorker(handle_event=handler, engine=engine, batch_size=3)
+
+    # Cuando se procesan dos lotes mientras camp-1 sigue en espera
+    primero = worker.procesar_lote()
+    segundo = worker.procesar_lote()
+
+    # Entonces el segundo lote reclama las filas de camp-2 en lugar de las bloqueadas de camp-1
+    assert (primero, segundo) == ((0, 1), (2, 0))
+    assert publicados == [5, 6]
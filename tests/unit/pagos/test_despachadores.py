@@ -0,0 +1,35 @@
+"""Pruebas para el respaldo en base del despachador de pagos"""
+
+from pagos.infraestructura import despachadores
+
+
+def _publicacion_fallida(tipo, payload):
+    raise RuntimeError('broker caído')
+
+
+def test_sin_id_de_evento_no_escribe_la_vista(monkeypatch):
+    # Dado un broker caído y un event_store que no devuelve id
+    escrituras = []
+    monkeypatch.setattr(despachadores, 'publish_event', _publicacion_fallida)
+    monkeypatch.setattr(despachadores, '_append_event_direct', lambda *a: None)
+    monkeypatch.setattr(despachadores, '_upsert_campania_view_direct', lambda *a: escrituras.append(a))
+
+    # Cuando se despacha un pago exitoso
+    despachadores.despachar_pago_exitoso({'idCampania': 'camp-1', 'idCliente': 'cli-1'})
+
+    # Entonces no se intenta la escritura sin versión
+    assert escrituras == []
+
+
+def test_con_id_de_evento_escribe_la_vista_con_esa_version(monkeypatch):
+    # Dado un broker caído y un event_store que devuelve el id 42
+    escrituras = []
+    monkeypatch.setattr(despachadores, 'publish_event', _publicacion_fallida)
+    monkeypatch.setattr(despachadores, '_append_event_direct', lambda *a: 42)
+    monkeypatch.setattr(despachadores, '_upsert_campania_view_direct', lambda *a: escrituras.append(a))
+
+    # Cuando se despacha un pago exitoso
+    despachadores.despachar_pago_exitoso({'idCampania': 'camp-1', 'idCliente': 'cli-1'})
+
+    # Entonces la vista se escribe guardada por esa versión
+    assert escrituras == [('camp-1', 'cli-1', 'APROBADA', 42)]
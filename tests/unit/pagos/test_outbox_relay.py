@@ -0,0 +1,85 @@
+"""Pruebas para el relay del outbox de pagos"""
+
+from concurrent.futures import Future
+from sqlalchemy import text
+from alpespartners.config.db import OutboxEvent, get_engine, dispose_engines
+from pagos.infraestructura.outbox import relay_once
+
+
+def _futuro(error=None):
+    futuro = Future()
+    if error:
+        futuro.set_exception(error)
+    else:
+        futuro.set_result('msg-id')
+    return futuro
+
+
+def _preparar(tmp_path, filas):
+    engine = get_engine(f"sqlite:///{tmp_path / 'outbox.sqlite'}")
+    OutboxEvent.__table__.create(engine)
+    with engine.begin() as c:
+        c.execute(
+            text("INSERT INTO outbox (event_type, payload, status, retries) VALUES (:t, :p, 'PENDING', 0)"),
+            [{"t": 'PagoConfirmado.v1', "p": f'{{"idCampania": "camp-{i}"}}'} for i in range(filas)]
+        )
+    return engine
+
+
+def test_relay_marca_enviadas_y_registra_fallos_por_fila(tmp_path):
+    # Dado un outbox con tres filas pendientes y un broker que rechaza la segunda
+    engine = _preparar(tmp_path, 3)
+    publicados = []
+
+    def publicar(tipo, data):
+        publicados.append(data['idCampania'])
+        return _futuro(RuntimeError('broker caído') if data['idCampania'] == 'camp-1' else None)
+
+    # Cuando el relay procesa un lote
+    enviados, fallidos = relay_once(engine, batch_size=10, publicar=publicar)
+
+    # Entonces las exitosas quedan SENT y la fallida sigue PENDING con su reintento y error
+    assert (enviados, fallidos) == (2, 1)
+    assert publicados == ['camp-0', 'camp-1', 'camp-2']
+    with engine.connect() as c:
+        filas = c.execute(text("SELECT id, status, retries, last_error FROM outbox ORDER BY id")).fetchall()
+    assert [f[1] for f in filas] == ['SENT', 'PENDING', 'SENT']
+    assert filas[1][2] == 1 and 'broker caído' in filas[1][3]
+
+    # Y vencida su espera, el siguiente ciclo solo reintenta la fila fallida
+    with engine.begin() as c:
+        assert c.execute(text("SELECT next_attempt_at FROM outbox WHERE status = 'PENDING'")).scalar() is not None
+        c.execute(text("UPDATE outbox SET next_attempt_at = NULL"))
+    publicados.clear()
+    relay_once(engine, batch_size=10, publicar=lambda tipo, data: publicados.append(data['idCampania']) or _futuro())
+    assert publicados == ['camp-1']
+    dispose_engines()
+
+
+def test_relay_respeta_el_tamano_de_lote(tmp_path):
+    # Dado un outbox con cinco filas pendientes
+    engine = _preparar(tmp_path, 5)
+
+    # Cuando el relay procesa lotes de dos
+    resultados = [relay_once(engine, batch_size=2, publicar=lambda tipo, data: _futuro()) for _ in range(4)]
+
+    # Entonces publica 2, 2, 1 y luego nada
+    assert resultados == [(2, 0), (2, 0), (1, 0), (0, 0)]
+    dispose_engines()
+
+
+def test_relay_solo_publica_los_shards_indicados(tmp_path):
+    # Dado un outbox con filas en los shards 0 y 1
+    engine = _preparar(tmp_path, 4)
+    with engine.begin() as c:
+        c.execute(text("UPDATE outbox SET shard = id % 2"))
+    publicados = []
+
+    # Cuando un worker que solo posee el shard 1 procesa un lote
+    relay_once(engine, batch_size=10, publicar=lambda tipo, data: publicados.append(data['idCampania']) or _futuro(),
+               shards=[1])
+
+    # Entonces solo publica las filas de su shard, en orden de id
+    assert publicados == ['camp-0', 'camp-2']
+    assert relay_once(engine, batch_size=10, publicar=lambda tipo, data: _futuro(), shards=[]) == (0, 0)
+    dispose_engines()
@@ -0,0 +1,52 @@
+"""Pruebas para el reparto de shards mediante arrendamientos"""
+
+from sqlalchemy import create_engine, text
+from alpespartners.config.db import OutboxLease, OutboxRelayWorker
+from alpespartners.seedwork.infraestructura.arrendamientos import ArrendamientoShards, shard_de
+
+
+def _engine(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'leases.sqlite'}")
+    OutboxLease.__table__.create(engine)
+    OutboxRelayWorker.__table__.create(engine)
+    return engine
+
+
+def test_dos_workers_se_reparten_los_shards_sin_solaparse(tmp_path):
+    # Dados dos workers sobre 8 shards, el primero ya con todos arrendados
+    engine = _engine(tmp_path)
+    a = ArrendamientoShards(engine, 'a', total=8)
+    b = ArrendamientoShards(engine, 'b', total=8)
+    assert a.renovar() == list(range(8))
+
+    # Cuando llega el segundo y ambos renuevan
+    b.renovar()
+    shards_a = a.renovar()
+    shards_b = b.renovar()
+
+    # Entonces cada uno queda con su mitad y juntos cubren todos los shards
+    assert len(shards_a) == 4 and len(shards_b) == 4
+    assert sorted(shards_a + shards_b) == list(range(8))
+
+
+def test_los_shards_de_un_worker_muerto_se_reasignan(tmp_path):
+    # Dados dos workers con los shards repartidos
+    engine = _engine(tmp_path)
+    a = ArrendamientoShards(engine, 'a', total=8)
+    b = ArrendamientoShards(engine, 'b', total=8)
+    a.renovar(); b.renovar(); a.renovar()
+    assert len(b.renovar()) == 4
+
+    # Cuando el latido y los arriendos de b vencen (b dejó de renovar)
+    with engine.begin() as c:
+        c.execute(text("UPDATE outbox_workers SET expires_at = '2000-01-01' WHERE owner = 'b'"))
+        c.execute(text("UPDATE outbox_leases SET expires_at = '2000-01-01' WHERE owner = 'b'"))
+    shards_a = a.renovar()
+
+    # Entonces a toma todos los shards
+    assert shards_a == list(range(8))
+
+
+def test_shard_de_es_estable():
+    assert shard_de('camp-1', 64) == shard_de('camp-1', 64)
+    assert 0 <= shard_de(None, 64) < 64
@@ -0,0 +1,51 @@
+"""Pruebas para la caché LRU con TTL de lecturas read-through"""
+
+from alpespartners.seedwork.infraestructura.cache import CacheLRU, estadisticas_caches
+
+
+def test_responde_desde_memoria_hasta_invalidar_o_vencer(monkeypatch):
+    # Dada una caché con TTL de 1 s y un reloj controlado
+    ahora = [100.0]
+    monkeypatch.setattr('alpespartners.seedwork.infraestructura.cache.time.monotonic', lambda: ahora[0])
+    cache = CacheLRU(capacidad=10, ttl_s=1.0, nombre='prueba')
+    cargas = []
+
+    def cargar():
+        cargas.append(1)
+        return {"estado": f"v{len(cargas)}"}
+
+    # Cuando se consulta varias veces, se invalida y luego vence el TTL
+    primera = cache.obtener('camp-1', cargar)
+    segunda = cache.obtener('camp-1', cargar)
+    cache.invalidar('camp-1')
+    tras_invalidar = cache.obtener('camp-1', cargar)
+    ahora[0] += 1.5
+    tras_vencer = cache.obtener('camp-1', cargar)
+
+    # Entonces solo se carga al fallar, y los contadores lo reflejan
+    assert [primera, segunda, tras_invalidar, tras_vencer] == [
+        {"estado": "v1"}, {"estado": "v1"}, {"estado": "v2"}, {"estado": "v3"}]
+    stats = estadisticas_caches()['prueba']
+    assert (stats["aciertos"], stats["fallos"], stats["invalidaciones"]) == (1, 3, 1)
+
+
+def test_acota_tamano_y_no_guarda_cargas_solapadas_con_invalidaciones():
+    # Dada una caché de 2 entradas
+    cache = CacheLRU(capacidad=2, ttl_s=60)
+    cache.obtener('a', lambda: 1)
+    cache.obtener('b', lambda: 2)
+    cache.obtener('a', lambda: 1)
+
+    # Cuando entra una tercera clave y otra se carga mientras alguien invalida
+    cache.obtener('c', lambda: 3)
+
+    def carga_con_escritura_concurrente():
+        cache.invalidar('d')
+        return 'viejo'
+    cache.obtener('d', carga_con_escritura_concurrente)
+
+    # Entonces se expulsa la menos usada, la carga solapada no queda y None no se guarda
+    assert cache.obtener('b', lambda: 'recargado') == 'recargado'
+    assert cache.obtener('d', lambda: 'nuevo') == 'nuevo'
+    assert cache.obtener('x', lambda: None) is None
+    assert cache.estadisticas()["tamano"] == 2
@@ -0,0 +1,134 @@
+"""Pruebas para el despachador de mensajes con orden por agregado"""
+
+import json
+import threading
+import time
+from alpespartners.seedwork.infraestructura.despachador_ordenado import DespachadorPorClave, clave_por_campo
+
+
+class MensajeFalso:
+    def __init__(self, id_campania, n):
+        self.id_campania = id_campania
+        self.n = n
+
+    def data(self):
+        return json.dumps({"type": "PagoConfirmado.v1", "data": {"idCampania": self.id_campania}}).encode('utf-8')
+
+    def partition_key(self):
+        return ''
+
+
+class ConsumerFalso:
+    def __init__(self):
+        self.acks = []
+        self.nacks = []
+        self._lock = threading.Lock()
+
+    def acknowledge(self, msg):
+        with self._lock:
+            self.acks.append(msg.n)
+
+    def negative_acknowledge(self, msg):
+        with self._lock:
+            self.nacks.append(msg.n)
+
+
+def test_clave_por_campo_lee_el_sobre_json():
+    assert clave_por_campo('idCampania')(MensajeFalso('camp-7', 1)) == 'camp-7'
+
+
+def test_mantiene_el_orden_por_agregado():
+    # Dado un despachador con varios workers y un procesamiento lento
+    vistos = {}
+    lock = threading.Lock()
+
+    def procesar(msg):
+        time.sleep(0.001)
+        with lock:
+            vistos.setdefault(msg.id_campania, []).append(msg.n)
+
+    despachador = DespachadorPorClave(procesar, workers=4)
+    consumer = ConsumerFalso()
+
+    # Cuando se despachan mensajes intercalados de varias campanias
+    for n in range(60):
+        despachador.despachar(consumer, MensajeFalso(f'camp-{n % 5}', n))
+    despachador.detener()
+
+    # Entonces cada campania ve sus mensajes en el orden de llegada y todos se confirman
+    for id_campania, ns in vistos.items():
+        assert ns == sorted(ns)
+    assert sorted(consumer.acks) == list(range(60))
+    assert despachador.procesados == 60
+
+
+def test_rechaza_mensajes_que_fallan():
+    # Dado un procesamiento que falla para una campania
+    def procesar(msg):
+        if msg.id_campania == 'camp-mala':
+            raise ValueError('fallo')
+
+    despachador = DespachadorPorClave(procesar, workers=2, max_reintentos=1, espera_s=0.001)
+    consumer = ConsumerFalso()
+
+    # Cuando se despachan mensajes
+    despachador.despachar(consumer, MensajeFalso('camp-mala', 1))
+    despachador.despachar(consumer, MensajeFalso('camp-buena', 2))
+    despachador.detener()
+
+    # Entonces sólo el fallido recibe negative ack
+    assert consumer.nacks == [1]
+    assert consumer.acks == [2]
+    assert despachador.fallidos == 1
+
+
+def test_reintenta_en_linea_sin_adelantar_mensajes_de_la_misma_clave():
+    # Dado un procesamiento que falla dos veces con el primer mensaje de una campania
+    fallas = {1: 2}
+    vistos = []
+
+    def procesar(msg):
+        if fallas.get(msg.n):
+            fallas[msg.n] -= 1
+            raise ValueError('transitorio')
+        vistos.append(msg.n)
+
+    despachador = DespachadorPorClave(procesar, workers=1, espera_s=0.001)
+    consumer = ConsumerFalso()
+
+    # Cuando se despachan tres mensajes de la misma campania
+    for n in (1, 2, 3):
+        despachador.despachar(consumer, MensajeFalso('camp-1', n))
+    despachador.esperar()
+    despachador.detener()
+
+    # Entonces el fallido se reintenta antes de seguir y nadie recibe negative ack
+    assert vistos == [1, 2, 3]
+    assert consumer.acks == [1, 2, 3]
+    assert consumer.nacks == []
+    assert despachador.reintentos == 2
+
+
+def test_al_agotar_reintentos_rechaza_tambien_los_encolados_de_la_clave():
+    # Dado un primer mensaje que siempre falla y un worker ocupado mientras se encola el resto
+    liberar = threading.Event()
+
+    def procesar(msg):
+        liberar.wait()
+        if msg.n == 1:
+            raise ValueError('permanente')
+
+    despachador = DespachadorPorClave(procesar, workers=1, max_reintentos=1, espera_s=0.001)
+    consumer = ConsumerFalso()
+
+    # Cuando se despachan mensajes de dos campanias en la misma cola
+    despachador.despachar(consumer, MensajeFalso('camp-1', 1))
+    despachador.despachar(consumer, MensajeFalso('camp-1', 2))
+    despachador.despachar(consumer, MensajeFalso('camp-2', 3))
+    liberar.set()
+    despachador.esperar()
+    despachador.detener()
+
+    # Entonces los mensajes de la clave fallida vuelven juntos y en orden; la otra clave sigue
+    assert consumer.nacks == [1, 2]
+    assert consumer.acks == [3]
@@ -0,0 +1,50 @@
+"""Pruebas para los despertadores de workers"""
+
+import threading
+import time
+from sqlalchemy import create_engine
+from alpespartners.seedwork.infraestructura.despertador import DespertadorPostgres, DespertadorSondeo, crear_despertador
+
+
+def test_sqlite_usa_sondeo_y_notificar_despierta_de_inmediato():
+    # Dado un despertador para SQLite
+    despertador = crear_despertador(create_engine('sqlite://'), 'outbox_nuevo')
+    assert isinstance(despertador, DespertadorSondeo)
+
+    # Cuando otro hilo notifica mientras se espera con un timeout largo
+    threading.Timer(0.05, despertador.notificar).start()
+    inicio = time.monotonic()
+    despertado = despertador.esperar(5)
+
+    # Entonces despierta por la notificación sin agotar el timeout
+    assert despertado is True
+    assert time.monotonic() - inicio < 1
+
+
+def test_sin_notificacion_espera_el_intervalo_de_sondeo():
+    # Dado un despertador sin notificaciones
+    despertador = DespertadorSondeo()
+
+    # Cuando se espera un intervalo corto
+    despertado = despertador.esperar(0.01)
+
+    # Entonces retorna por timeout
+    assert despertado is False
+
+
+class _EngineSinConexion:
+    def raw_connection(self):
+        raise ConnectionError('sin base')
+
+
+def test_si_listen_falla_sondea_con_el_intervalo_y_no_con_el_timeout_de_listen():
+    # Dado un despertador Postgres con timeout de LISTEN largo cuya conexión falla
+    despertador = DespertadorPostgres(_EngineSinConexion(), 'outbox_nuevo', timeout_listen_s=30)
+
+    # Cuando se espera con un intervalo de sondeo corto
+    inicio = time.monotonic()
+    despertado = despertador.esperar(0.01)
+
+    # Entonces sondea con el intervalo, sin heredar el timeout de LISTEN
+    assert despertado is False
+    assert time.monotonic() - inicio < 1
@@ -0,0 +1,67 @@
+"""Pruebas para el envío asíncrono con límite de mensajes en vuelo"""
+
+import threading
+import pulsar
+from alpespartners.seedwork.infraestructura.envio_asincrono import EnvioAsincrono
+
+
+class ProductorAsincronoFalso:
+    """Retiene las confirmaciones hasta que se llama a `confirmar` o `flush`."""
+
+    def __init__(self, resultado=pulsar.Result.Ok):
+        self.resultado = resultado
+        self.pendientes = []
+        self.enviados = []
+
+    def send_async(self, contenido, callback, **opciones):
+        self.enviados.append((contenido, opciones))
+        self.pendientes.append(callback)
+
+    def confirmar(self):
+        pendientes, self.pendientes = self.pendientes, []
+        for i, callback in enumerate(pendientes):
+            callback(self.resultado, f'msg-{i}')
+
+    def flush(self):
+        self.confirmar()
+
+
+def test_flush_espera_las_confirmaciones_y_resuelve_los_futures():
+    # Dado un envío asíncrono con mensajes aún sin confirmar
+    productor = ProductorAsincronoFalso()
+    envio = EnvioAsincrono(productor, max_en_vuelo=10)
+    futuros = [envio.enviar(b'x', partition_key='camp-1') for _ in range(3)]
+    assert envio.en_vuelo() == 3
+    assert not any(f.done() for f in futuros)
+
+    # Cuando se hace flush
+    assert envio.flush(timeout=1) is True
+
+    # Entonces todos los futures quedan resueltos y no hay nada en vuelo
+    assert [f.result() for f in futuros] == ['msg-0', 'msg-1', 'msg-2']
+    assert envio.en_vuelo() == 0
+    assert productor.enviados[0] == (b'x', {'partition_key': 'camp-1'})
+
+
+def test_bloquea_al_superar_el_limite_en_vuelo_y_reporta_errores():
+    # Dado un envío con un solo cupo en vuelo y un broker que rechaza
+    productor = ProductorAsincronoFalso(resultado=pulsar.Result.Timeout)
+    envio = EnvioAsincrono(productor, max_en_vuelo=1)
+    errores = []
+    primero = envio.enviar(b'1', callback=lambda f: errores.append(f.exception()))
+
+    # Cuando se intenta un segundo envío desde otro hilo
+    segundo = []
+    hilo = threading.Thread(target=lambda: segundo.append(envio.enviar(b'2')))
+    hilo.start()
+    hilo.join(timeout=0.2)
+
+    # Entonces queda bloqueado hasta que se confirme el primero
+    assert hilo.is_alive()
+    productor.confirmar()
+    hilo.join(timeout=1)
+    assert not hilo.is_alive()
+    assert isinstance(primero.exception(), RuntimeError)
+    assert len(errores) == 1
+    productor.confirmar()
+    assert segundo[0].done()
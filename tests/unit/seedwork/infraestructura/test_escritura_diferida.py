@@ -0,0 +1,40 @@
+"""Pruebas para el buffer de escritura diferida"""
+
+from alpespartners.seedwork.infraestructura.escritura_diferida import BufferEscrituraDiferida
+
+
+def test_coalesce_por_clave_y_confirma_solo_tras_escribir():
+    # Dado un buffer por clave que vacía al acumular 4 confirmaciones pendientes
+    escritos, confirmados = [], []
+    buffer = BufferEscrituraDiferida(escritos.append, clave=lambda f: f[0], max_items=4, max_espera_ms=60_000)
+
+    # Cuando llegan varias escrituras de la misma campania
+    buffer.agregar(('camp-1', 'PENDIENTE'), confirmar=lambda: confirmados.append(1))
+    buffer.agregar(('camp-2', 'PENDIENTE'), confirmar=lambda: confirmados.append(2))
+    buffer.agregar(('camp-1', 'APROBADA'), confirmar=lambda: confirmados.append(3))
+    assert escritos == [] and confirmados == []
+    buffer.agregar(('camp-3', 'PENDIENTE'), confirmar=lambda: confirmados.append(4))
+
+    # Entonces se escribe una vez, gana la última escritura y todos se confirman después
+    assert escritos == [[('camp-2', 'PENDIENTE'), ('camp-1', 'APROBADA'), ('camp-3', 'PENDIENTE')]]
+    assert confirmados == [1, 2, 3, 4]
+    buffer.cerrar()
+
+
+def test_rechaza_todo_el_vaciado_si_la_escritura_falla():
+    # Dado un buffer cuya escritura falla
+    def falla(items):
+        raise RuntimeError('db caída')
+    confirmados, rechazados = [], []
+    buffer = BufferEscrituraDiferida(falla, max_items=100, max_espera_ms=60_000)
+    for n in range(3):
+        buffer.agregar(n, confirmar=lambda n=n: confirmados.append(n), rechazar=lambda n=n: rechazados.append(n))
+
+    # Cuando se vacía (por tiempo o al cerrar)
+    durables = buffer.vaciar()
+
+    # Entonces nada se confirma y todo se rechaza para redelivery
+    assert durables == 0
+    assert confirmados == [] and rechazados == [0, 1, 2]
+    assert buffer.pendientes() == 0
+    buffer.cerrar()
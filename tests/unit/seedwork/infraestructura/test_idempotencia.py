@@ -0,0 +1,47 @@
+"""Pruebas para la caché de idempotencia (LRU + Bloom)"""
+
+from alpespartners.seedwork.infraestructura.idempotencia import CacheIdempotencia, FiltroBloom
+
+
+def test_bloom_no_tiene_falsos_negativos_y_pocos_falsos_positivos():
+    # Dado un filtro para 10.000 claves al 1%
+    bloom = FiltroBloom(10_000, 0.01)
+    for i in range(10_000):
+        bloom.agregar(f'e-{i}')
+
+    # Cuando se consultan claves registradas y ajenas
+    falsos_positivos = sum(f'otro-{i}' in bloom for i in range(10_000))
+
+    # Entonces todas las registradas están y las ajenas rara vez aparecen
+    assert all(f'e-{i}' in bloom for i in range(10_000))
+    assert falsos_positivos < 300
+
+
+def test_cache_distingue_visto_nunca_visto_y_posible_positivo():
+    # Dada una caché con LRU de 2 entradas
+    cache = CacheIdempotencia(capacidad_lru=2, capacidad_bloom=1000)
+    cache.calentar([('camp-1', 'PagoConfirmado.v1', 'e1'), ('camp-2', 'PagoConfirmado.v1', 'e2')])
+
+    # Cuando una tercera clave desaloja la más antigua del LRU
+    cache.registrar(('camp-3', 'PagoConfirmado.v1', 'e3'))
+
+    # Entonces la desalojada solo queda en el Bloom (consultar la base) y la nueva es segura
+    assert cache.visto(('camp-3', 'PagoConfirmado.v1', 'e3')) is True
+    assert cache.visto(('camp-1', 'PagoConfirmado.v1', 'e1')) is None
+    assert cache.visto(('camp-4', 'PagoConfirmado.v1', 'e4')) is False
+
+
+def test_el_bloom_rota_en_dos_generaciones_al_llenarse():
+    # Dada una caché sin LRU útil y un Bloom de 100 claves por generación
+    cache = CacheIdempotencia(capacidad_lru=1, capacidad_bloom=100)
+    cache.calentar(('camp-1', 'PagoConfirmado.v1', f'e{i}') for i in range(150))
+
+    # Cuando se llena la segunda generación y empieza una tercera
+    assert cache.rotaciones == 1
+    assert cache.visto(('camp-1', 'PagoConfirmado.v1', 'e0')) is None
+    cache.calentar(('camp-1', 'PagoConfirmado.v1', f'e{i}') for i in range(150, 201))
+
+    # Entonces se olvida la generación más antigua y se conservan las dos recientes
+    assert cache.rotaciones == 2
+    assert cache.visto(('camp-1', 'PagoConfirmado.v1', 'e0')) is False
+    assert all(cache.visto(('camp-1', 'PagoConfirmado.v1', f'e{i}')) is not False for i in range(100, 201))
@@ -0,0 +1,71 @@
+"""Pruebas para el pool compartido de productores Pulsar"""
+
+from alpespartners.seedwork.infraestructura.productores import PoolProductores
+
+
+class ProductorFalso:
+    def __init__(self, topico, falla=False):
+        self.topico = topico
+        self.falla = falla
+        self.enviados = []
+        self.cerrado = False
+
+    def send(self, mensaje, **opciones):
+        if self.falla:
+            raise ConnectionError('desconectado')
+        self.enviados.append(mensaje)
+
+    def flush(self):
+        pass
+
+    def close(self):
+        self.cerrado = True
+
+
+class ClienteFalso:
+    def __init__(self, fallar_primero=False):
+        self.productores = []
+        self.fallar_primero = fallar_primero
+        self.cerrado = False
+
+    def create_producer(self, topico, **opciones):
+        productor = ProductorFalso(topico, falla=self.fallar_primero and not self.productores)
+        self.productores.append(productor)
+        return productor
+
+    def close(self):
+        self.cerrado = True
+
+
+def test_reutiliza_cliente_y_productor_por_topico():
+    # Dado un pool con un cliente falso
+    clientes = []
+    pool = PoolProductores('pulsar://falso:6650', crear_cliente=lambda url: clientes.append(ClienteFalso()) or clientes[-1])
+
+    # Cuando se publican varios mensajes en dos tópicos
+    for i in range(5):
+        pool.enviar('a', b'x')
+        pool.enviar('b', b'y')
+
+    # Entonces se crea un solo cliente y un productor por tópico
+    assert len(clientes) == 1
+    assert [p.topico for p in clientes[0].productores] == ['a', 'b']
+    assert len(clientes[0].productores[0].enviados) == 5
+
+
+def test_recrea_el_productor_si_el_envio_falla():
+    # Dado un cliente cuyo primer productor está desconectado
+    cliente = ClienteFalso(fallar_primero=True)
+    pool = PoolProductores('pulsar://falso:6650', crear_cliente=lambda url: cliente)
+
+    # Cuando se publica un mensaje
+    pool.enviar('a', b'x')
+
+    # Entonces el productor roto se cierra y el mensaje sale por uno nuevo
+    roto, nuevo = cliente.productores
+    assert roto.cerrado
+    assert nuevo.enviados == [b'x']
+
+    # Y al cerrar el pool se cierran productores y cliente
+    pool.cerrar()
+    assert nuevo.cerrado and cliente.cerrado
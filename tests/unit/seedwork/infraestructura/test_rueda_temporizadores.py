@@ -0,0 +1,63 @@
+"""Pruebas para la rueda de temporizadores jerárquica"""
+
+import random
+from alpespartners.seedwork.infraestructura.rueda_temporizadores import RuedaTemporizadores
+
+
+class RelojFalso:
+    def __init__(self):
+        self.ahora = 0.0
+
+    def __call__(self):
+        return self.ahora
+
+
+def test_vence_temporizadores_en_su_plazo():
+    # Dada una rueda pequeña (para forzar cascadas) y plazos en varios niveles
+    reloj = RelojFalso()
+    rueda = RuedaTemporizadores(tick_ms=100, slots=8, niveles=3, reloj=reloj)
+    vencidos = []
+    plazos = [0.1, 0.5, 0.8, 3.3, 7.0, 40.0, 100.0]
+    for plazo in plazos:
+        rueda.programar(plazo, lambda p=plazo: vencidos.append((p, reloj.ahora)))
+
+    # Cuando avanza el tiempo tick a tick
+    for tick in range(1, 1100):
+        reloj.ahora = tick / 10
+        rueda.avanzar()
+
+    # Entonces cada temporizador vence exactamente en su plazo (incluido el que excede el rango)
+    assert [p for p, _ in vencidos] == plazos
+    for plazo, momento in vencidos:
+        assert abs(momento - plazo) < 1e-9
+
+
+def test_cancelar_y_reemplazar_por_clave():
+    # Dados temporizadores con clave
+    reloj = RelojFalso()
+    rueda = RuedaTemporizadores(tick_ms=100, slots=8, niveles=2, reloj=reloj)
+    vencidos = []
+    rueda.programar(1.0, lambda: vencidos.append('a'), clave='saga-a')
+    rueda.programar(1.0, lambda: vencidos.append('b'), clave='saga-b')
+    rueda.programar(2.0, lambda: vencidos.append('b2'), clave='saga-b')
+
+    # Cuando se cancela uno y el otro se reprograma
+    assert rueda.cancelar('saga-a') is True
+    reloj.ahora = 5.0
+    rueda.avanzar()
+
+    # Entonces sólo vence la última programación vigente
+    assert vencidos == ['b2']
+    assert rueda.pendientes() == 0
+    assert rueda.cancelar('saga-a') is False
+
+
+def test_muchos_temporizadores_vencen_una_sola_vez():
+    reloj = RelojFalso()
+    rueda = RuedaTemporizadores(tick_ms=10, slots=16, niveles=3, reloj=reloj)
+    contador = []
+    for i in range(5000):
+        rueda.programar(random.uniform(0, 30), lambda: contador.append(1), clave=i)
+    reloj.ahora = 31
+    assert rueda.avanzar() == 5000
+    assert len(contador) == 5000